@@ -5,19 +5,44 @@ This module implements:
 - LangChain agents for complex query handling
 - Multiple tools (document search, summarization, stats)
 - Multi-step reasoning workflow
+- Streaming of agent steps as they happen
+- Sources taken from the chunks the agent's tools actually retrieved
+- Timing of agent runs, LLM calls and each tool call (exported at /metrics)
 """
 
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict, Iterator
 from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.documents import Document
 import os
+import queue
+import threading
 from dotenv import load_dotenv
+from app import metrics
+from app.retrieval_trace import retrieval_trace
 
 load_dotenv()
 
 
+class AgentStepCallbackHandler(BaseCallbackHandler):
+    """Forwards agent tool calls and tool results to an emit(event) function"""
+    
+    def __init__(self, emit):
+        self.emit = emit
+    
+    def on_agent_action(self, action, **kwargs: Any) -> None:
+        self.emit({"event": "agent_step", "data": {
+            "tool": action.tool,
+            "tool_input": str(action.tool_input),
+            "log": action.log
+        }})
+    
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        self.emit({"event": "tool_result", "data": {"output": str(output)[:500]}})
+
+
 class AgenticWorkflow:
     """
     Agentic AI workflow that uses LangChain agents to:
@@ -40,6 +65,8 @@ class AgenticWorkflow:
         self.llm = None
         self.agent = None
         self.tools = []
+        # Times the agent's LLM calls, tool calls and steps
+        self.metrics_callback = metrics.MetricsCallbackHandler("agent")
         
         if self.api_key:
             try:
@@ -76,6 +103,14 @@ class AgenticWorkflow:
             except Exception as e:
                 return f"Error querying documents: {str(e)}"
         
+        async def adocument_query(query: str) -> str:
+            """Search documents using RAG (async, used by aprocess_query)"""
+            try:
+                result = await self.rag_engine.aquery(query, k=3)
+                return result.get("answer", "No answer found")
+            except Exception as e:
+                return f"Error querying documents: {str(e)}"
+        
         def summarize_text(text: str) -> str:
             """Summarize text using LLM"""
             try:
@@ -97,6 +132,7 @@ class AgenticWorkflow:
             Tool(
                 name="DocumentQuery",
                 func=document_query,
+                coroutine=adocument_query,
                 description="Use this tool to search and query uploaded documents. Input should be a question about the documents."
             ),
             Tool(
@@ -113,15 +149,12 @@ class AgenticWorkflow:
         
         return tools
     
-    def process_query(self, question: str) -> Dict:
+    def _ensure_agent(self) -> Optional[Dict]:
         """
-        Process a query using the agentic workflow
+        Make sure the agent can run
         
-        Args:
-            question: User's question
-            
         Returns:
-            Dictionary with answer and metadata
+            None when ready, otherwise the response to return instead
         """
         if not self.api_key:
             return {
@@ -164,17 +197,31 @@ class AgenticWorkflow:
                     "agentic": False
                 }
         
-        try:
-            # Use agent to process query
-            result = self.agent.run(question)
+        return None
+    
+    def process_query(self, question: str, callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict:
+        """
+        Process a query using the agentic workflow
+        
+        Args:
+            question: User's question
+            callbacks: Optional LangChain callback handlers for the agent run
             
-            # Get relevant chunks for sources
-            relevant_chunks = self.rag_engine.get_relevant_chunks(question, k=3)
-            sources = [chunk.page_content[:200] + "..." for chunk in relevant_chunks]
+        Returns:
+            Dictionary with answer and metadata
+        """
+        not_ready = self._ensure_agent()
+        if not_ready is not None:
+            return not_ready
+        
+        try:
+            # Every chunk the tools retrieve during the run lands in the trace
+            with metrics.span("agent", "run"), retrieval_trace() as trace:
+                result = self.agent.run(question, callbacks=[self.metrics_callback, *(callbacks or [])])
             
             return {
                 "answer": result,
-                "sources": sources,
+                "sources": trace.sources(k=3),
                 "confidence": 0.8,
                 "agentic": True
             }
@@ -194,3 +241,80 @@ class AgenticWorkflow:
                     "confidence": 0.0,
                     "agentic": False
                 }
+
+    async def aprocess_query(self, question: str, callbacks: Optional[List[BaseCallbackHandler]] = None) -> Dict:
+        """
+        Async process_query(): the agent's LLM calls and the DocumentQuery
+        tool are awaited, so the event loop is never blocked
+        
+        Args:
+            question: User's question
+            callbacks: Optional LangChain callback handlers for the agent run
+            
+        Returns:
+            Dictionary with answer and metadata
+        """
+        not_ready = self._ensure_agent()
+        if not_ready is not None:
+            return not_ready
+        
+        try:
+            # Every chunk the tools retrieve during the run lands in the trace
+            with metrics.span("agent", "run"), retrieval_trace() as trace:
+                result = await self.agent.arun(question, callbacks=[self.metrics_callback, *(callbacks or [])])
+            
+            return {
+                "answer": result,
+                "sources": trace.sources(k=3),
+                "confidence": 0.8,
+                "agentic": True
+            }
+            
+        except Exception as e:
+            # Fallback to simple RAG if agent fails
+            try:
+                return {
+                    **(await self.rag_engine.aquery(question)),
+                    "agentic": False,
+                    "error": f"Agent failed, using simple RAG: {str(e)}"
+                }
+            except Exception as fallback_error:
+                return {
+                    "answer": f"I encountered an error processing your query: {str(fallback_error)}",
+                    "sources": [],
+                    "confidence": 0.0,
+                    "agentic": False
+                }
+    
+    def stream_query(self, question: str) -> Iterator[Dict]:
+        """
+        Run the agent in a background thread and stream its steps
+        
+        Yields "agent_step" / "tool_result" events as the agent works, then
+        the same "sources", "token" and "done" events as the engines.
+        
+        Args:
+            question: User's question
+            
+        Returns:
+            Iterator of {"event": ..., "data": {...}}
+        """
+        events: queue.Queue = queue.Queue()
+        finished = object()
+        
+        def run():
+            try:
+                result = self.process_query(question, callbacks=[AgentStepCallbackHandler(events.put)])
+                if result.get("sources"):
+                    events.put({"event": "sources", "data": {"sources": result["sources"]}})
+                events.put({"event": "token", "data": {"text": result["answer"]}})
+                events.put({"event": "done", "data": result})
+            finally:
+                events.put(finished)
+        
+        threading.Thread(target=run, daemon=True).start()
+        while True:
+            event = events.get()
+            if event is finished:
+                return
+            yield event
@@ -0,0 +1,151 @@
+"""
+Answer Cache - Repeated Questions Without Retrieval or LLM Calls
+
+This module implements:
+- An LRU + TTL cache of query results
+- Keys built from the normalized question, k, engine mode and corpus version,
+  so any ingest or delete invalidates older answers automatically
+- Optional JSON persistence across restarts, shared by several workers:
+  each save merges its entries into the file under a lock
+- Hit / miss / eviction counters
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent saves may drop each other's entries
+    fcntl = None
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question"""
+    return WHITESPACE.sub(" ", question.strip().lower()).rstrip(" ?!.")
+
+
+class AnswerCache:
+    """
+    Bounded LRU cache with per-entry time-to-live
+
+    Entries expire ttl_seconds after they were stored; the least recently
+    used entry is evicted once max_entries is reached. All operations are
+    O(1) and guarded by a lock (handlers and worker threads share it).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 persist_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Maximum number of cached answers
+            ttl_seconds: Lifetime of an entry
+            persist_path: JSON file to load from at startup and save to on save()
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        # key -> (expires_at, result)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self._load()
+
+    @staticmethod
+    def make_key(question: str, k: int, mode: str, corpus_version: str) -> str:
+        return json.dumps([normalize_question(question), k, mode, corpus_version])
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
+
+    def save(self) -> None:
+        """
+        Merge unexpired entries into persist_path (atomic replace)
+
+        Workers sharing the file save one after another under a file lock,
+        each keeping what the others saved: per key the entry that expires
+        last wins, and the max_entries latest-expiring entries are kept.
+        """
+        if not self.persist_path:
+            return
+        now = time.time()
+        with self._lock:
+            ours = [[key, expires_at, result] for key, (expires_at, result) in self._entries.items()
+                    if expires_at >= now]
+        with open(f"{self.persist_path}.lock", "a+") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            merged = {}
+            for key, expires_at, result in self._read_file() + ours:
+                if expires_at >= now and (key not in merged or expires_at >= merged[key][0]):
+                    merged[key] = (expires_at, result)
+            entries = sorted(([key, expires_at, result] for key, (expires_at, result) in merged.items()),
+                             key=lambda entry: entry[1])[-self.max_entries:]
+            tmp_path = f"{self.persist_path}.tmp-{os.getpid()}"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.persist_path)
+
+    def _read_file(self) -> List[list]:
+        """[key, expires_at, result] entries saved in persist_path (empty if missing or unreadable)"""
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            print(f"Warning: Could not load answer cache: {e}")
+            return []
+
+    def _load(self) -> None:
+        now = time.time()
+        for key, expires_at, result in self._read_file()[-self.max_entries:]:
+            if expires_at >= now:
+                self._entries[key] = (expires_at, result)
@@ -0,0 +1,246 @@
+"""
+BM25 Inverted Index - Keyword Retrieval Without a Corpus Scan
+
+This module implements:
+- Token normalization done once, at ingest time
+- An incrementally built inverted index (term -> postings)
+- Okapi BM25 scoring over the postings of the query terms only
+- Heap-based top-k selection
+- Removal of a document's postings in time proportional to the document
+- Batched scoring of many queries with one sparse matrix multiply
+- IDF-weighted query coverage, used as a lexical confidence signal
+"""
+
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # batched scoring falls back to per-query search
+    np = None
+    sparse = None
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase a text and split it into word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25.
+
+    Documents are identified by hashable ids chosen by the caller (integer
+    chunk ids in the demo engine, docstore ids in RAGEngine). Query cost is
+    proportional to the postings of the query terms, not to the corpus size.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index
+
+        Args:
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+        """
+        self.k1 = k1
+        self.b = b
+
+        # term -> {doc_id: term frequency}
+        self.postings: Dict[str, Dict[Hashable, int]] = {}
+        self.doc_lengths: Dict[Hashable, int] = {}
+        # doc_id -> distinct terms, so a document's postings can be removed directly
+        self.doc_terms: Dict[Hashable, List[str]] = {}
+        self.total_length = 0
+
+        # (term-document weight matrix, term -> row, column -> doc_id) for
+        # search_batch, rebuilt lazily after changes. Concurrent batches may
+        # rebuild it at the same time, so it is only ever replaced as a whole.
+        self._batch_matrix: Optional[Tuple[Any, Dict[str, int], List[Hashable]]] = None
+
+    def __getstate__(self) -> Dict:
+        # The batch matrix is derived data; it is rebuilt on first use
+        state = self.__dict__.copy()
+        state["_batch_matrix"] = None
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        # Snapshots from before _batch_matrix kept the matrix in three fields
+        for name in ("_matrix", "_matrix_terms", "_matrix_doc_ids"):
+            state.pop(name, None)
+        state["_batch_matrix"] = None
+        self.__dict__.update(state)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    def add(self, doc_id: Hashable, text: str) -> None:
+        """
+        Tokenize a document and add it to the postings
+
+        Args:
+            doc_id: Caller-assigned document id (must be unique)
+            text: Document text
+        """
+        tokens = tokenize(text)
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_terms[doc_id] = list(counts)
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        self._batch_matrix = None
+
+    def remove(self, doc_id: Hashable) -> None:
+        """Remove a document's postings (no-op for unknown ids)"""
+        if doc_id not in self.doc_lengths:
+            return
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self._batch_matrix = None
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)"""
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_lengths)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Hashable, float]]:
+        """
+        Score documents that contain at least one query term
+
+        Args:
+            query: Free-text query
+            k: Number of results to return
+
+        Returns:
+            List of (doc_id, score) pairs, best first
+        """
+        if k <= 0 or not self.doc_lengths:
+            return []
+
+        avgdl = self.avg_doc_length or 1.0
+        scores: Dict[Hashable, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def term_coverage(self, query: str, doc_id: Hashable) -> float:
+        """Fraction of distinct query terms that occur in a document"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        matched = sum(1 for term in terms if doc_id in self.postings.get(term, ()))
+        return matched / len(terms)
+
+    def idf_coverage(self, query: str, doc_id: Hashable) -> float:
+        """
+        Share of the query's total IDF carried by terms that occur in a document
+
+        Unlike term_coverage, common words barely count, so a high value means
+        the document contains the query's distinctive terms (identifiers,
+        codes, names).
+        """
+        weights = {term: self.idf(term) for term in set(tokenize(query))}
+        total = sum(weights.values())
+        if total <= 0:
+            return 0.0
+        matched = sum(weight for term, weight in weights.items() if doc_id in self.postings.get(term, ()))
+        return matched / total
+
+    def _build_matrix(self) -> Tuple[Any, Dict[str, int], List[Hashable]]:
+        """Materialize BM25 term weights as a sparse (terms x docs) CSR matrix"""
+        doc_ids = list(self.doc_lengths)
+        column = {doc_id: col for col, doc_id in enumerate(doc_ids)}
+        avgdl = self.avg_doc_length or 1.0
+
+        rows, cols, weights = [], [], []
+        terms: Dict[str, int] = {}
+        for row, (term, postings) in enumerate(self.postings.items()):
+            terms[term] = row
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_id] / avgdl)
+                rows.append(row)
+                cols.append(column[doc_id])
+                weights.append(tf * (self.k1 + 1.0) / (tf + norm))
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (rows, cols)),
+            shape=(len(terms), len(doc_ids)),
+        )
+        return matrix, terms, doc_ids
+
+    def search_batch(self, queries: List[str], k: int = 3) -> List[List[Tuple[Hashable, float]]]:
+        """
+        Score many queries at once
+
+        Builds a sparse (queries x terms) IDF matrix and multiplies it with the
+        cached term-document weight matrix, so the whole batch is scored in a
+        single sparse product.
+
+        Args:
+            queries: Free-text queries
+            k: Number of results per query
+
+        Returns:
+            One list of (doc_id, score) pairs per query, best first
+        """
+        if sparse is None:
+            return [self.search(query, k=k) for query in queries]
+        if k <= 0 or not self.doc_lengths:
+            return [[] for _ in queries]
+
+        # One read of the cached tuple: the matrix, terms and doc ids always match
+        batch_matrix = self._batch_matrix
+        if batch_matrix is None:
+            batch_matrix = self._batch_matrix = self._build_matrix()
+        matrix, matrix_terms, matrix_doc_ids = batch_matrix
+
+        rows, cols, weights = [], [], []
+        for row, query in enumerate(queries):
+            for term in set(tokenize(query)):
+                col = matrix_terms.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    weights.append(self.idf(term))
+
+        query_matrix = sparse.csr_matrix(
+            (np.asarray(weights, dtype=np.float32), (rows, cols)),
+            shape=(len(queries), len(matrix_terms)),
+        )
+        scores = (query_matrix @ matrix).tocsr()
+
+        results = []
+        for row in range(len(queries)):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            cols_row, data_row = scores.indices[start:end], scores.data[start:end]
+            if len(data_row) > k:
+                top = np.argpartition(-data_row, k - 1)[:k]
+                cols_row, data_row = cols_row[top], data_row[top]
+            order = np.argsort(-data_row, kind="stable")
+            results.append([
+                (matrix_doc_ids[cols_row[i]], float(data_row[i])) for i in order
+            ])
+        return results
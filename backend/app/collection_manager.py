@@ -0,0 +1,240 @@
+"""
+Collections - Named Document Sets with One Index Each
+
+This module implements:
+- A registry of named collections (tenants, corpora, shards of a large
+  corpus), each backed by its own engine and on-disk index
+- Collections created on first upload and discovered on disk, so worker
+  processes see collections created by other workers
+- Fan-out search over several collections on a thread pool, with the
+  per-collection candidate lists merged into one ranking before fusion
+
+The "default" collection is the engine main.py has always used (INDEX_DIR
+itself), so requests without a collection behave exactly as before.
+"""
+
+import asyncio
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from app.index_store import IndexStore
+from app.rank_fusion import reciprocal_rank_fusion
+from app.retrieval_trace import record_retrieval
+
+DEFAULT_COLLECTION = "default"
+COLLECTION_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class CollectionManager:
+    """
+    Engines per collection, plus search and answers across collections
+
+    Collections are merged on raw scores, then fused once: vector
+    candidates by L2 distance (exact, every collection shares the
+    embedder), lexical candidates by BM25 score, and in hybrid mode the two
+    merged rankings go through one reciprocal rank fusion, as within a
+    single collection. BM25 scores use per-collection IDF statistics, so
+    the lexical merge is approximate.
+    """
+
+    def __init__(self, default_engine: Any, engine_factory: Callable[[Optional[str]], Any],
+                 root_dir: Optional[str] = None, max_workers: int = 8, poll_seconds: float = 0.0):
+        """
+        Args:
+            default_engine: Engine of the "default" collection
+            engine_factory: Builds an engine for a collection, given its index
+                            directory (None when collections are not persisted)
+            root_dir: Directory holding one index directory per collection
+                      (None: collections live in process memory only)
+            max_workers: Collections searched in parallel by one query
+            poll_seconds: Follow index snapshots saved by other workers this often (0: off)
+        """
+        self.default_engine = default_engine
+        self.engine_factory = engine_factory
+        self.root_dir = root_dir
+        self.poll_seconds = poll_seconds
+        self._engines: Dict[str, Any] = {DEFAULT_COLLECTION: default_engine}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="collection")
+
+    @staticmethod
+    def validate_name(name: str) -> str:
+        """Raise ValueError unless name is a usable collection name (letters, digits, - and _)"""
+        if not COLLECTION_NAME_PATTERN.match(name or ""):
+            raise ValueError(f"Invalid collection name '{name}': use 1-64 letters, digits, '-' or '_'")
+        return name
+
+    def _directory(self, name: str) -> Optional[str]:
+        return os.path.join(self.root_dir, name) if self.root_dir else None
+
+    def get(self, name: str, create: bool = False) -> Optional[Any]:
+        """
+        Engine of a collection
+
+        Args:
+            name: Collection name
+            create: Create the collection if it does not exist yet
+
+        Returns:
+            The engine, or None if the collection does not exist and create is False
+        """
+        self.validate_name(name)
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is not None:
+                return engine
+            directory = self._directory(name)
+            if not create and not (directory and os.path.isdir(directory)):
+                return None
+
+            engine = self.engine_factory(directory)
+            if hasattr(engine, "load_index"):
+                # Opening an existing collection reads its snapshot
+                engine.load_index()
+                if self.poll_seconds > 0:
+                    threading.Thread(target=engine.watch_index, args=(self.poll_seconds,), daemon=True).start()
+            self._engines[name] = engine
+            return engine
+
+    def resolve(self, names: Optional[List[str]]) -> List[Tuple[str, Any]]:
+        """
+        (name, engine) pairs for the requested collections (default: the default collection)
+
+        Raises:
+            ValueError: A name is invalid
+            KeyError: A collection does not exist
+        """
+        names = list(dict.fromkeys(names or [DEFAULT_COLLECTION]))
+        pairs = []
+        for name in names:
+            engine = self.get(name)
+            if engine is None:
+                raise KeyError(name)
+            pairs.append((name, engine))
+        return pairs
+
+    def names(self) -> List[str]:
+        """All collections: opened in this process or present on disk"""
+        names = set(self._engines)
+        if self.root_dir and os.path.isdir(self.root_dir):
+            names.update(
+                name for name in os.listdir(self.root_dir)
+                if COLLECTION_NAME_PATTERN.match(name) and os.path.isdir(os.path.join(self.root_dir, name))
+            )
+        return sorted(names, key=lambda name: (name != DEFAULT_COLLECTION, name))
+
+    def list(self) -> List[Dict]:
+        """
+        Collections with their document and chunk counts
+
+        Open collections report their live counts; the others are read from
+        the summary saved with their latest snapshot, so listing never loads
+        an index (only snapshots saved before summaries existed are opened).
+        """
+        collections = []
+        for name in self.names():
+            engine = self._engines.get(name)
+            counts = self._saved_counts(name) if engine is None else None
+            if counts is None:
+                stats = (engine or self.get(name)).get_stats()
+                counts = {"documents": stats.get("total_documents", 0), "chunks": stats["total_chunks"]}
+            collections.append({"name": name, **counts})
+        return collections
+
+    def _saved_counts(self, name: str) -> Optional[Dict]:
+        """Document and chunk counts of a collection that is not open, or None if unknown"""
+        directory = self._directory(name)
+        if directory is None:
+            return None
+        store = IndexStore(directory)
+        if store.current_generation() is None:
+            # Created, but nothing was ever saved
+            return {"documents": 0, "chunks": 0}
+        summary = store.summary()
+        if summary is None:
+            return None
+        return {"documents": summary.get("documents", 0), "chunks": summary.get("chunks", 0)}
+
+    def corpus_version(self, engines: List[Tuple[str, Any]]) -> str:
+        """Version string covering every searched collection (answer cache key)"""
+        return "|".join(f"{name}={engine.corpus_id}:{engine.corpus_version}" for name, engine in engines)
+
+    def search(self, question: str, engines: List[Tuple[str, Any]], k: int = 3) -> List[Tuple[Document, float, str]]:
+        """
+        Top k chunks across collections, searched in parallel
+
+        The question is embedded once and the embedding is shared by every
+        collection; each one returns its unfused vector and lexical
+        candidates, which are merged across collections and then fused.
+
+        Returns:
+            (chunk, relevance, collection name) triples, best first
+        """
+        embedding = self.default_engine.embed_question(question) if len(engines) > 1 else None
+        futures = [
+            (name, self._pool.submit(engine.search_candidates, question, k, embedding))
+            for name, engine in engines
+        ]
+        chunks: Dict[Tuple[str, Any], Document] = {}
+        vector, lexical = [], []
+        for name, future in futures:
+            candidates = future.result()
+            for ranked, merged in ((candidates["vector"], vector), (candidates["lexical"], lexical)):
+                for chunk_id, chunk, score in ranked:
+                    chunks[(name, chunk_id)] = chunk
+                    merged.append(((name, chunk_id), score))
+        # Distances: lower is better; BM25 scores: higher is better
+        vector.sort(key=lambda hit: hit[1])
+        lexical.sort(key=lambda hit: hit[1], reverse=True)
+
+        if vector and lexical:
+            # Fuse the same depth a single engine fuses (its top fetch_k per list)
+            fetch_k = max(getattr(self.default_engine, "hybrid_fetch_k", k), k)
+            hits = reciprocal_rank_fusion(
+                [[key for key, _ in lexical[:fetch_k]], [key for key, _ in vector[:fetch_k]]], k
+            )
+        elif vector:
+            hits = [(key, 1.0 / (1.0 + distance)) for key, distance in vector[:k]]
+        else:
+            hits = lexical[:k]
+        record_retrieval([(chunks[key], score) for key, score in hits])
+        return [(chunks[key], score, key[0]) for key, score in hits]
+
+    def query(self, question: str, engines: List[Tuple[str, Any]], k: int = 3) -> Dict:
+        """Answer from one collection (its usual query path) or from the merged top k of several"""
+        if len(engines) == 1:
+            return engines[0][1].query(question, k=k)
+        hits = self.search(question, engines, k)
+        return self.default_engine.answer_from_chunks(question, [chunk for chunk, _, _ in hits])
+
+    async def aquery(self, question: str, engines: List[Tuple[str, Any]], k: int = 3) -> Dict:
+        """Async query(): a single collection uses the engine's async path, fan-out runs in a worker thread"""
+        if len(engines) == 1:
+            return await engines[0][1].aquery(question, k=k)
+        return await asyncio.to_thread(self.query, question, engines, k)
+
+    def query_batch(self, questions: List[str], engines: List[Tuple[str, Any]], k: int = 3) -> List[Dict]:
+        """Batched answers: one collection uses the engine's batch path, several fan out per question"""
+        if len(engines) == 1:
+            return engines[0][1].query_batch(questions, k=k)
+        return [self.query(question, engines, k) for question in questions]
+
+    def stream_query(self, question: str, engines: List[Tuple[str, Any]], k: int = 3) -> Iterator[Dict]:
+        """Same events as the engines' stream_query (sources, token, done)"""
+        if len(engines) == 1:
+            yield from engines[0][1].stream_query(question, k=k)
+            return
+        result = self.query(question, engines, k)
+        if result["sources"]:
+            yield {"event": "sources", "data": {"sources": result["sources"]}}
+        yield {"event": "token", "data": {"text": result["answer"]}}
+        yield {"event": "done", "data": result}
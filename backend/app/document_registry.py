@@ -0,0 +1,94 @@
+"""
+Document Registry - Which Chunks Belong to Which Document
+
+This module implements:
+- A map from document id to its chunk ids and metadata
+- Precomputed chunk counts (listing is O(documents), not O(chunks))
+- Content-hash lookup for upload deduplication
+- Picklable state for the index snapshot
+"""
+
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional
+
+
+class DocumentRegistry:
+    """
+    Registry of ingested documents
+
+    Chunk ids are whatever the engine uses to address a chunk in its index
+    (docstore ids for FAISS, integer ids for the BM25 index), so deleting a
+    document touches only its own chunks.
+    """
+
+    def __init__(self):
+        # document id -> {"document_id", "filename", "chunk_ids", "chunks", "content_hash", "upload_date"}
+        self.documents: Dict[str, Dict] = {}
+        # content hash -> document id
+        self.hashes: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.documents
+
+    def register(self, document_id: str, chunk_ids: List[Hashable],
+                 content_hash: Optional[str] = None, filename: Optional[str] = None) -> Dict:
+        """
+        Record a newly indexed document
+
+        Args:
+            document_id: Document id (the upload's file name)
+            chunk_ids: Ids of the document's chunks in the engine's index
+            content_hash: Optional sha256 of the uploaded file
+            filename: Display name (defaults to the document id)
+
+        Returns:
+            The stored record
+        """
+        record = {
+            "document_id": document_id,
+            "filename": filename or document_id,
+            "chunk_ids": list(chunk_ids),
+            "chunks": len(chunk_ids),
+            "content_hash": content_hash,
+            "upload_date": datetime.now().isoformat()
+        }
+        self.documents[document_id] = record
+        if content_hash:
+            self.hashes[content_hash] = document_id
+        return record
+
+    def remove(self, document_id: str) -> Optional[Dict]:
+        """Forget a document; returns its record (with chunk_ids) or None if unknown"""
+        record = self.documents.pop(document_id, None)
+        if record is not None and record["content_hash"]:
+            self.hashes.pop(record["content_hash"], None)
+        return record
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        return self.documents.get(document_id)
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict]:
+        document_id = self.hashes.get(content_hash)
+        return self.documents.get(document_id) if document_id is not None else None
+
+    def list(self) -> List[Dict]:
+        """Records without their chunk id lists"""
+        return [
+            {key: value for key, value in record.items() if key != "chunk_ids"}
+            for record in self.documents.values()
+        ]
+
+    def to_state(self) -> Dict:
+        return {"documents": self.documents}
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "DocumentRegistry":
+        registry = cls()
+        for document_id, record in state.get("documents", {}).items():
+            registry.documents[document_id] = record
+            if record.get("content_hash"):
+                registry.hashes[record["content_hash"]] = document_id
+        return registry
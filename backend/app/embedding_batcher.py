@@ -0,0 +1,178 @@
+"""
+Embedding Batcher - Cross-request Micro-batching for Chunk Embeddings
+
+This module implements:
+- A scheduler that merges chunk texts from concurrent ingest jobs into
+  batches bounded by text count and (estimated) token count
+- A short wait window so texts arriving together share one API request
+- Several batches in flight at once, with retry and exponential backoff
+- A LangChain Embeddings wrapper that sends embed_documents through it
+"""
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatcher:
+    """
+    Gathers texts from any number of callers into batched embedding calls
+
+    Callers block in embed() until all of their texts are embedded. A
+    collector thread takes texts off a shared queue, waits at most
+    max_wait_seconds for a batch to fill, and hands each batch to a pool of
+    max_concurrency senders. Failed batches are retried with exponential
+    backoff and jitter; after max_retries the error is raised in every
+    caller that had a text in the batch.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]],
+                 max_batch_size: int = 256, max_batch_tokens: int = 200_000,
+                 max_wait_seconds: float = 0.02, max_concurrency: int = 4,
+                 max_retries: int = 5, backoff_seconds: float = 0.5):
+        """
+        Args:
+            embed_fn: Embeds a list of texts in one request (e.g. OpenAIEmbeddings.embed_documents)
+            max_batch_size: Most texts per request
+            max_batch_tokens: Most estimated tokens per request
+            max_wait_seconds: How long a partial batch waits for more texts
+            max_concurrency: Requests in flight at once
+            max_retries: Retries per batch before giving up
+            backoff_seconds: Delay before the first retry (doubles each time)
+        """
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait_seconds = max_wait_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        # (text, estimated tokens, future) per pending text
+        self._queue: queue.Queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        # No more batches are formed than can be sent, so waiting texts keep merging
+        self._slots = threading.Semaphore(max_concurrency)
+
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.retries = 0
+        self.failures = 0
+
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts as part of whatever batches are being formed
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector per text, in input order
+        """
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, estimate_tokens(text), future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _collect(self) -> None:
+        carry = None
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            batch = [first]
+            tokens = first[1]
+            deadline = time.monotonic() + self.max_wait_seconds
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if tokens + item[1] > self.max_batch_tokens:
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item[1]
+
+            self._slots.acquire()
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[tuple]) -> None:
+        """Embed one batch and resolve its futures; every future is resolved, whatever fails"""
+        try:
+            texts = [text for text, _, _ in batch]
+            for attempt in range(self.max_retries + 1):
+                try:
+                    vectors = self.embed_fn(texts)
+                    break
+                except Exception:
+                    if attempt == self.max_retries:
+                        raise
+                    with self._stats_lock:
+                        self.retries += 1
+                    delay = self.backoff_seconds * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, delay / 2))
+
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding request returned {len(vectors)} vectors for {len(batch)} texts")
+            with self._stats_lock:
+                self.batches += 1
+                self.texts += len(batch)
+            for (_, _, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            with self._stats_lock:
+                self.failures += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "retries": self.retries,
+                "failures": self.failures,
+                "queued": self._queue.qsize()
+            }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that sends embed_documents through an EmbeddingBatcher
+
+    Query embeddings are latency-sensitive and go straight to the wrapped
+    embeddings object.
+    """
+
+    def __init__(self, underlying: Embeddings, batcher: Optional[EmbeddingBatcher] = None):
+        self.underlying = underlying
+        self.batcher = batcher or EmbeddingBatcher(underlying.embed_documents)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.underlying.aembed_query(text)
@@ -0,0 +1,325 @@
+"""
+Embedding Cache - Content-addressed Store for Chunk Embeddings
+
+This module implements:
+- A persistent SQLite store keyed by sha256(model name + chunk text)
+- A byte-size cap with least-recently-used eviction
+- Entry count and stored bytes kept in a metadata row, so every process
+  sharing the file sees the same totals without scanning the table
+- A LangChain Embeddings wrapper that only sends cache misses to the backend
+- A bounded in-memory LRU cache of query embeddings
+- Hit rate and bytes-saved counters for get_stats
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def embedding_key(model_name: str, text: str) -> str:
+    """Content address of a chunk embedding"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by (model name, normalized text)
+
+    Questions are normalized by collapsing whitespace, so the same question
+    typed twice maps to one entry. Lookups and inserts hold a lock for a
+    dict operation only, so it is safe from threads and the event loop.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> Tuple[str, str]:
+        return (model_name, WHITESPACE.sub(" ", text).strip())
+
+    def get(self, key: Tuple[str, str]) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple[str, str], vector: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding store with a size cap and LRU eviction
+
+    Vectors are stored as float32 blobs. last_access is refreshed on every
+    hit; when the stored bytes exceed max_bytes the least recently used rows
+    are deleted until the store fits again. The cache_stats row holds the
+    entry count and stored bytes, updated in the same transaction as every
+    insert and eviction (workers sharing the file stay consistent).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            path: SQLite database file
+            max_bytes: Upper bound on the total size of stored vectors
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Other workers may be writing at the same time
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings(last_access)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_stats ("
+            " id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # Counted once for caches created before the stats row existed
+            self._conn.execute(
+                "INSERT OR IGNORE INTO cache_stats (id, entries, bytes)"
+                " SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            )
+            self._conn.commit()
+
+    def _stats(self) -> Tuple[int, int]:
+        """(entries, stored bytes) from the stats row"""
+        with self._lock:
+            return self._conn.execute("SELECT entries, bytes FROM cache_stats WHERE id = 1").fetchone()
+
+    def __len__(self) -> int:
+        return self._stats()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        """Bytes of vectors stored, across every process sharing the file"""
+        return self._stats()[1]
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up several keys at once and refresh their LRU timestamp"""
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            unique = list(dict.fromkeys(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors, then evict least recently used rows above the size cap"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+
+        with self._lock:
+            # One write transaction: replaced rows and the stats row change together
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing_entries, existing_bytes = self._existing(list(items))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute(
+                    "UPDATE cache_stats SET entries = entries + ?, bytes = bytes + ? WHERE id = 1",
+                    (len(rows) - existing_entries, sum(row[2] for row in rows) - existing_bytes)
+                )
+                total_bytes = self._conn.execute("SELECT bytes FROM cache_stats WHERE id = 1").fetchone()[0]
+                if total_bytes > self.max_bytes:
+                    self._evict(total_bytes)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def _existing(self, keys: List[str]) -> Tuple[int, int]:
+        """(count, total size) of the keys already stored"""
+        entries = size = 0
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            count, total = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchone()
+            entries += count
+            size += total
+        return entries, size
+
+    def _evict(self, total_bytes: int) -> None:
+        """Delete least recently used rows until the store fits under max_bytes (inside put_many's transaction)"""
+        cursor = self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_access ASC")
+        doomed = []
+        freed = 0
+        for key, size in cursor:
+            if total_bytes - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        self._conn.execute(
+            "UPDATE cache_stats SET entries = entries - ?, bytes = bytes - ? WHERE id = 1",
+            (len(doomed), freed)
+        )
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults an EmbeddingCache before the backend
+
+    Duplicate texts inside one call are embedded once, and only texts that
+    are not already cached are sent to the wrapped embeddings object.
+    Questions go through a separate in-memory QueryEmbeddingCache, so every
+    retrieval path (chain, agent tool, batch, async) shares one query cache.
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model_name: str,
+                 query_cache: Optional[QueryEmbeddingCache] = None):
+        self.underlying = underlying
+        self.cache = cache
+        self.model_name = model_name
+        self.query_cache = query_cache or QueryEmbeddingCache()
+
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        # Embed each missing text once, even if it repeats within the call
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            embedded = self.underlying.embed_documents(list(missing.values()))
+            new_vectors = dict(zip(missing.keys(), embedded))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        # Every text not sent to the backend is a hit; bytes_saved counts its request payload
+        saved = 0
+        sent = set()
+        for key, text in zip(keys, texts):
+            if key in missing and key not in sent:
+                sent.add(key)
+            else:
+                saved += len(text.encode("utf-8"))
+
+        with self._stats_lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+            self.bytes_saved += saved
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.query_cache.make_key(self.model_name, text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.underlying.embed_query(key[1])
+            self.query_cache.put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.query_cache.make_key(self.model_name, text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = await self.underlying.aembed_query(key[1])
+            self.query_cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several questions, sending only query-cache misses to the backend (in one call)"""
+        keys = [self.query_cache.make_key(self.model_name, text) for text in texts]
+        vectors = {key: self.query_cache.get(key) for key in dict.fromkeys(keys)}
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            embedded = self.underlying.embed_documents([key[1] for key in missing])
+            for key, vector in zip(missing, embedded):
+                self.query_cache.put(key, vector)
+                vectors[key] = vector
+        return [vectors[key] for key in keys]
+
+    def get_stats(self) -> Dict:
+        """Cache counters for RAGEngine.get_stats"""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self.cache),
+                "stored_bytes": self.cache.total_bytes,
+                "query_cache": self.query_cache.get_stats()
+            }
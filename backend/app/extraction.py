@@ -0,0 +1,184 @@
+"""
+Text Extraction - Streaming, Page-parallel Document Reading
+
+This module implements:
+- Generators that yield document text segment by segment (PDF pages,
+  TXT blocks, DOCX paragraph groups) instead of one big string
+- Page-parallel PDF extraction on a shared process pool
+- A bounded-buffer chunker that feeds segments straight into the text
+  splitter, so memory use is capped regardless of document size
+
+Both RAGEngine and RAGEngineDemo ingest through extract_chunks().
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import PyPDF2
+from docx import Document as DocxDocument
+from langchain.schema import Document
+from langchain.text_splitter import TextSplitter
+
+# Pages handed to one worker task; small PDFs are read in-process
+PDF_PAGES_PER_TASK = 16
+# TXT files are read in blocks of this many characters
+TXT_BLOCK_CHARS = 1024 * 1024
+# DOCX paragraphs are grouped into segments of roughly this many characters
+DOCX_SEGMENT_CHARS = 64 * 1024
+
+# Upper bound on text held in the chunking buffer at once (configurable)
+MAX_BUFFER_CHARS = int(float(os.getenv("EXTRACTION_MAX_BUFFER_MB", "8")) * 1024 * 1024)
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Shared pool for PDF page extraction (spawned lazily, reused across documents)"""
+    global _process_pool
+    if _process_pool is None:
+        # spawn: ingestion runs on worker threads, where forking is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract pages [start, end) of a PDF (runs in a worker process)"""
+    with open(file_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, end)]
+
+
+def _iter_pdf(file_path: str) -> Iterator[str]:
+    with open(file_path, "rb") as f:
+        num_pages = len(PyPDF2.PdfReader(f).pages)
+
+    if num_pages <= PDF_PAGES_PER_TASK or EXTRACTION_WORKERS <= 1:
+        yield from _extract_pdf_pages(file_path, 0, num_pages)
+        return
+
+    # Keep a bounded window of page ranges in flight and yield them in order
+    pool = _get_process_pool()
+    ranges = iter(range(0, num_pages, PDF_PAGES_PER_TASK))
+    in_flight = deque()
+
+    def submit_next() -> None:
+        start = next(ranges, None)
+        if start is not None:
+            end = min(start + PDF_PAGES_PER_TASK, num_pages)
+            in_flight.append(pool.submit(_extract_pdf_pages, file_path, start, end))
+
+    for _ in range(EXTRACTION_WORKERS * 2):
+        submit_next()
+    while in_flight:
+        pages = in_flight.popleft().result()
+        submit_next()
+        yield from pages
+
+
+def _iter_txt(file_path: str) -> Iterator[str]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(TXT_BLOCK_CHARS)
+            if not block:
+                break
+            yield block
+
+
+def _iter_docx(file_path: str) -> Iterator[str]:
+    doc = DocxDocument(file_path)
+    segment: List[str] = []
+    size = 0
+    for paragraph in doc.paragraphs:
+        segment.append(paragraph.text)
+        size += len(paragraph.text) + 1
+        if size >= DOCX_SEGMENT_CHARS:
+            yield "\n".join(segment) + "\n"
+            segment, size = [], 0
+    if segment:
+        yield "\n".join(segment)
+
+
+def iter_text(file_path: str, file_type: str) -> Iterator[str]:
+    """
+    Yield a document's text segment by segment
+
+    Args:
+        file_path: Path to file
+        file_type: File extension (pdf, txt, docx)
+
+    Returns:
+        Iterator over text segments, in document order
+    """
+    if file_type == "txt":
+        return _iter_txt(file_path)
+    elif file_type == "pdf":
+        return _iter_pdf(file_path)
+    elif file_type == "docx":
+        return _iter_docx(file_path)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def extract_chunks(file_path: str, file_type: str, text_splitter: TextSplitter,
+                   max_buffer_chars: int = MAX_BUFFER_CHARS,
+                   timings: Optional[Dict[str, float]] = None) -> Iterator[Document]:
+    """
+    Stream a document through the text splitter
+
+    Segments are appended to a buffer; once it reaches max_buffer_chars it
+    is split, every chunk but the last is emitted, and the last chunk is
+    carried over as the start of the next buffer so chunk boundaries (and
+    overlap) continue naturally across buffers.
+
+    Args:
+        file_path: Path to file
+        file_type: File extension (pdf, txt, docx)
+        text_splitter: Splitter used to cut the buffer into chunks
+        max_buffer_chars: Memory ceiling for buffered text
+        timings: Optional dict that receives the seconds spent reading text
+                 ("extract") and splitting it ("split"); the two interleave,
+                 so they are accumulated separately here
+
+    Returns:
+        Iterator over chunk Documents
+    """
+    timings = timings if timings is not None else {}
+    timings.setdefault("extract", 0.0)
+    timings.setdefault("split", 0.0)
+
+    def split(text: str) -> List[str]:
+        start = time.perf_counter()
+        pieces = text_splitter.split_text(text)
+        timings["split"] += time.perf_counter() - start
+        return pieces
+
+    segments = iter_text(file_path, file_type)
+    buffer: List[str] = []
+    size = 0
+    while True:
+        start = time.perf_counter()
+        segment = next(segments, None)
+        timings["extract"] += time.perf_counter() - start
+        if segment is None:
+            break
+        buffer.append(segment)
+        size += len(segment)
+        if size < max_buffer_chars:
+            continue
+
+        pieces = split("".join(buffer))
+        for piece in pieces[:-1]:
+            yield Document(page_content=piece)
+        buffer = pieces[-1:]
+        size = sum(len(piece) for piece in buffer)
+
+    for piece in split("".join(buffer)):
+        yield Document(page_content=piece)
@@ -0,0 +1,332 @@
+"""
+History Store - Bounded, Persistent Conversation History
+
+This module implements:
+- An append-only SQLite store (WAL mode) shared by every uvicorn worker
+- An in-memory store for single-process setups
+- Per-session message caps (oldest messages are dropped first)
+- Eviction of sessions that have been idle longer than a time-to-live
+- Paginated reads, so a long conversation is never loaded all at once
+- A page-by-page message iterator for exports, keyed by message id so
+  messages appended or trimmed during an export never shift its pages
+
+Both stores expose the same methods; create_history_store() picks one
+from the environment.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Idle sessions are swept at most this often (seconds)
+EVICTION_INTERVAL_SECONDS = 60
+
+
+class SQLiteHistoryStore:
+    """
+    Conversation history in a SQLite database
+
+    Messages are appended to one table; a second table tracks each session's
+    message count and last activity so caps and idle eviction never scan the
+    messages themselves.
+    """
+
+    def __init__(self, path: str, max_messages_per_session: int = 200,
+                 session_ttl_seconds: float = 7 * 24 * 3600):
+        """
+        Args:
+            path: SQLite database file
+            max_messages_per_session: Messages kept per session (older ones are dropped)
+            session_ttl_seconds: Sessions idle for longer than this are deleted
+        """
+        self.path = path
+        self.max_messages_per_session = max_messages_per_session
+        self.session_ttl_seconds = session_ttl_seconds
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Other workers may be writing at the same time
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,"
+            " role TEXT NOT NULL, content TEXT NOT NULL, timestamp TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, message_count INTEGER NOT NULL,"
+            " last_active REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions(last_active)")
+        self._conn.commit()
+
+    def append(self, session_id: str, role: str, content: str,
+               timestamp: Optional[str] = None) -> None:
+        """Add a message to a session, trimming the session to its cap"""
+        timestamp = timestamp or datetime.now().isoformat()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                (session_id, role, content, timestamp)
+            )
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, message_count, last_active) VALUES (?, 1, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET"
+                " message_count = message_count + 1, last_active = excluded.last_active",
+                (session_id, now)
+            )
+            count = self._conn.execute(
+                "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            if count > self.max_messages_per_session:
+                self._trim(session_id, count)
+            if now - self._last_eviction > EVICTION_INTERVAL_SECONDS:
+                self._evict_idle(now)
+            self._conn.commit()
+
+    def _trim(self, session_id: str, count: int) -> None:
+        """Delete a session's oldest messages above the cap"""
+        excess = count - self.max_messages_per_session
+        self._conn.execute(
+            "DELETE FROM messages WHERE id IN ("
+            " SELECT id FROM messages WHERE session_id = ? ORDER BY id LIMIT ?)",
+            (session_id, excess)
+        )
+        self._conn.execute(
+            "UPDATE sessions SET message_count = ? WHERE session_id = ?",
+            (self.max_messages_per_session, session_id)
+        )
+
+    def _evict_idle(self, now: float) -> int:
+        """Delete sessions idle past the TTL; returns how many were removed"""
+        self._last_eviction = now
+        cutoff = now - self.session_ttl_seconds
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+        )]
+        for start in range(0, len(expired), 500):
+            batch = expired[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM messages WHERE session_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM sessions WHERE session_id IN ({placeholders})", batch)
+        return len(expired)
+
+    def evict_idle(self) -> int:
+        """Sweep idle sessions now"""
+        with self._lock:
+            removed = self._evict_idle(time.time())
+            self._conn.commit()
+            return removed
+
+    def get_messages(self, session_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """
+        One page of a session's messages, oldest first
+
+        Args:
+            session_id: Conversation session
+            offset: Messages to skip
+            limit: Maximum messages to return
+
+        Returns:
+            List of {"role", "content", "timestamp"} dicts
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE session_id = ?"
+                " ORDER BY id LIMIT ? OFFSET ?",
+                (session_id, limit, offset)
+            ).fetchall()
+        return [{"role": role, "content": content, "timestamp": timestamp}
+                for role, content, timestamp in rows]
+
+    def get_messages_after(self, session_id: str, after: int = 0, limit: int = 100) -> List[Tuple[int, Dict]]:
+        """
+        Up to limit messages with an id above after, oldest first (keyset paging)
+
+        Args:
+            session_id: Conversation session
+            after: Id of the last message already read (0: from the start)
+            limit: Maximum messages to return
+
+        Returns:
+            List of (message id, {"role", "content", "timestamp"}) pairs
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, role, content, timestamp FROM messages WHERE session_id = ? AND id > ?"
+                " ORDER BY id LIMIT ?",
+                (session_id, after, limit)
+            ).fetchall()
+        return [(message_id, {"role": role, "content": content, "timestamp": timestamp})
+                for message_id, role, content, timestamp in rows]
+
+    def count(self, session_id: str) -> int:
+        """Messages currently stored for a session"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            sessions, messages = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(message_count), 0) FROM sessions"
+            ).fetchone()
+        return {"backend": "sqlite", "sessions": sessions, "messages": messages}
+
+
+class MemoryHistoryStore:
+    """
+    Conversation history in process memory
+
+    Bounded by both a per-session cap and a maximum number of sessions (the
+    least recently active session is dropped first), so memory stays flat.
+    Not shared between workers and lost on restart.
+    """
+
+    def __init__(self, max_messages_per_session: int = 200,
+                 session_ttl_seconds: float = 7 * 24 * 3600, max_sessions: int = 10000):
+        """
+        Args:
+            max_messages_per_session: Messages kept per session (older ones are dropped)
+            session_ttl_seconds: Sessions idle for longer than this are deleted
+            max_sessions: Sessions kept at once
+        """
+        self.max_messages_per_session = max_messages_per_session
+        self.session_ttl_seconds = session_ttl_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._last_eviction = 0.0
+        # session id -> (last_active, deque of messages, messages ever appended),
+        # least recently active first; message i of the deque has id
+        # appended - len(deque) + i + 1, which trimming does not change
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def append(self, session_id: str, role: str, content: str,
+               timestamp: Optional[str] = None) -> None:
+        """Add a message to a session, trimming the session to its cap"""
+        message = {
+            "role": role,
+            "content": content,
+            "timestamp": timestamp or datetime.now().isoformat()
+        }
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            messages, appended = (entry[1], entry[2]) if entry else (deque(maxlen=self.max_messages_per_session), 0)
+            messages.append(message)
+            self._sessions[session_id] = (now, messages, appended + 1)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            if now - self._last_eviction > EVICTION_INTERVAL_SECONDS:
+                self._evict_idle(now)
+
+    def _evict_idle(self, now: float) -> int:
+        self._last_eviction = now
+        cutoff = now - self.session_ttl_seconds
+        removed = 0
+        # Ordered by last activity, so stop at the first live session
+        while self._sessions:
+            session_id, (last_active, _, _) = next(iter(self._sessions.items()))
+            if last_active >= cutoff:
+                break
+            del self._sessions[session_id]
+            removed += 1
+        return removed
+
+    def evict_idle(self) -> int:
+        """Sweep idle sessions now"""
+        with self._lock:
+            return self._evict_idle(time.time())
+
+    def get_messages(self, session_id: str, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """One page of a session's messages, oldest first"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            messages = entry[1]
+            return [messages[i] for i in range(offset, min(offset + limit, len(messages)))]
+
+    def get_messages_after(self, session_id: str, after: int = 0, limit: int = 100) -> List[Tuple[int, Dict]]:
+        """Up to limit messages with an id above after, oldest first (keyset paging)"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            _, messages, appended = entry
+            first_id = appended - len(messages) + 1
+            start = max(0, after + 1 - first_id)
+            return [(first_id + i, messages[i]) for i in range(start, min(start + limit, len(messages)))]
+
+    def count(self, session_id: str) -> int:
+        """Messages currently stored for a session"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return len(entry[1]) if entry else 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "messages": sum(len(messages) for _, messages, _ in self._sessions.values())
+            }
+
+
+def iter_messages(store, session_id: str, page_size: int = 200) -> Iterator[Dict]:
+    """
+    Yield a session's messages oldest first, reading page_size at a time
+
+    Pages continue after the id of the last message read rather than at an
+    offset, so each read is an index seek and messages trimmed or appended
+    meanwhile do not make the export skip or repeat any.
+
+    Args:
+        store: SQLiteHistoryStore or MemoryHistoryStore
+        session_id: Conversation session
+        page_size: Messages fetched per read
+
+    Returns:
+        Iterator over {"role", "content", "timestamp"} dicts
+    """
+    after = 0
+    while True:
+        page = store.get_messages_after(session_id, after=after, limit=page_size)
+        for _, message in page:
+            yield message
+        if len(page) < page_size:
+            return
+        after = page[-1][0]
+
+
+def create_history_store():
+    """
+    History store configured by the environment
+
+    HISTORY_BACKEND selects "sqlite" (default) or "memory"; HISTORY_DB_PATH,
+    HISTORY_MAX_MESSAGES and HISTORY_SESSION_TTL_SECONDS tune it.
+    """
+    max_messages = int(os.getenv("HISTORY_MAX_MESSAGES", "200"))
+    ttl_seconds = float(os.getenv("HISTORY_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+    backend = os.getenv("HISTORY_BACKEND", "sqlite").lower()
+
+    if backend == "memory":
+        return MemoryHistoryStore(max_messages_per_session=max_messages, session_ttl_seconds=ttl_seconds)
+    if backend != "sqlite":
+        print(f"Warning: Unknown HISTORY_BACKEND '{backend}', using sqlite")
+    return SQLiteHistoryStore(
+        os.getenv("HISTORY_DB_PATH", "conversation_history.sqlite3"),
+        max_messages_per_session=max_messages,
+        session_ttl_seconds=ttl_seconds
+    )
@@ -0,0 +1,218 @@
+"""
+Index Store - On-disk Persistence for the FAISS Vector Store
+
+This module implements:
+- Atomic snapshots of the FAISS index and chunk docstore
+- A small JSON summary per snapshot (document and chunk counts), readable
+  without loading the index
+- Generation directories switched by an atomically replaced CURRENT file
+- Memory-mapped loading for large indexes (restart bounded by disk reads)
+- Durable saves: the index, docstore and directories are fsynced before
+  and after CURRENT is switched
+- A cross-process write lock, so several uvicorn workers can share one
+  index directory: writers serialize on it, readers follow CURRENT
+"""
+
+import json
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import faiss
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.pkl"
+SUMMARY_FILE = "summary.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+
+# IO_FLAG_MMAP only maps IVF inverted lists; FAISS >= 1.10 can also map the
+# code arrays of flat, SQ and PQ indexes (and IVF lists), so use that if present
+MMAP_CODES = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAGS = (faiss.IO_FLAG_MMAP_IFC if MMAP_CODES else faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class IndexStore:
+    """
+    Persists a FAISS index plus its docstore under a directory:
+
+        <directory>/CURRENT          -> name of the live generation
+        <directory>/gen-000007/index.faiss
+        <directory>/gen-000007/docstore.pkl
+        <directory>/gen-000007/summary.json
+
+    A snapshot is written to a fresh generation directory and only becomes
+    visible when CURRENT is replaced, so readers never see a half-written
+    index. The generation name doubles as the index version: other
+    processes compare it with what they loaded to detect new snapshots.
+    The previous generation is kept one save longer, so a process that is
+    still loading it is not pulled out from under; older ones are removed.
+    """
+
+    def __init__(self, directory: str, mmap_min_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            directory: Directory that holds the snapshots
+            mmap_min_bytes: Indexes at least this large are memory-mapped on load
+        """
+        self.directory = directory
+        self.mmap_min_bytes = mmap_min_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def current_generation(self) -> Optional[str]:
+        """Name of the live generation directory, or None if nothing was saved"""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def write_lock(self) -> Iterator[None]:
+        """
+        Exclusive lock over the directory, held by whichever process is
+        updating the index (flock: released automatically if the holder dies)
+        """
+        with open(os.path.join(self.directory, LOCK_FILE), "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def save(self, index: Any, state: Dict, summary: Optional[Dict] = None) -> str:
+        """
+        Write a new snapshot and atomically make it current
+
+        Args:
+            index: FAISS index object
+            state: Picklable docstore state (docstore, id mapping, ...)
+            summary: JSON-serializable facts about the snapshot, returned by summary()
+
+        Returns:
+            Name of the new generation
+        """
+        previous = self.current_generation()
+        number = int(previous.split("-")[1]) + 1 if previous else 1
+        generation = f"gen-{number:06d}"
+        gen_dir = os.path.join(self.directory, generation)
+        os.makedirs(gen_dir, exist_ok=True)
+
+        index_path = os.path.join(gen_dir, INDEX_FILE)
+        faiss.write_index(index, index_path)
+        _fsync_path(index_path)
+        with open(os.path.join(gen_dir, DOCSTORE_FILE), "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        if summary is not None:
+            with open(os.path.join(gen_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+                json.dump(summary, f)
+                f.flush()
+                os.fsync(f.fileno())
+        # The generation's entries, and the generation itself, before CURRENT points at it
+        _fsync_dir(gen_dir)
+        _fsync_dir(self.directory)
+
+        # Switch CURRENT atomically
+        tmp_path = os.path.join(self.directory, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, CURRENT_FILE))
+        _fsync_dir(self.directory)
+
+        self._remove_old_generations(keep={generation, previous})
+        return generation
+
+    def load(self, mmap: Optional[bool] = None) -> Optional[Tuple[Any, Dict, bool, str]]:
+        """
+        Load the current snapshot
+
+        Args:
+            mmap: Force (True) or avoid (False) memory-mapping; by default
+                  indexes of at least mmap_min_bytes are memory-mapped
+
+        Returns:
+            (index, state, mmapped, generation) or None if no snapshot exists;
+            mmapped is only True if the vectors really are mapped (read-only)
+        """
+        generation = self.current_generation()
+        if generation is None:
+            return None
+
+        gen_dir = os.path.join(self.directory, generation)
+        index_path = os.path.join(gen_dir, INDEX_FILE)
+        mmapped = os.path.getsize(index_path) >= self.mmap_min_bytes if mmap is None else mmap
+        index = self.read_index(index_path, mmap=mmapped)
+        if not MMAP_CODES and faiss.try_extract_index_ivf(index) is None:
+            # Older FAISS read a non-IVF index fully into RAM despite the flag
+            mmapped = False
+
+        # The docstore is our own pickle, written by save() above
+        with open(os.path.join(gen_dir, DOCSTORE_FILE), "rb") as f:
+            state = pickle.load(f)
+
+        return index, state, mmapped, generation
+
+    def summary(self) -> Optional[Dict]:
+        """
+        Summary saved with the current snapshot, without loading the snapshot
+
+        Returns:
+            The summary, or None if nothing was saved or the snapshot has no summary
+        """
+        generation = self.current_generation()
+        if generation is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, generation, SUMMARY_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_index(self, generation: Optional[str] = None, mmap: bool = False) -> Any:
+        """
+        Read one generation's index (default: the current one)
+
+        Fully into RAM before adding to a mmapped index, or memory-mapped to
+        rebuild from a saved snapshot: a mapped generation stays readable
+        after later saves remove its directory.
+        """
+        generation = generation or self.current_generation()
+        return self.read_index(os.path.join(self.directory, generation, INDEX_FILE), mmap=mmap)
+
+    @staticmethod
+    def read_index(path: str, mmap: bool) -> Any:
+        if mmap:
+            return faiss.read_index(path, MMAP_FLAGS)
+        return faiss.read_index(path)
+
+    def _remove_old_generations(self, keep: set) -> None:
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: str) -> None:
+    """Persist a directory's entries (new or renamed files); not possible on Windows"""
+    if os.name != "nt":
+        _fsync_path(path)
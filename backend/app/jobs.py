@@ -0,0 +1,137 @@
+"""
+Ingestion Jobs - Background Document Processing
+
+This module implements:
+- A bounded worker pool that runs process_document off the event loop
+- Per-job status records with the current pipeline stage
+  (queued -> extract -> chunk -> embed -> index -> done)
+- Optional status files in a shared directory, so any worker process can
+  answer GET /jobs/{job_id} for a job another worker is running
+"""
+
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+# Only the most recent finished jobs are kept for status lookups
+MAX_FINISHED_JOBS = 1000
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a fixed-size thread pool
+
+    Threads (not processes) are used because the engines keep their index
+    in process memory; the heavy parts (PDF parsing, embedding HTTP calls,
+    FAISS adds) release the GIL or wait on I/O.
+    """
+
+    def __init__(self, max_workers: int = 2, status_dir: Optional[str] = None):
+        """
+        Args:
+            max_workers: Number of documents ingested concurrently
+            status_dir: Directory shared by all worker processes where job
+                        records are mirrored (None: this process only)
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self.jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.status_dir = status_dir
+        if status_dir:
+            os.makedirs(status_dir, exist_ok=True)
+
+    def submit(self, task: Callable[[Callable[[str], None]], int], document_id: str) -> str:
+        """
+        Queue an ingestion task
+
+        Args:
+            task: Callable taking a progress(stage) callback and returning the chunk count
+            document_id: Document the job ingests
+
+        Returns:
+            Job id
+        """
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "document_id": document_id,
+                "status": "queued",
+                "stage": "queued",
+                "chunks_processed": 0,
+                "error": None,
+                "created_at": now,
+                "updated_at": now
+            }
+            self._write_status(self.jobs[job_id])
+            self._prune()
+        self.executor.submit(self._run, job_id, task)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job record, or None if unknown"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._read_status(job_id)
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self.jobs[job_id].update(fields, updated_at=datetime.now().isoformat())
+            self._write_status(self.jobs[job_id])
+
+    def _status_path(self, job_id: str) -> Optional[str]:
+        # Job ids are uuid4 hex; anything else never names a status file
+        if not self.status_dir or not job_id.isalnum():
+            return None
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def _write_status(self, job: Dict) -> None:
+        """Mirror a job record to its status file (atomic replace, called under _lock)"""
+        path = self._status_path(job["job_id"])
+        if path is None:
+            return
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write job status: {e}")
+
+    def _read_status(self, job_id: str) -> Optional[Dict]:
+        """Job record written by another worker process, if any"""
+        path = self._status_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _run(self, job_id: str, task: Callable[[Callable[[str], None]], int]) -> None:
+        self._update(job_id, status="running")
+        try:
+            chunks = task(lambda stage: self._update(job_id, stage=stage))
+            self._update(job_id, status="completed", stage="done", chunks_processed=chunks)
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond MAX_FINISHED_JOBS (called under _lock)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            path = self._status_path(job_id)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+"""
+Local Embeddings - Offline Hashing-trick Embedder
+
+This module implements:
+- A LangChain Embeddings provider that needs no network or model download
+- Word unigram + bigram features hashed into a fixed number of buckets
+  (signed hashing trick), with sublinear term frequency weighting
+- A seeded Gaussian random projection to a dense vector, vectorized in NumPy
+
+Vectors depend only on the text and the constructor arguments, never on
+the corpus, so they stay valid in a persisted FAISS index across restarts
+and processes.
+"""
+
+import zlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.bm25_index import tokenize
+
+
+@lru_cache(maxsize=1 << 18)
+def _feature(term: str, n_features: int) -> Tuple[int, float]:
+    """Bucket and sign of a term (crc32 is stable across processes, unlike hash())"""
+    h = zlib.crc32(term.encode("utf-8"))
+    return h % n_features, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Hashing-trick + random-projection embeddings
+
+    Semantic quality is well below a neural embedding model (it captures
+    shared words and word pairs, not synonyms), but embedding is local,
+    deterministic and takes microseconds per text.
+    """
+
+    def __init__(self, dimensions: int = 384, n_features: int = 1 << 15, seed: int = 42):
+        """
+        Args:
+            dimensions: Size of the output vectors
+            n_features: Hash buckets before projection
+            seed: Seed of the projection matrix (changing it invalidates stored vectors)
+        """
+        self.dimensions = dimensions
+        self.n_features = n_features
+        self.seed = seed
+        self.model_name = f"local-hashing-{n_features}x{dimensions}-seed{seed}"
+
+        rng = np.random.default_rng(seed)
+        self._projection = (
+            rng.standard_normal((n_features, dimensions), dtype=np.float32) / np.sqrt(dimensions)
+        )
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket ids and weights of a text's unigrams and bigrams"""
+        tokens = tokenize(text)
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        if not terms:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        buckets = np.empty(len(terms), dtype=np.int64)
+        signs = np.empty(len(terms), dtype=np.float32)
+        for i, term in enumerate(terms):
+            buckets[i], signs[i] = _feature(term, self.n_features)
+
+        # Sum signed counts per bucket, then damp repeated terms
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        counts = np.zeros(len(unique), dtype=np.float32)
+        np.add.at(counts, inverse, signs)
+        weights = np.sign(counts) * np.log1p(np.abs(counts))
+        return unique, weights
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for i, text in enumerate(texts):
+            buckets, weights = self._features(text)
+            if len(buckets):
+                # Sparse hashed vector times the projection: only its nonzero rows are read
+                vectors[i] = weights @ self._projection[buckets]
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
@@ -0,0 +1,55 @@
+"""
+Locks - Synchronization Helpers Shared by the Engines
+
+This module implements:
+- A readers-writer lock: many concurrent searches, exclusive index updates
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Readers-writer lock with writer preference
+
+    Queries take the read side around index searches so they run in
+    parallel; ingestion takes the write side only for the short in-memory
+    index update, so readers always see either the old or the new index.
+    A waiting writer blocks new readers, so ingestion is never starved.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
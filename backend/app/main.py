@@ -1,39 +1,203 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import contextlib
 import os
-import shutil
-from app.models import QueryRequest, QueryResponse, UploadResponse, DocumentInfo, DocumentListResponse
+import hashlib
+import uuid
+from app.models import QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse, UploadResponse, JobStatusResponse, DocumentInfo, DocumentListResponse, CollectionInfo, CollectionListResponse
 from datetime import datetime
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Match
 import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from app.rag_engine import RAGEngine
 from app.rag_engine_demo import RAGEngineDemo
 from app.agent import AgenticWorkflow
+from app.jobs import JobManager
+from app.answer_cache import AnswerCache
+from app.history_store import create_history_store, iter_messages
+from app.collection_manager import CollectionManager, DEFAULT_COLLECTION
+from app import metrics
 import os
 
 app = FastAPI(title="RAG Assistant API", version="1.0.0")
 
+# Uploads are streamed to disk in blocks and rejected once they exceed this size
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+# Multipart boundaries and part headers on top of the file itself
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+class UploadSizeLimit:
+    """
+    Refuse oversized /upload bodies before they are parsed
+    
+    Starlette spools the whole multipart body before the handler runs, so
+    the file limit in save_upload alone would only apply afterwards.
+    Requests are rejected from their Content-Length up front; bodies
+    without one are cut off as soon as they grow past the limit.
+    """
+    
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+    
+    def too_large(self) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"File exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes")
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/upload":
+            await self.app(scope, receive, send)
+            return
+        
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_body_bytes:
+            error = self.too_large()
+            await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Re-raised by FastAPI's body parsing and answered as a 413
+                    raise self.too_large()
+            return message
+        
+        await self.app(scope, receive_limited, send)
+
+# Added first, so it is the innermost middleware: its errors reach FastAPI's
+# body parsing directly instead of through BaseHTTPMiddleware's task group
+app.add_middleware(UploadSizeLimit, max_body_bytes=MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES)
+
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
+def route_template(request: Request) -> str:
+    """Route path such as /documents/{document_id} (keeps metric label cardinality bounded)"""
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # Path matches but the method does not (405)
+            partial = route.path
+    return partial or "unmatched"
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Request latency and in-flight requests per route (streamed bodies: until headers are sent)"""
+    endpoint = route_template(request)
+    in_flight = metrics.REQUESTS_IN_FLIGHT.labels(endpoint)
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        metrics.REQUEST_SECONDS.labels(request.method, endpoint, str(status)).observe(time.perf_counter() - start)
+
 # Check if we should use demo mode (no OpenAI required)
 USE_DEMO_MODE = os.getenv("USE_DEMO_MODE", "false").lower() == "true"
 HAS_API_KEY = bool(os.getenv("OPENAI_API_KEY"))
+# "openai" or "local" (offline embeddings: the full engine runs without an API key)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+USE_LOCAL_EMBEDDINGS = EMBEDDING_PROVIDER == "local"
 
-# Use demo mode if no API key or explicitly requested
-if USE_DEMO_MODE or not HAS_API_KEY:
+# Use demo mode if no API key (and no local embeddings) or explicitly requested
+if USE_DEMO_MODE or not (HAS_API_KEY or USE_LOCAL_EMBEDDINGS):
     print("🔓 Running in DEMO MODE (No OpenAI API required - Free!)")
     rag_engine = RAGEngineDemo()
     agent = None  # Agentic workflow requires OpenAI
 else:
-    print("🔐 Running in FULL MODE (OpenAI API enabled)")
+    print(f"🔐 Running in FULL MODE ({'local embeddings' if USE_LOCAL_EMBEDDINGS else 'OpenAI embeddings'}, "
+          f"{'OpenAI LLM' if HAS_API_KEY else 'no LLM: retrieval-only answers'})")
     rag_engine = RAGEngine()
-    agent = AgenticWorkflow(rag_engine)
+    agent = AgenticWorkflow(rag_engine) if HAS_API_KEY else None
+
+# With several workers (uvicorn --workers N) each one follows the index
+# snapshots the others save; INDEX_POLL_SECONDS=0 turns this off
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "1.0"))
+
+# Named collections, one index each; rag_engine is the "default" collection.
+# Full mode persists them under INDEX_DIR/collections, demo mode keeps them in memory.
+if isinstance(rag_engine, RAGEngineDemo):
+    collections = CollectionManager(rag_engine, lambda directory: RAGEngineDemo())
+else:
+    collections = CollectionManager(
+        rag_engine,
+        lambda directory: RAGEngine(index_dir=directory, shared=rag_engine),
+        root_dir=os.path.join(os.getenv("INDEX_DIR", "index_store"), "collections"),
+        max_workers=int(os.getenv("COLLECTION_SEARCH_WORKERS", "8")),
+        poll_seconds=INDEX_POLL_SECONDS
+    )
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Store conversation history (simple in-memory storage)
-conversation_history = {}
+def collection_upload_dir(collection: str) -> str:
+    """Uploaded files of a collection (the default collection keeps using UPLOAD_DIR itself)"""
+    if collection == DEFAULT_COLLECTION:
+        return UPLOAD_DIR
+    directory = os.path.join(UPLOAD_DIR, collection)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def resolve_collections(names: Optional[List[str]]) -> List[Tuple[str, Any]]:
+    """(name, engine) pairs for a request's collections; 400 for bad names, 404 for unknown ones"""
+    try:
+        return collections.resolve(names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Collection '{e.args[0]}' not found")
+
+# content hash -> job id, for identical uploads that are still being ingested
+pending_uploads = {}
+# upload path -> job id: extraction reopens the file (PDF page ranges are read
+# by several processes), so it must not be replaced while its job is pending
+pending_paths = {}
+
+# Ingestion runs in the background on a bounded worker pool; job records are
+# mirrored to JOB_STATUS_DIR so any uvicorn worker can report a job's progress
+job_manager = JobManager(
+    max_workers=int(os.getenv("INGEST_WORKERS", "2")),
+    status_dir=os.getenv("JOB_STATUS_DIR", "job_status") or None
+)
+
+# Answers keyed by normalized question, k, mode and corpus version
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+    persist_path=os.getenv("ANSWER_CACHE_PATH") or None
+)
+
+# Conversation history: bounded per session, idle sessions evicted (SQLite by default)
+history_store = create_history_store()
+
+@app.on_event("startup")
+async def load_persisted_index():
+    """Load the saved index in the background; /health reports ready once it finishes"""
+    if hasattr(rag_engine, 'load_index'):
+        threading.Thread(target=rag_engine.load_index, daemon=True).start()
+    if hasattr(rag_engine, 'watch_index') and INDEX_POLL_SECONDS > 0:
+        threading.Thread(target=rag_engine.watch_index, args=(INDEX_POLL_SECONDS,), daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_ingestion_workers():
+    job_manager.shutdown()
+    answer_cache.save()
+    metrics.mark_process_dead()
 
 @app.get("/")
 async def root():
@@ -41,88 +205,248 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    doc_count = len(rag_engine.documents) if hasattr(rag_engine, 'documents') else 0
+    doc_count = len(rag_engine.registry)
+    index_loaded = rag_engine.index_ready.is_set()
     return {
-        "status": "healthy", 
-        "rag_engine_ready": doc_count > 0,
-        "mode": "DEMO (Free)" if USE_DEMO_MODE or not HAS_API_KEY else "FULL (OpenAI)"
+        "status": "healthy" if index_loaded else "loading",
+        "index_loaded": index_loaded,
+        "rag_engine_ready": index_loaded and doc_count > 0,
+        "mode": "DEMO (Free)" if isinstance(rag_engine, RAGEngineDemo)
+                else "FULL (local embeddings)" if USE_LOCAL_EMBEDDINGS else "FULL (OpenAI)"
     }
 
+def store_block(buffer, digest, block: bytes) -> None:
+    """Hash one upload block and append it to the temporary file"""
+    digest.update(block)
+    buffer.write(block)
+
+async def save_upload(file: UploadFile) -> tuple:
+    """
+    Stream an upload to a temporary file while hashing it
+    
+    Hashing and disk writes run in a worker thread, block by block, so a
+    slow disk never stalls the event loop.
+    
+    Returns:
+        (temporary path, sha256 hex digest)
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes")
+    
+    tmp_path = os.path.join(UPLOAD_DIR, f".upload-{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while True:
+                block = await file.read(UPLOAD_BLOCK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the upload limit of {MAX_UPLOAD_BYTES} bytes")
+                await asyncio.to_thread(store_block, buffer, digest, block)
+    except BaseException:
+        # open() itself may have failed: never hide the original error
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest()
+
 @app.post("/upload", response_model=UploadResponse)
-async def upload_document(file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
     try:
-        file_ext = file.filename.split(".")[-1].lower()
+        # Never trust client-supplied paths
+        filename = os.path.basename(file.filename or "")
+        file_ext = filename.split(".")[-1].lower()
         if file_ext not in ["pdf", "txt", "docx"]:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file_ext}")
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        chunks_processed = rag_engine.process_document(file_path, file_ext)
-        return UploadResponse(message=f"Document '{file.filename}' processed", document_id=file.filename, chunks_processed=chunks_processed)
+        try:
+            CollectionManager.validate_name(collection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        tmp_path, content_hash = await save_upload(file)
+        # The first upload to a new collection creates it
+        engine = await asyncio.to_thread(collections.get, collection, True)
+        
+        # Identical content: reuse the existing document, nothing is re-extracted or re-embedded
+        existing = engine.find_document(content_hash)
+        if existing is not None:
+            os.remove(tmp_path)
+            return UploadResponse(
+                message=f"Document '{filename}' is identical to '{existing['document_id']}', already processed",
+                document_id=existing["document_id"],
+                chunks_processed=existing["chunks"],
+                status="duplicate",
+                collection=collection
+            )
+        pending_key = f"{collection}:{content_hash}"
+        pending_job = job_manager.get(pending_uploads.get(pending_key, ""))
+        if pending_job is not None and pending_job["status"] in ("queued", "running"):
+            os.remove(tmp_path)
+            return UploadResponse(
+                message=f"Document '{filename}' is identical to '{pending_job['document_id']}', already being processed",
+                document_id=pending_job["document_id"],
+                chunks_processed=0,
+                job_id=pending_job["job_id"],
+                status=pending_job["status"],
+                collection=collection
+            )
+        
+        file_path = os.path.join(collection_upload_dir(collection), filename)
+        # Different content under the same name: wait for the pending job first
+        path_job = job_manager.get(pending_paths.get(file_path, ""))
+        if path_job is not None and path_job["status"] in ("queued", "running"):
+            os.remove(tmp_path)
+            raise HTTPException(
+                status_code=409,
+                detail=f"Document '{filename}' is still being processed (job {path_job['job_id']}), "
+                       f"upload it again once that job has finished"
+            )
+        os.replace(tmp_path, file_path)
+        
+        def ingest(progress):
+            try:
+                return engine.process_document(file_path, file_ext, progress=progress, content_hash=content_hash)
+            finally:
+                pending_uploads.pop(pending_key, None)
+                pending_paths.pop(file_path, None)
+        
+        # Extraction, chunking and embedding happen off the event loop; poll /jobs/{job_id}
+        job_id = job_manager.submit(ingest, document_id=filename)
+        pending_uploads[pending_key] = job_id
+        pending_paths[file_path] = job_id
+        return UploadResponse(
+            message=f"Document '{filename}' queued for processing",
+            document_id=filename,
+            chunks_processed=0,
+            job_id=job_id,
+            status="queued",
+            collection=collection
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.get("/stats")
-async def get_stats():
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """Progress of a background ingestion job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JobStatusResponse(**job)
+
+def collect_stats() -> Dict:
+    """Engine, cache and history statistics (served by /stats and exported at /metrics)"""
     stats = rag_engine.get_stats()
     return {
         "total_chunks": stats["total_chunks"],
         "has_vector_store": stats.get("has_vector_store", False),
-        "total_documents": stats.get("total_documents", 0)
+        "total_documents": stats.get("total_documents", 0),
+        "embedding_cache": stats.get("embedding_cache"),
+        "embedding_batcher": stats.get("embedding_batcher"),
+        "answer_cache": answer_cache.get_stats(),
+        "conversation_history": history_store.get_stats()
     }
 
+metrics.register_stats(collect_stats)
+
+@app.get("/stats")
+async def get_stats():
+    return await asyncio.to_thread(collect_stats)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: stage latency histograms, request metrics, index and cache gauges"""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=503, detail="Metrics are disabled: install prometheus_client to enable /metrics")
+    return Response(content=await asyncio.to_thread(metrics.render_latest), media_type=metrics.CONTENT_TYPE_LATEST)
+
 # ==================== NEW FEATURES ====================
 
+@app.get("/collections", response_model=CollectionListResponse)
+async def list_collections():
+    """List collections with their document and chunk counts"""
+    try:
+        infos = [CollectionInfo(**info) for info in await asyncio.to_thread(collections.list)]
+        return CollectionListResponse(collections=infos, total=len(infos))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing collections: {str(e)}")
+
 @app.get("/documents", response_model=DocumentListResponse)
-async def list_documents():
-    """List all uploaded documents"""
+async def list_documents(collection: str = DEFAULT_COLLECTION):
+    """List all ingested documents of a collection (chunk counts come from the document registry)"""
+    [(_, engine)] = await asyncio.to_thread(resolve_collections, [collection])
     try:
-        documents = []
-        if os.path.exists(UPLOAD_DIR):
-            for filename in os.listdir(UPLOAD_DIR):
-                file_path = os.path.join(UPLOAD_DIR, filename)
-                if os.path.isfile(file_path):
-                    # Get file stats
-                    stat = os.stat(file_path)
-                    upload_date = datetime.fromtimestamp(stat.st_mtime).isoformat()
-                    
-                    # Count chunks for this document (simplified - count by filename match)
-                    chunks = 0
-                    if hasattr(rag_engine, 'chunks'):
-                        chunks = len([c for c in rag_engine.chunks if filename in str(c)])
-                    
-                    documents.append(DocumentInfo(
-                        document_id=filename,
-                        filename=filename,
-                        chunks=chunks if chunks > 0 else 1,  # At least 1 if file exists
-                        upload_date=upload_date
-                    ))
+        documents = [
+            DocumentInfo(
+                document_id=record["document_id"],
+                filename=record["filename"],
+                chunks=record["chunks"],
+                upload_date=record["upload_date"]
+            )
+            for record in engine.list_documents()
+        ]
         
         return DocumentListResponse(documents=documents, total=len(documents))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
 @app.delete("/documents/{document_id}")
-async def delete_document(document_id: str):
-    """Delete a specific document"""
+async def delete_document(document_id: str, collection: str = DEFAULT_COLLECTION):
+    """Delete a document's chunks from the index, then its uploaded file"""
     try:
-        file_path = os.path.join(UPLOAD_DIR, document_id)
+        [(_, engine)] = await asyncio.to_thread(resolve_collections, [collection])
+        document_id = os.path.basename(document_id)
+        file_path = os.path.join(collection_upload_dir(collection), document_id)
         
-        if not os.path.exists(file_path):
+        # Removing the chunks bumps the corpus version, so cached answers go stale
+        record = await asyncio.to_thread(engine.delete_document, document_id)
+        file_exists = os.path.isfile(file_path)
+        if record is None and not file_exists:
             raise HTTPException(status_code=404, detail=f"Document '{document_id}' not found")
         
-        # Delete the file
-        os.remove(file_path)
+        if file_exists:
+            os.remove(file_path)
         
-        # Remove from RAG engine (simplified - would need document tracking for full implementation)
-        # For now, just delete the file
-        
-        return {"message": f"Document '{document_id}' deleted successfully", "document_id": document_id}
+        return {
+            "message": f"Document '{document_id}' deleted successfully",
+            "document_id": document_id,
+            "chunks_removed": record["chunks"] if record else 0
+        }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
+def get_session_id(request: QueryRequest) -> str:
+    """Session id sent by the client in the first chat_history entry"""
+    if request.chat_history and len(request.chat_history) > 0:
+        return request.chat_history[0].get("session_id", "default")
+    return "default"
+
+def record_message(session_id: str, role: str, content: str) -> None:
+    """Append a message to a session's conversation history"""
+    history_store.append(session_id, role, content)
+
+def choose_mode(question: str, engines: List[Tuple[str, Any]]) -> str:
+    """"agent" for complex questions when the agent is available, else "rag" ("demo" in demo mode)"""
+    # Use agentic workflow only if available (requires OpenAI); its tools search the default collection
+    if agent and not USE_DEMO_MODE:
+        if [name for name, _ in engines] != [DEFAULT_COLLECTION]:
+            return "rag"
+        # Determine if query is complex
+        complex_keywords = ["summarize", "compare", "analyze", "explain", "and", "also", "then", "multiple"]
+        is_complex = any(keyword in question.lower() for keyword in complex_keywords) or len(question.split()) > 10
+        return "agent" if is_complex else "rag"
+    return "demo"
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """Query documents with conversation memory"""
@@ -130,102 +454,202 @@ async def query_documents(request: QueryRequest):
         question = request.question.strip()
         if not question:
             raise HTTPException(status_code=400, detail="Question cannot be empty")
+        engines = await asyncio.to_thread(resolve_collections, request.collections)
+        if not all(engine.index_ready.is_set() for _, engine in engines):
+            raise HTTPException(status_code=503, detail="Index is still loading, please retry shortly")
         # Check if documents are uploaded
-        has_docs = len(rag_engine.documents) > 0 if hasattr(rag_engine, 'documents') else False
-        has_vector_store = hasattr(rag_engine, 'vector_store') and rag_engine.vector_store is not None
+        has_docs = any(len(engine.registry) > 0 for _, engine in engines)
+        has_vector_store = any(getattr(engine, 'vector_store', None) is not None for _, engine in engines)
         
         if not has_vector_store and not has_docs:
             return QueryResponse(answer="No documents uploaded yet.", sources=[], confidence=0.0)
         
         # Store user question in conversation history
-        session_id = request.chat_history[0].get("session_id", "default") if request.chat_history and len(request.chat_history) > 0 else "default"
-        if session_id not in conversation_history:
-            conversation_history[session_id] = []
-        
-        conversation_history[session_id].append({
-            "role": "user",
-            "content": question,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Use agentic workflow only if available (requires OpenAI)
-        if agent and not USE_DEMO_MODE:
-            # Determine if query is complex
-            complex_keywords = ["summarize", "compare", "analyze", "explain", "and", "also", "then", "multiple"]
-            is_complex = any(keyword in question.lower() for keyword in complex_keywords) or len(question.split()) > 10
-            
-            if is_complex:
-                result = agent.process_query(question)
+        session_id = get_session_id(request)
+        await asyncio.to_thread(record_message, session_id, "user", question)
+        
+        mode = choose_mode(question, engines)
+        
+        # Repeated questions against an unchanged corpus are answered from the cache
+        cache_key = AnswerCache.make_key(question, 3, mode, collections.corpus_version(engines))
+        result = answer_cache.get(cache_key)
+        if result is None:
+            # Async all the way down: LLM and embedding calls are awaited,
+            # FAISS/BM25 search runs in a worker thread
+            if mode == "agent":
+                result = await agent.aprocess_query(question)
             else:
-                result = rag_engine.query(question)
-        else:
-            # Demo mode - simple RAG only
-            result = rag_engine.query(question)
+                # Simple RAG (always used in demo mode), fanned out over several collections
+                result = await collections.aquery(question, engines)
+            # Don't cache failures
+            if result.get("confidence", 0.0) > 0.0 and "error" not in result:
+                answer_cache.put(cache_key, result)
         
         # Store assistant response in conversation history
-        conversation_history[session_id].append({
-            "role": "assistant",
-            "content": result["answer"],
-            "timestamp": datetime.now().isoformat()
-        })
+        await asyncio.to_thread(record_message, session_id, "assistant", result["answer"])
         
         return QueryResponse(
             answer=result["answer"], 
             sources=result.get("sources", [])[:3], 
             confidence=result.get("confidence", 0.7)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.get("/conversation/{session_id}")
-async def get_conversation(session_id: str = "default"):
-    """Get conversation history for a session"""
-    if session_id not in conversation_history:
-        return {"messages": [], "total": 0}
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Stream an answer as Server-Sent Events
     
-    return {
-        "messages": conversation_history[session_id],
-        "total": len(conversation_history[session_id])
-    }
+    Events: "agent_step" / "tool_result" (agent mode only), "sources" right
+    after retrieval, "token" for each piece of the answer, and a final
+    "done" carrying answer, sources and confidence.
+    """
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    engines = await asyncio.to_thread(resolve_collections, request.collections)
+    if not all(engine.index_ready.is_set() for _, engine in engines):
+        raise HTTPException(status_code=503, detail="Index is still loading, please retry shortly")
+    
+    session_id = get_session_id(request)
+    await asyncio.to_thread(record_message, session_id, "user", question)
+    mode = choose_mode(question, engines)
+    cache_key = AnswerCache.make_key(question, 3, mode, collections.corpus_version(engines))
+    cached = answer_cache.get(cache_key)
+    
+    def generate():
+        if cached is not None:
+            events = iter([
+                {"event": "sources", "data": {"sources": cached.get("sources", [])[:3]}},
+                {"event": "token", "data": {"text": cached["answer"]}},
+                {"event": "done", "data": cached}
+            ])
+        elif mode == "agent":
+            events = agent.stream_query(question)
+        else:
+            events = collections.stream_query(question, engines)
+        
+        result = None
+        try:
+            for event in events:
+                if event["event"] == "done":
+                    result = event["data"]
+                yield sse_event(event["event"], event["data"])
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error: {str(e)}"})
+            return
+        
+        if result is not None:
+            record_message(session_id, "assistant", result["answer"])
+            if cached is None and result.get("confidence", 0.0) > 0.0 and "error" not in result:
+                answer_cache.put(cache_key, result)
+    
+    # Runs in the threadpool (sync generator), so blocking LLM calls don't stall the event loop
+    return StreamingResponse(generate(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
-@app.get("/export/{session_id}")
-async def export_conversation(session_id: str = "default"):
-    """Export conversation as PDF"""
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """Answer many questions in one retrieval pass (evaluation sets, bulk FAQ generation)"""
     try:
-        if session_id not in conversation_history or not conversation_history[session_id]:
-            raise HTTPException(status_code=404, detail="No conversation found for this session")
-        
-        # Create simple text export (PDF would require additional library)
-        export_text = f"RAG Assistant - Conversation Export\n"
-        export_text += f"Session ID: {session_id}\n"
-        export_text += f"Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        export_text += "=" * 60 + "\n\n"
-        
-        for msg in conversation_history[session_id]:
-            role = msg.get("role", "unknown").upper()
-            content = msg.get("content", "")
-            timestamp = msg.get("timestamp", "")
-            export_text += f"[{role}] ({timestamp})\n"
-            export_text += f"{content}\n\n"
-            export_text += "-" * 60 + "\n\n"
-        
-        # Save as text file (simple export)
-        export_dir = "exports"
-        os.makedirs(export_dir, exist_ok=True)
-        export_file = os.path.join(export_dir, f"conversation_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
-        
-        with open(export_file, "w", encoding="utf-8") as f:
-            f.write(export_text)
-        
-        return FileResponse(
-            export_file,
-            media_type="text/plain",
-            filename=f"conversation_{session_id}.txt"
+        questions = [question.strip() for question in request.questions]
+        if not questions or not all(questions):
+            raise HTTPException(status_code=400, detail="Questions cannot be empty")
+        engines = await asyncio.to_thread(resolve_collections, request.collections)
+        if not all(engine.index_ready.is_set() for _, engine in engines):
+            raise HTTPException(status_code=503, detail="Index is still loading, please retry shortly")
+        k = request.k
+        
+        results = await asyncio.to_thread(collections.query_batch, questions, engines, k)
+        
+        return BatchQueryResponse(
+            results=[
+                QueryResponse(
+                    answer=result["answer"],
+                    sources=result.get("sources", [])[:k],
+                    confidence=result.get("confidence", 0.7)
+                )
+                for result in results
+            ],
+            total=len(results)
         )
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error exporting conversation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.get("/conversation/{session_id}")
+async def get_conversation(session_id: str = "default", offset: int = 0, limit: int = 100):
+    """Get one page of a session's conversation history (oldest first)"""
+    if offset < 0 or not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 1000")
+    
+    messages = await asyncio.to_thread(history_store.get_messages, session_id, offset, limit)
+    return {
+        "messages": messages,
+        "total": await asyncio.to_thread(history_store.count, session_id),
+        "offset": offset,
+        "limit": limit
+    }
+
+# Export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "markdown": ("text/markdown", "md")
+}
+
+def iter_export(session_id: str, export_format: str) -> Iterator[str]:
+    """
+    Yield a conversation export piece by piece, paging through the history store
+    
+    Args:
+        session_id: Conversation session
+        export_format: One of EXPORT_FORMATS
+        
+    Returns:
+        Iterator over text fragments (one header, then one per message)
+    """
+    export_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if export_format == "txt":
+        yield (f"RAG Assistant - Conversation Export\n"
+               f"Session ID: {session_id}\n"
+               f"Export Date: {export_date}\n" + "=" * 60 + "\n\n")
+    elif export_format == "markdown":
+        yield (f"# RAG Assistant - Conversation Export\n\n"
+               f"- **Session ID:** {session_id}\n"
+               f"- **Export Date:** {export_date}\n\n")
+    
+    for msg in iter_messages(history_store, session_id):
+        role = msg.get("role", "unknown")
+        content = msg.get("content", "")
+        timestamp = msg.get("timestamp", "")
+        if export_format == "jsonl":
+            yield json.dumps(msg) + "\n"
+        elif export_format == "markdown":
+            yield f"### {role.capitalize()} ({timestamp})\n\n{content}\n\n---\n\n"
+        else:
+            yield f"[{role.upper()}] ({timestamp})\n{content}\n\n" + "-" * 60 + "\n\n"
+
+@app.get("/export/{session_id}")
+async def export_conversation(session_id: str = "default", format: str = "txt"):
+    """Stream a conversation export as text, JSONL or Markdown (nothing is written to disk)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported export format: {format} (use one of {', '.join(EXPORT_FORMATS)})"
+        )
+    if await asyncio.to_thread(history_store.count, session_id) == 0:
+        raise HTTPException(status_code=404, detail="No conversation found for this session")
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        iter_export(session_id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="conversation_{session_id}.{extension}"'}
+    )
 
 if __name__ == "__main__":
     import uvicorn
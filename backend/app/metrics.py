@@ -0,0 +1,276 @@
+"""
+Metrics - Per-stage Timing Spans and Prometheus Export
+
+This module implements:
+- Timing spans (context managers) for ingest and query stages, recorded
+  as Prometheus histograms labelled by engine and stage
+- A LangChain callback handler timing LLM generations, agent tool calls
+  and agent steps wherever a chain or agent runs
+- A collector that turns engine/cache stats into gauges and counters at
+  scrape time (index size, cache hit rates, history size)
+- HTTP request latency and in-flight request tracking for the middleware
+
+prometheus_client is optional: without it every metric is a no-op, spans
+cost two perf_counter() calls, and /metrics reports that it is disabled.
+
+Several workers (uvicorn --workers N): set PROMETHEUS_MULTIPROC_DIR to an
+empty directory before starting them. Every worker then writes its samples
+there and /metrics aggregates all workers, whichever one serves the scrape.
+Without it each scrape only sees the worker that answered it. The stats
+gauges (index, caches, history) are always read from the serving worker.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+    )
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:  # metrics are disabled, spans become no-ops
+    CONTENT_TYPE_LATEST = "text/plain"
+    REGISTRY = None
+
+ENABLED = REGISTRY is not None
+# Must be set before this module is imported (prometheus_client reads it then)
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+# From sub-millisecond index lookups up to slow LLM calls and large ingests
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class _NoopMetric:
+    """Stands in for a metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+
+def _metric(kind: str, name: str, documentation: str, labelnames, **kwargs):
+    if not ENABLED:
+        return _NoopMetric()
+    return {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[kind](
+        name, documentation, labelnames, **kwargs
+    )
+
+
+STAGE_SECONDS = _metric(
+    "histogram", "rag_stage_duration_seconds",
+    "Time spent in one ingest or query stage", ["engine", "stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = _metric(
+    "counter", "rag_stage_errors_total", "Stages that raised an exception", ["engine", "stage"]
+)
+TOOL_SECONDS = _metric(
+    "histogram", "rag_agent_tool_duration_seconds", "Time spent in one agent tool call", ["tool"],
+    buckets=LATENCY_BUCKETS
+)
+TOOL_CALLS = _metric(
+    "counter", "rag_agent_tool_calls_total", "Agent tool calls by outcome", ["tool", "status"]
+)
+AGENT_STEPS = _metric(
+    "counter", "rag_agent_steps_total", "Actions taken by the agent (one per reasoning loop)", []
+)
+REQUEST_SECONDS = _metric(
+    "histogram", "rag_http_request_duration_seconds", "HTTP request latency",
+    ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = _metric(
+    "gauge", "rag_http_requests_in_flight", "HTTP requests being served", ["endpoint"],
+    multiprocess_mode="livesum"
+)
+# Stats collectors, also registered with each multiprocess scrape registry
+_stats_collectors = []
+
+
+def observe_stage(engine: str, stage: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere"""
+    STAGE_SECONDS.labels(engine, stage).observe(seconds)
+
+
+@contextmanager
+def span(engine: str, stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as one stage
+
+    Args:
+        engine: "full", "demo" or "agent"
+        stage: Stage name (extract, split, embed, index, persist, retrieve, ...)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(engine, stage).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(engine, stage).observe(time.perf_counter() - start)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times LLM calls (stage "generate") and agent tool calls
+
+    One instance can be shared by concurrent runs: start times are keyed by
+    LangChain's run id.
+    """
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self._starts: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str) -> None:
+        with self._lock:
+            self._starts[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> Optional[tuple]:
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+        if started is None:
+            return None
+        return started[0], time.perf_counter() - started[1]
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "generate")
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "generate")
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished:
+            observe_stage(self.engine, "generate", finished[1])
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished:
+            observe_stage(self.engine, "generate", finished[1])
+            STAGE_ERRORS.labels(self.engine, "generate").inc()
+
+    def on_agent_action(self, action: Any, **kwargs: Any) -> None:
+        AGENT_STEPS.inc()
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, (serialized or {}).get("name") or kwargs.get("name") or "unknown")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished:
+            TOOL_SECONDS.labels(finished[0]).observe(finished[1])
+            TOOL_CALLS.labels(finished[0], "ok").inc()
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished:
+            TOOL_SECONDS.labels(finished[0]).observe(finished[1])
+            TOOL_CALLS.labels(finished[0], "error").inc()
+
+
+class StatsCollector:
+    """
+    Prometheus collector reading the service's stats dictionary on each scrape
+
+    Counters that the caches already keep (hits, misses, batches) are
+    exported as they are, so nothing is double-counted or kept in sync.
+    """
+
+    def __init__(self, get_stats: Callable[[], Dict]):
+        """
+        Args:
+            get_stats: Returns the same dictionary as GET /stats
+        """
+        self.get_stats = get_stats
+
+    def describe(self):
+        # Metric names depend on which caches are configured; skip up-front checks
+        return []
+
+    def collect(self):
+        try:
+            stats = self.get_stats()
+        except Exception as e:
+            print(f"Warning: Could not collect stats for /metrics: {e}")
+            return
+
+        yield GaugeMetricFamily("rag_index_chunks", "Chunks in the index", value=stats.get("total_chunks", 0))
+        yield GaugeMetricFamily("rag_index_documents", "Documents in the index",
+                                value=stats.get("total_documents", 0))
+
+        caches = {
+            "embedding": stats.get("embedding_cache"),
+            "query_embedding": (stats.get("embedding_cache") or {}).get("query_cache"),
+            "answer": stats.get("answer_cache"),
+        }
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        hit_ratio = GaugeMetricFamily("rag_cache_hit_ratio", "Cache hits / lookups since start", labels=["cache"])
+        entries = GaugeMetricFamily("rag_cache_entries", "Entries held by the cache", labels=["cache"])
+        for name, cache in caches.items():
+            if not cache:
+                continue
+            hits.add_metric([name], cache.get("hits", 0))
+            misses.add_metric([name], cache.get("misses", 0))
+            hit_ratio.add_metric([name], cache.get("hit_rate", 0.0))
+            entries.add_metric([name], cache.get("entries", 0))
+        yield from (hits, misses, hit_ratio, entries)
+
+        batcher = stats.get("embedding_batcher")
+        if batcher:
+            yield CounterMetricFamily("rag_embedding_batches", "Embedding requests sent",
+                                      value=batcher["batches"])
+            yield CounterMetricFamily("rag_embedding_texts", "Texts embedded through the batcher",
+                                      value=batcher["texts"])
+            yield CounterMetricFamily("rag_embedding_retries", "Embedding requests retried",
+                                      value=batcher["retries"])
+            yield GaugeMetricFamily("rag_embedding_queued_texts", "Texts waiting to be batched",
+                                    value=batcher["queued"])
+
+        history = stats.get("conversation_history")
+        if history:
+            yield GaugeMetricFamily("rag_conversation_sessions", "Stored conversation sessions",
+                                    value=history["sessions"])
+            yield GaugeMetricFamily("rag_conversation_messages", "Stored conversation messages",
+                                    value=history["messages"])
+
+
+def register_stats(get_stats: Callable[[], Dict]) -> None:
+    """Export get_stats() through /metrics (no-op without prometheus_client)"""
+    if ENABLED:
+        collector = StatsCollector(get_stats)
+        _stats_collectors.append(collector)
+        REGISTRY.register(collector)
+
+
+def render_latest() -> bytes:
+    """Current metrics in the Prometheus text format (every worker's in multiprocess mode)"""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _stats_collectors:
+            registry.register(collector)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauges from the multiprocess directory (call at shutdown)"""
+    if ENABLED and MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,59 @@
+"""
+MMR - Maximal Marginal Relevance Diversification
+
+This module implements:
+- Greedy MMR selection vectorized with NumPy: one similarity matrix for
+  the candidates, then k cheap vector updates (no Python loop over pairs)
+"""
+
+from typing import List
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def maximal_marginal_relevance(query_vector: np.ndarray, candidate_vectors: np.ndarray,
+                               k: int = 3, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Pick k candidates that are relevant to the query but not to each other
+
+    Each step selects the candidate maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected),
+    using cosine similarity.
+
+    Args:
+        query_vector: Query embedding, shape (d,)
+        candidate_vectors: Candidate embeddings, shape (n, d)
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only
+
+    Returns:
+        Indices into candidate_vectors, in selection order
+    """
+    n = len(candidate_vectors)
+    if n == 0 or k <= 0:
+        return []
+
+    candidates = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    query_similarity = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(query_similarity))]
+    # Highest similarity of each candidate to anything already selected
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * query_similarity - (1.0 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
@@ -3,14 +3,20 @@ Pydantic Models for API Request/Response
 These define the structure of data sent to and received from the API
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
+# Bounds for /query/batch: every question is answered in one request
+MAX_BATCH_QUESTIONS = 100
+MAX_BATCH_K = 20
+
 
 class QueryRequest(BaseModel):
     """Request model for asking questions"""
     question: str
     chat_history: Optional[List[dict]] = []
+    # Collections to search (default: the "default" collection); several are searched in parallel
+    collections: Optional[List[str]] = None
 
 
 class QueryResponse(BaseModel):
@@ -20,11 +26,39 @@ class QueryResponse(BaseModel):
     confidence: Optional[float] = None
 
 
+class BatchQueryRequest(BaseModel):
+    """Request model for answering many questions in one call"""
+    questions: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_QUESTIONS)
+    k: int = Field(3, ge=1, le=MAX_BATCH_K)
+    collections: Optional[List[str]] = None
+
+
+class BatchQueryResponse(BaseModel):
+    """Response model for batched answers (same order as the questions)"""
+    results: List[QueryResponse]
+    total: int
+
+
 class UploadResponse(BaseModel):
     """Response after uploading a document"""
     message: str
     document_id: str
     chunks_processed: int
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+    collection: Optional[str] = None
+
+
+class JobStatusResponse(BaseModel):
+    """Progress of a background ingestion job"""
+    job_id: str
+    document_id: str
+    status: str  # "queued", "running", "completed" or "failed"
+    stage: str  # "queued", "extract", "chunk", "embed", "index" or "done"
+    chunks_processed: int
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 
 class DocumentInfo(BaseModel):
@@ -41,6 +75,19 @@ class DocumentListResponse(BaseModel):
     total: int
 
 
+class CollectionInfo(BaseModel):
+    """A named collection (one index) and its size"""
+    name: str
+    documents: int
+    chunks: int
+
+
+class CollectionListResponse(BaseModel):
+    """Response with list of collections"""
+    collections: List[CollectionInfo]
+    total: int
+
+
 class ConversationMessage(BaseModel):
     """Single message in conversation"""
     role: str  # "user" or "assistant"
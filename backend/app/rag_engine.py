@@ -7,10 +7,23 @@ This module implements:
 - Embedding generation using OpenAI
 - Vector database (FAISS) for similarity search
 - RAG query pipeline with LLM integration
+- On-disk persistence of the vector store (warm restart)
+- Content-addressed embedding cache shared across uploads
+- Readers-writer locking so ingestion never exposes a half-updated index
+- Token streaming of answers (sources first, then LLM tokens)
+- Async query path (aquery / aget_relevant_chunks) for the FastAPI handlers
+- Timing spans for every ingest and query stage (exported at /metrics)
+- One index shared by several worker processes: writes are serialized by a
+  file lock, other workers hot-reload new snapshots memory-mapped
 """
 
+import asyncio
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
 # LangChain imports
@@ -18,42 +31,82 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain.schema import Document
 from langchain.chains import RetrievalQA
+from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+import numpy as np
 
-# Document processing imports
-import PyPDF2
-from docx import Document as DocxDocument
+from app.bm25_index import BM25Index
+from app.document_registry import DocumentRegistry
+from app.embedding_batcher import BatchedEmbeddings, EmbeddingBatcher
+from app.embedding_cache import EmbeddingCache, CachedEmbeddings, QueryEmbeddingCache, embedding_key
+from app.extraction import extract_chunks
+from app import metrics
+from app.index_store import IndexStore
+from app.local_embeddings import HashingEmbeddings
+from app.locks import ReadWriteLock
+from app.mmr import maximal_marginal_relevance
+from app.rank_fusion import reciprocal_rank_fusion
+from app.retrieval_trace import record_retrieval
+from app.vector_index import (
+    StableIds, VectorIndexConfig, add_with_stable_ids, build_index, catch_up, configure_search,
+    delete_with_stable_ids, flat_index_info, new_flat_index, with_stable_ids
+)
 
 load_dotenv()
 
 
+class LockedRetriever(BaseRetriever):
+    """Retriever that searches the engine's vector store under its read lock"""
+    
+    engine: Any
+    k: int = 3
+    mmr: bool = False
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.engine._similarity_search(
+            query, k=self.k, mmr=self.mmr, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+        )
+    
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await self.engine._asimilarity_search(
+            query, k=self.k, mmr=self.mmr, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+        )
+
+
 class RAGEngine:
     """
     RAG Engine that processes documents and answers questions using:
     - Document chunking
-    - Embeddings (OpenAI)
+    - Embeddings (OpenAI, or a local offline provider)
     - Vector database (FAISS)
     - LLM (GPT-3.5) for answer generation
     """
     
-    def __init__(self):
-        """Initialize RAG Engine with embeddings and vector store"""
-        self.api_key = os.getenv("OPENAI_API_KEY")
+    def __init__(self, index_dir: Optional[str] = None, shared: Optional["RAGEngine"] = None):
+        """
+        Initialize RAG Engine with embeddings and vector store
         
-        # Initialize OpenAI embeddings (lazy initialization)
-        self.embeddings = None
-        self.llm = None
+        Args:
+            index_dir: Directory the index is persisted in (default: INDEX_DIR)
+            shared: Engine whose embeddings, LLM, caches and thread pools are
+                    reused, so an extra collection costs only its own index
+        """
+        self.api_key = os.getenv("OPENAI_API_KEY")
         
-        if self.api_key:
-            try:
-                self.embeddings = OpenAIEmbeddings(openai_api_key=self.api_key)
-                self.llm = ChatOpenAI(
-                    model_name="gpt-3.5-turbo",
-                    temperature=0,
-                    openai_api_key=self.api_key
-                )
-            except Exception as e:
-                print(f"Warning: Could not initialize OpenAI: {e}")
+        if shared is not None:
+            self._share_models(shared)
+        else:
+            self._init_models()
         
         # Text splitter for chunking documents
         self.text_splitter = RecursiveCharacterTextSplitter(
@@ -64,151 +117,603 @@ class RAGEngine:
         
         # Vector store (FAISS)
         self.vector_store: Optional[FAISS] = None
-        self.documents: List[str] = []
-        self.chunks: List[Document] = []
+        # docstore id -> FAISS id (the store only maps the other way)
+        self.stable_ids = StableIds({})
+        # docstore id -> chunk
+        self.chunks: Dict[str, Document] = {}
+        # document id -> docstore ids of its chunks and metadata
+        self.registry = DocumentRegistry()
+        
+        # Hybrid retrieval: a BM25 index over the same chunks (keyed by docstore
+        # id) is searched alongside FAISS and the rankings are merged with RRF.
+        # RETRIEVAL_MODE=vector turns it off.
+        self.lexical_index = BM25Index()
+        self.retrieval_mode = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+        # Candidates taken from each retriever before fusion
+        self.hybrid_fetch_k = int(os.getenv("HYBRID_FETCH_K", "20"))
+        # When the best lexical hit carries at least this share of the query's
+        # IDF, the vector search is skipped (unset: always run both)
+        threshold = os.getenv("HYBRID_LEXICAL_THRESHOLD")
+        self.lexical_skip_threshold = float(threshold) if threshold else None
+        
+        # Bumped on every ingest/delete; corpus_id tells apart corpora whose
+        # counters happen to match (e.g. a fresh corpus after a restart)
+        self.corpus_id = uuid.uuid4().hex
+        self.corpus_version = 0
+        
+        # Persistence: snapshots are written after each ingest and loaded at startup
+        self.index_store = IndexStore(
+            index_dir or os.getenv("INDEX_DIR", "index_store"),
+            mmap_min_bytes=int(os.getenv("INDEX_MMAP_MIN_BYTES", str(64 * 1024 * 1024)))
+        )
+        self.index_ready = threading.Event()
+        self._index_mmapped = False
+        
+        # Index type: flat (exact) by default; compressed/IVF types for large
+        # corpora are trained once the corpus reaches VECTOR_INDEX_TRAIN_MIN
+        self.vector_index_config = self._vector_index_config()
+        self.vector_index_info = flat_index_info()
+        # Index (re)build running on the training thread, if any
+        self._rebuild: Optional[Future] = None
+        # Snapshot generation this process has loaded or written; workers
+        # sharing INDEX_DIR publish newer ones (see watch_index)
+        self.index_generation: Optional[str] = None
+        # Held while this process syncs with, modifies or reloads the shared index
+        self._sync_lock = threading.Lock()
+        
+        # Searches hold the read side; ingestion holds the write side only
+        # while it swaps new vectors into the index
+        self.index_lock = ReadWriteLock()
+        self._save_lock = threading.Lock()
+        
+        # RetrievalQA chains (one per k), rebuilt only when llm or vector_store is replaced
+        self._qa_chains: Dict[tuple, RetrievalQA] = {}
+        self._qa_prompt = None
+        self._qa_chain_owner = (None, None)
+        self._chain_lock = threading.Lock()
+        # Times every LLM call made by the chains (stage "generate")
+        self._llm_callbacks = {"callbacks": [metrics.MetricsCallbackHandler("full")]}
+        
+    def _init_models(self) -> None:
+        """Create embeddings, LLM, caches and the lexical search pool"""
+        # Chunk embeddings are cached on disk so re-uploads and repeated
+        # boilerplate never go back to the embeddings API
+        self.embedding_cache = EmbeddingCache(
+            os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"),
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")) * 1024 * 1024
+        )
+        # Repeated questions skip the embeddings API and go straight to FAISS
+        self.query_embedding_cache = QueryEmbeddingCache(
+            max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+        )
+        
+        # Chunk texts from concurrent ingest jobs share batched embedding requests
+        self.embedding_batcher: Optional[EmbeddingBatcher] = None
+        
+        # "openai" or "local" (offline hashing embedder, no API key needed)
+        self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+        
+        # Initialize embeddings and LLM (lazy initialization)
+        self.embeddings = None
+        self.llm = None
+        
+        if self.api_key or self.embedding_provider == "local":
+            try:
+                self.embeddings = self._create_embeddings()
+                if self.api_key:
+                    self.llm = ChatOpenAI(
+                        model_name="gpt-3.5-turbo",
+                        temperature=0,
+                        openai_api_key=self.api_key
+                    )
+            except Exception as e:
+                print(f"Warning: Could not initialize OpenAI: {e}")
+        
+        self._lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+        # Index training is CPU-bound: one build at a time across collections
+        self._train_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-train")
+    
+    def _share_models(self, other: "RAGEngine") -> None:
+        """Reuse another engine's embeddings, LLM, caches, lexical search and training pools"""
+        self.embedding_cache = other.embedding_cache
+        self.query_embedding_cache = other.query_embedding_cache
+        self.embedding_batcher = other.embedding_batcher
+        self.embedding_provider = other.embedding_provider
+        self.embeddings = other.embeddings
+        self.llm = other.llm
+        self._lexical_pool = other._lexical_pool
+        self._train_pool = other._train_pool
+    
+    @staticmethod
+    def _vector_index_config() -> VectorIndexConfig:
+        """Vector index settings from the environment (flat on invalid settings)"""
+        try:
+            return VectorIndexConfig(
+                index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+                train_min=int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "10000")),
+                retrain_growth=float(os.getenv("VECTOR_INDEX_RETRAIN_GROWTH", "2.0")),
+                nlist=int(os.getenv("VECTOR_INDEX_NLIST", "0")),
+                nprobe=int(os.getenv("VECTOR_INDEX_NPROBE", "16")),
+                pq_m=int(os.getenv("VECTOR_INDEX_PQ_M", "0"))
+            )
+        except ValueError as e:
+            print(f"Warning: {e}; using a flat index")
+            return VectorIndexConfig()
+    
+    def _create_embeddings(self) -> Embeddings:
+        """
+        Embeddings for the configured provider
+        
+        OpenAI embeddings sit behind the micro-batcher and the persistent
+        embedding cache; the local provider is fast enough to use directly.
+        """
+        if self.embedding_provider == "local":
+            return HashingEmbeddings(dimensions=int(os.getenv("LOCAL_EMBEDDING_DIM", "384")))
+        if self.embedding_provider != "openai":
+            print(f"Warning: Unknown EMBEDDING_PROVIDER '{self.embedding_provider}', using openai")
+        
+        max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+        # Queries go straight to this client and retry in it; documents go
+        # through the batcher, which retries, so its client must not retry too
+        embeddings = OpenAIEmbeddings(openai_api_key=self.api_key, max_retries=max_retries)
+        document_embeddings = OpenAIEmbeddings(openai_api_key=self.api_key, max_retries=0)
+        self.embedding_batcher = EmbeddingBatcher(
+            document_embeddings.embed_documents,
+            max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "256")),
+            max_batch_tokens=int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "200000")),
+            max_wait_seconds=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "20")) / 1000,
+            max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+            max_retries=max_retries
+        )
+        return CachedEmbeddings(
+            BatchedEmbeddings(embeddings, self.embedding_batcher), self.embedding_cache,
+            model_name=embeddings.model, query_cache=self.query_embedding_cache
+        )
+    
+    def load_index(self) -> None:
+        """
+        Load the persisted vector store, if any (no re-embedding needed)
+        
+        Large indexes are memory-mapped. index_ready is set when loading
+        finishes, whether or not a snapshot was found.
+        """
+        try:
+            with self._sync_lock:
+                if self._load_snapshot():
+                    print(f"Loaded index: {len(self.chunks)} chunks from {len(self.registry)} documents")
+        except Exception as e:
+            print(f"Warning: Could not load persisted index: {e}")
+        finally:
+            self.index_ready.set()
+    
+    def watch_index(self, poll_seconds: float = 1.0) -> None:
+        """
+        Follow snapshots saved by other worker processes (blocks: run it on a daemon thread)
+        
+        CURRENT is read every poll_seconds; when it names a generation this
+        process has not loaded, the snapshot is loaded memory-mapped (all
+        workers then share the vectors through the page cache) and swapped
+        in under the write lock, so queries never wait on the disk read.
+        """
+        self.index_ready.wait()
+        while True:
+            time.sleep(poll_seconds)
+            try:
+                if self.index_store.current_generation() == self.index_generation:
+                    continue
+                with self._sync_lock:
+                    if self.index_store.current_generation() != self.index_generation:
+                        self._load_snapshot(mmap=True)
+                        print(f"Reloaded index {self.index_generation}: {len(self.chunks)} chunks")
+            except Exception as e:
+                print(f"Warning: Could not reload index: {e}")
+    
+    def _load_snapshot(self, mmap: Optional[bool] = None) -> bool:
+        """
+        Swap in the current on-disk snapshot (caller holds _sync_lock)
+        
+        Args:
+            mmap: Passed to IndexStore.load (None: memory-map large indexes only)
+            
+        Returns:
+            False if nothing has been saved yet
+        """
+        snapshot = self.index_store.load(mmap=mmap)
+        if snapshot is None:
+            return False
         
-    def process_document(self, file_path: str, file_type: str) -> int:
+        index, state, mmapped, generation = snapshot
+        saved_model = state.get("embedding_model")
+        current_model = getattr(self.embeddings, "model_name", None)
+        if saved_model and current_model and saved_model != current_model:
+            print(f"Warning: Index was built with embeddings '{saved_model}', "
+                  f"now using '{current_model}'; re-upload documents after switching providers")
+        configure_search(index, self.vector_index_config.nprobe)
+        vector_store = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=state["docstore"],
+            index_to_docstore_id=state["index_to_docstore_id"]
+        )
+        chunks = {
+            chunk_id: vector_store.docstore.search(chunk_id)
+            for chunk_id in vector_store.index_to_docstore_id.values()
+        }
+        stable_ids = StableIds(vector_store.index_to_docstore_id)
+        
+        lexical_index = state.get("lexical_index")
+        if lexical_index is None:
+            # Snapshots written before hybrid retrieval: index the chunks now
+            lexical_index = BM25Index()
+            for chunk_id, chunk in chunks.items():
+                lexical_index.add(chunk_id, chunk.page_content)
+        
+        with self.index_lock.write():
+            self.vector_store = vector_store
+            self.stable_ids = stable_ids
+            self.chunks = chunks
+            self.lexical_index = lexical_index
+            self.registry = DocumentRegistry.from_state(state.get("registry", {}))
+            self.corpus_id = state.get("corpus_id", self.corpus_id)
+            self.corpus_version = state.get("corpus_version", 0)
+            self._index_mmapped = mmapped
+            self.vector_index_info = state.get("vector_index") or flat_index_info()
+            self.index_generation = generation
+        return True
+    
+    def _sync_with_index_store(self) -> None:
+        """Catch up with snapshots other workers saved (caller holds _sync_lock and the store's write lock)"""
+        if self.index_store.current_generation() != self.index_generation:
+            # About to be modified, so read it into RAM rather than mapping it
+            self._load_snapshot(mmap=False)
+    
+    def _save_index(self) -> bool:
+        """Snapshot the vector store to disk (atomic; old snapshot stays valid on failure)"""
+        try:
+            with self._save_lock, metrics.span("full", "persist"), self.index_lock.read():
+                self.index_generation = self.index_store.save(self.vector_store.index, {
+                    "docstore": self.vector_store.docstore,
+                    "index_to_docstore_id": self.vector_store.index_to_docstore_id,
+                    "registry": self.registry.to_state(),
+                    "lexical_index": self.lexical_index,
+                    "vector_index": self.vector_index_info,
+                    "embedding_model": getattr(self.embeddings, "model_name", None),
+                    "corpus_id": self.corpus_id,
+                    "corpus_version": self.corpus_version
+                }, summary={"documents": len(self.registry), "chunks": len(self.chunks)})
+            return True
+        except Exception as e:
+            print(f"Warning: Could not persist index: {e}")
+            return False
+    
+    def process_document(self, file_path: str, file_type: str,
+                         progress: Optional[Callable[[str], None]] = None,
+                         content_hash: Optional[str] = None) -> int:
         """
         Process a document: extract text, chunk it, create embeddings, store in vector DB
         
+        Embedding happens outside the index lock; only the final index update
+        is done under the write lock, so concurrent queries keep running.
+        
         Args:
             file_path: Path to the document file
             file_type: File extension (pdf, txt, docx)
+            progress: Optional callback receiving the current stage
+                      ("extract", "chunk", "embed", "index")
+            content_hash: Optional sha256 of the file, recorded for deduplication
             
         Returns:
             Number of chunks processed
         """
+        progress = progress or (lambda stage: None)
         try:
-            if not self.api_key:
+            if not self.api_key and self.embedding_provider != "local":
                 raise ValueError("OPENAI_API_KEY not set. Please set it in your environment or .env file")
             
             if not self.embeddings:
-                self.embeddings = OpenAIEmbeddings(openai_api_key=self.api_key)
-                self.llm = ChatOpenAI(
-                    model_name="gpt-3.5-turbo",
-                    temperature=0,
-                    openai_api_key=self.api_key
-                )
+                self.embeddings = self._create_embeddings()
+                if self.api_key:
+                    self.llm = ChatOpenAI(
+                        model_name="gpt-3.5-turbo",
+                        temperature=0,
+                        openai_api_key=self.api_key
+                    )
             
-            # Extract text based on file type
-            text = self._extract_text(file_path, file_type)
+            # Stream the text straight into the splitter (never held as one string)
+            progress("extract")
+            chunks = []
+            timings: Dict[str, float] = {}
+            for chunk in extract_chunks(file_path, file_type, self.text_splitter, timings=timings):
+                if not chunks:
+                    progress("chunk")
+                chunks.append(chunk)
+            for stage, seconds in timings.items():
+                metrics.observe_stage("full", stage, seconds)
             
-            if not text or len(text.strip()) < 50:
+            if sum(len(chunk.page_content.strip()) for chunk in chunks) < 50:
                 raise ValueError("Document is too short or empty")
             
-            # Split text into chunks
-            chunks = self.text_splitter.create_documents([text])
-            
-            # Store chunks
-            self.chunks.extend(chunks)
-            self.documents.append(text)
+            # Create embeddings (the slow, network-bound part) without holding the lock
+            progress("embed")
+            texts = [chunk.page_content for chunk in chunks]
+            with metrics.span("full", "embed"):
+                vectors = self.embeddings.embed_documents(texts)
+            metadatas = [chunk.metadata for chunk in chunks]
+            chunk_ids = [uuid.uuid4().hex for _ in chunks]
+            document_id = os.path.basename(file_path)
             
-            # Create or update vector store
-            if self.vector_store is None:
-                # Create new vector store
-                self.vector_store = FAISS.from_documents(chunks, self.embeddings)
-            else:
-                # Add to existing vector store
-                self.vector_store.add_documents(chunks)
+            progress("index")
+            # Other workers may share INDEX_DIR: start from the latest snapshot
+            # and publish ours before any of them can write
+            with self._sync_lock, self.index_store.write_lock():
+                self._sync_with_index_store()
+                with metrics.span("full", "index"), self.index_lock.write():
+                    # Re-uploading a document id replaces its previous version
+                    self._remove_chunks(document_id)
+                    
+                    # Create or update vector store
+                    if self.vector_store is None:
+                        # Create new vector store
+                        self.vector_store = FAISS(
+                            embedding_function=self.embeddings,
+                            index=new_flat_index(len(vectors[0])),
+                            docstore=InMemoryDocstore(),
+                            index_to_docstore_id={}
+                        )
+                        self.stable_ids = StableIds({})
+                        self.vector_index_info = flat_index_info()
+                    else:
+                        self._ensure_writable_index()
+                    add_with_stable_ids(self.vector_store, self.stable_ids, texts, vectors, metadatas, chunk_ids)
+                    
+                    # Store chunks
+                    self.chunks.update(zip(chunk_ids, chunks))
+                    for chunk_id, text in zip(chunk_ids, texts):
+                        self.lexical_index.add(chunk_id, text)
+                    self.registry.register(document_id, chunk_ids, content_hash=content_hash)
+                    self.corpus_version += 1
+                
+                if self._save_index():
+                    self._maybe_rebuild_index()
             
             return len(chunks)
             
         except Exception as e:
             raise Exception(f"Error processing document: {str(e)}")
     
-    def _extract_text(self, file_path: str, file_type: str) -> str:
+    def delete_document(self, document_id: str) -> Optional[Dict]:
         """
-        Extract text from different file types
+        Remove a document's vectors and docstore entries, then persist the index
         
         Args:
-            file_path: Path to file
-            file_type: File extension
+            document_id: Document to delete
             
         Returns:
-            Extracted text content
+            The removed registry record, or None if the document is unknown
         """
-        if file_type == "txt":
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
+        with self._sync_lock, self.index_store.write_lock():
+            self._sync_with_index_store()
+            with self.index_lock.write():
+                record = self._remove_chunks(document_id)
+                if record is None:
+                    return None
+                self.corpus_version += 1
+            
+            if self._save_index():
+                self._maybe_rebuild_index()
+        return record
+    
+    def _remove_chunks(self, document_id: str) -> Optional[Dict]:
+        """Drop a document from registry, chunks and vector store (caller holds the write lock)"""
+        record = self.registry.remove(document_id)
+        if record is None:
+            return None
         
-        elif file_type == "pdf":
-            text = ""
-            with open(file_path, "rb") as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+        chunk_ids = [chunk_id for chunk_id in record["chunk_ids"] if chunk_id in self.chunks]
+        if chunk_ids and self.vector_store is not None:
+            self._ensure_writable_index()
+            delete_with_stable_ids(self.vector_store, self.stable_ids, chunk_ids)
+        for chunk_id in chunk_ids:
+            del self.chunks[chunk_id]
+            self.lexical_index.remove(chunk_id)
+        return record
+    
+    def _maybe_rebuild_index(self) -> None:
+        """
+        Start switching to, or retraining, the configured index type when the corpus calls for it
         
-        elif file_type == "docx":
-            doc = DocxDocument(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text
+        Runs right after a write was saved, with _sync_lock and the store's
+        write lock held, and only hands the build to the training thread:
+        the just-saved generation's index (memory-mapped) and a copy of its
+        id mapping. Writers and queries carry on while it trains.
+        """
+        if self.vector_store is None or (self._rebuild is not None and not self._rebuild.done()):
+            return
+        action = self.vector_index_config.plan(self.vector_index_info, len(self.vector_store.index_to_docstore_id))
+        if action is None:
+            return
+        try:
+            index = self.index_store.load_index(self.index_generation, mmap=True)
+        except Exception as e:
+            print(f"Warning: Could not read index {self.index_generation} to rebuild it: {e}")
+            return
+        self._rebuild = self._train_pool.submit(
+            self._rebuild_index, action, index, dict(self.vector_store.index_to_docstore_id),
+            self.vector_index_info.get("type", "flat")
+        )
+    
+    def _rebuild_index(self, action: str, index: Any, mapping: Dict[int, str], source_type: str) -> None:
+        """
+        Build the configured index from a saved snapshot, then swap it in (training thread)
         
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
+        No lock is held while training. The swap takes _sync_lock and the
+        store's write lock, catches the new index up with the writes made
+        since the snapshot (see vector_index.catch_up), replaces the index
+        under the write lock and saves. It is dropped if the current index
+        no longer needs rebuilding (e.g. another worker rebuilt it); on
+        failure the current index is kept.
+        """
+        try:
+            with metrics.span("full", "train"):
+                new_index, new_mapping, info = build_index(
+                    self.vector_index_config, index, mapping,
+                    source_type=source_type, exact_vectors=self._cached_vectors
+                )
+        except Exception as e:
+            print(f"Warning: Could not build the {self.vector_index_config.index_type} index, "
+                  f"keeping {self.vector_index_info.get('spec', 'Flat')}: {e}")
+            return
+        del index, mapping
+        stable_ids = StableIds(new_mapping)
+        
+        with self._sync_lock, self.index_store.write_lock():
+            self._sync_with_index_store()
+            if self.vector_store is None or self.vector_index_config.plan(
+                    self.vector_index_info, len(self.vector_store.index_to_docstore_id)) is None:
+                return
+            # _sync_lock keeps this process's writers out, so the live index is stable here
+            added, removed = catch_up(
+                new_index, new_mapping, stable_ids, self.vector_store.index, self.stable_ids.labels,
+                source_type=self.vector_index_info.get("type", "flat"), exact_vectors=self._cached_vectors
+            )
+            vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=new_index,
+                docstore=self.vector_store.docstore,
+                index_to_docstore_id=new_mapping
+            )
+            with self.index_lock.write():
+                self.vector_store = vector_store
+                self.stable_ids = stable_ids
+                self.vector_index_info = info
+                self._index_mmapped = False
+            self._save_index()
+        print(f"Vector index {action}: {info['spec']} over {len(new_mapping)} chunks "
+              f"({added} added, {removed} removed while training)")
+    
+    def wait_for_index_build(self, timeout: Optional[float] = None) -> None:
+        """Block until a pending index (re)build has been swapped in or dropped"""
+        if self._rebuild is not None:
+            self._rebuild.result(timeout=timeout)
+    
+    def _cached_vectors(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Exact chunk embeddings from the embedding cache, for retraining a lossy (PQ) index"""
+        if not isinstance(self.embeddings, CachedEmbeddings):
+            return {}
+        # Also called from the training thread, while writers may delete chunks
+        chunks = {chunk_id: self.chunks.get(chunk_id) for chunk_id in chunk_ids}
+        keys = {
+            chunk_id: embedding_key(self.embeddings.model_name, chunk.page_content)
+            for chunk_id, chunk in chunks.items() if chunk is not None
+        }
+        found = self.embedding_cache.get_many(list(keys.values()))
+        return {chunk_id: found[key] for chunk_id, key in keys.items() if key in found}
     
-    def query(self, question: str, k: int = 3) -> Dict:
+    def _ensure_writable_index(self) -> None:
+        """
+        Make the index modifiable by id (caller holds the write lock)
+        
+        A memory-mapped index is read-only, so it is read into RAM (loading
+        only mapped it, so this is its one full read); an index from an older
+        snapshot without stable ids is wrapped in IDMap2.
+        """
+        index = self.vector_store.index
+        if self._index_mmapped:
+            index = self.index_store.load_index(self.index_generation)
+            self._index_mmapped = False
+        index = with_stable_ids(index, self.vector_store.index_to_docstore_id)
+        if index is not self.vector_store.index:
+            configure_search(index, self.vector_index_config.nprobe)
+            self.vector_store.index = index
+    
+    def list_documents(self) -> List[Dict]:
+        """Registered documents with their chunk counts"""
+        with self.index_lock.read():
+            return self.registry.list()
+    
+    def find_document(self, content_hash: str) -> Optional[Dict]:
+        """Already-ingested document with this content hash (registry record), if any"""
+        return self.registry.find_by_hash(content_hash)
+    
+    def query(self, question: str, k: int = 3, mmr: bool = False,
+              fetch_k: int = 20, lambda_mult: float = 0.5) -> Dict:
         """
         Query the RAG system: retrieve relevant chunks and generate answer
         
         Args:
             question: User's question
             k: Number of chunks to retrieve
+            mmr: Diversify the k chunks with maximal marginal relevance
+            fetch_k: Candidates considered by MMR
+            lambda_mult: MMR trade-off (1.0 relevance only, 0.0 diversity only)
             
         Returns:
             Dictionary with answer, sources, and confidence
         """
         if self.vector_store is None or len(self.chunks) == 0:
-            return {
-                "answer": "No documents uploaded yet. Please upload a document first.",
-                "sources": [],
-                "confidence": 0.0
-            }
+            return self._no_documents_result()
+        
+        if self.llm is None:
+            # Offline (local embeddings, no API key): retrieval-only answers
+            return self._retrieval_only_result(self._similarity_search(
+                question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+            ))
         
         try:
-            # Create retrieval chain
-            qa_chain = RetrievalQA.from_chain_type(
-                llm=self.llm,
-                chain_type="stuff",
-                retriever=self.vector_store.as_retriever(search_kwargs={"k": k}),
-                return_source_documents=True
-            )
+            # Reuse the cached retrieval chain
+            qa_chain = self._get_qa_chain(k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult)
             
             # Query the chain
-            result = qa_chain.invoke({"query": question})
-            
-            # Extract answer and sources
-            answer = result.get("result", "I couldn't find an answer to that question.")
-            source_docs = result.get("source_documents", [])
-            
-            # Format sources
-            sources = []
-            for doc in source_docs[:k]:
-                source_text = doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
-                sources.append(source_text)
-            
-            # Calculate confidence (simple heuristic based on number of sources)
-            confidence = min(0.9, 0.5 + (len(sources) * 0.15))
-            
-            return {
-                "answer": answer,
-                "sources": sources,
-                "confidence": confidence
-            }
+            return self._format_chain_result(qa_chain.invoke({"query": question}, config=self._llm_callbacks), k)
             
         except Exception as e:
             # Fallback to simple retrieval if LLM fails
             try:
-                # Simple similarity search
-                docs = self.vector_store.similarity_search(question, k=k)
-                sources = [doc.page_content[:200] + "..." for doc in docs]
-                answer = f"Based on the document, here's what I found:\n\n" + "\n\n".join([f"• {source}" for source in sources])
-                
+                return self._retrieval_only_result(self._similarity_search(
+                    question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+                ))
+            except Exception as fallback_error:
                 return {
-                    "answer": answer,
-                    "sources": sources,
-                    "confidence": 0.6
+                    "answer": f"I encountered an error: {str(fallback_error)}",
+                    "sources": [],
+                    "confidence": 0.0
                 }
+    
+    async def aquery(self, question: str, k: int = 3, mmr: bool = False,
+                     fetch_k: int = 20, lambda_mult: float = 0.5) -> Dict:
+        """
+        Async query(): non-blocking embedding and LLM calls, FAISS search in a worker thread
+        
+        Args:
+            question: User's question
+            k: Number of chunks to retrieve
+            mmr: Diversify the k chunks with maximal marginal relevance
+            fetch_k: Candidates considered by MMR
+            lambda_mult: MMR trade-off (1.0 relevance only, 0.0 diversity only)
+            
+        Returns:
+            Dictionary with answer, sources, and confidence
+        """
+        if self.vector_store is None or len(self.chunks) == 0:
+            return self._no_documents_result()
+        
+        if self.llm is None:
+            return self._retrieval_only_result(await self._asimilarity_search(
+                question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+            ))
+        
+        try:
+            qa_chain = self._get_qa_chain(k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult)
+            return self._format_chain_result(
+                await qa_chain.ainvoke({"query": question}, config=self._llm_callbacks), k
+            )
+            
+        except Exception as e:
+            # Fallback to simple retrieval if LLM fails
+            try:
+                return self._retrieval_only_result(await self._asimilarity_search(
+                    question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+                ))
             except Exception as fallback_error:
                 return {
                     "answer": f"I encountered an error: {str(fallback_error)}",
@@ -216,21 +721,352 @@ class RAGEngine:
                     "confidence": 0.0
                 }
     
+    @staticmethod
+    def _no_documents_result() -> Dict:
+        return {
+            "answer": "No documents uploaded yet. Please upload a document first.",
+            "sources": [],
+            "confidence": 0.0
+        }
+    
+    @staticmethod
+    def _format_chain_result(result: Dict, k: int) -> Dict:
+        """Answer dictionary from a RetrievalQA result"""
+        # Extract answer and sources
+        answer = result.get("result", "I couldn't find an answer to that question.")
+        source_docs = result.get("source_documents", [])
+        
+        # Format sources
+        sources = []
+        for doc in source_docs[:k]:
+            source_text = doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+            sources.append(source_text)
+        
+        # Calculate confidence (simple heuristic based on number of sources)
+        confidence = min(0.9, 0.5 + (len(sources) * 0.15))
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "confidence": confidence
+        }
+    
+    @staticmethod
+    def _retrieval_only_result(docs: List[Document]) -> Dict:
+        """Answer dictionary listing the retrieved chunks (used when the LLM fails)"""
+        sources = [doc.page_content[:200] + "..." for doc in docs]
+        answer = f"Based on the document, here's what I found:\n\n" + "\n\n".join([f"• {source}" for source in sources])
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "confidence": 0.6
+        }
+    
+    def stream_query(self, question: str, k: int = 3) -> Iterator[Dict]:
+        """
+        Stream a RAG answer as events
+        
+        Sources are emitted as soon as retrieval finishes, then the LLM
+        output is streamed token by token, so time-to-first-token depends
+        only on retrieval latency.
+        
+        Args:
+            question: User's question
+            k: Number of chunks to retrieve
+            
+        Returns:
+            Iterator of {"event": "sources" | "token" | "done", "data": {...}}
+        """
+        if self.vector_store is None or len(self.chunks) == 0:
+            result = self.query(question, k=k)
+            yield {"event": "token", "data": {"text": result["answer"]}}
+            yield {"event": "done", "data": result}
+            return
+        
+        try:
+            docs = self._similarity_search(question, k=k)
+        except Exception as e:
+            result = {"answer": f"I encountered an error: {str(e)}", "sources": [], "confidence": 0.0}
+            yield {"event": "token", "data": {"text": result["answer"]}}
+            yield {"event": "done", "data": result}
+            return
+        
+        sources = [
+            doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+            for doc in docs
+        ]
+        yield {"event": "sources", "data": {"sources": sources}}
+        
+        prompt = self._get_qa_prompt().format_prompt(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=question
+        )
+        parts = []
+        try:
+            for chunk in self.llm.stream(prompt, config=self._llm_callbacks):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"event": "token", "data": {"text": chunk.content}}
+            answer = "".join(parts)
+            confidence = min(0.9, 0.5 + (len(sources) * 0.15))
+        except Exception:
+            if parts:
+                # Keep what was already streamed
+                answer = "".join(parts)
+            else:
+                # Fallback to retrieval-only answer, as in query()
+                answer = f"Based on the document, here's what I found:\n\n" + "\n\n".join([f"• {source}" for source in sources])
+                yield {"event": "token", "data": {"text": answer}}
+            confidence = 0.6
+        
+        yield {"event": "done", "data": {"answer": answer, "sources": sources, "confidence": confidence}}
+    
+    def _get_qa_prompt(self):
+        """Prompt template of the "stuff" chain for the current LLM (cached)"""
+        self._check_chain_owner()
+        return self._qa_prompt
+    
+    def _get_qa_chain(self, k: int, mmr: bool = False, fetch_k: int = 20,
+                      lambda_mult: float = 0.5) -> RetrievalQA:
+        """
+        RetrievalQA chain for k retrieved chunks (one per retrieval setting)
+        
+        Chains, their retrievers and the prompt template are built once and
+        reused; they are rebuilt only when self.llm or self.vector_store is
+        replaced by a different object.
+        """
+        self._check_chain_owner()
+        key = (k, mmr, fetch_k, lambda_mult) if mmr else (k,)
+        qa_chain = self._qa_chains.get(key)
+        if qa_chain is None:
+            with self._chain_lock:
+                qa_chain = self._qa_chains.get(key)
+                if qa_chain is None:
+                    qa_chain = RetrievalQA.from_chain_type(
+                        llm=self.llm,
+                        chain_type="stuff",
+                        retriever=LockedRetriever(
+                            engine=self, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+                        ),
+                        return_source_documents=True,
+                        chain_type_kwargs={"prompt": self._qa_prompt}
+                    )
+                    self._qa_chains[key] = qa_chain
+        return qa_chain
+    
+    def _check_chain_owner(self) -> None:
+        """Drop cached chains if the LLM or the vector store object changed"""
+        llm, vector_store = self._qa_chain_owner
+        if llm is self.llm and vector_store is self.vector_store:
+            return
+        with self._chain_lock:
+            self._qa_chains = {}
+            self._qa_prompt = PROMPT_SELECTOR.get_prompt(self.llm)
+            self._qa_chain_owner = (self.llm, self.vector_store)
+    
+    def query_batch(self, questions: List[str], k: int = 3) -> List[Dict]:
+        """
+        Answer many questions with one embedding request and one FAISS search
+
+        In hybrid mode one batched BM25 pass runs first; with
+        HYBRID_LEXICAL_THRESHOLD set, questions whose best lexical hit is
+        confident skip the vector side, as in _rank. The remaining questions
+        are embedded together and searched with a single multi-vector
+        index.search, rankings are fused per question, and the LLM calls are
+        sent concurrently.
+
+        Args:
+            questions: User questions
+            k: Number of chunks to retrieve per question
+
+        Returns:
+            One answer dictionary per question, in input order
+        """
+        if self.vector_store is None or len(self.chunks) == 0:
+            return [self.query(question, k=k) for question in questions]
+
+        try:
+            hybrid = self.retrieval_mode == "hybrid"
+            fetch_k = max(self.hybrid_fetch_k, k) if hybrid else k
+            lexical = [[] for _ in questions]
+            embed = list(range(len(questions)))
+            if hybrid:
+                with metrics.span("full", "lexical_search"), self.index_lock.read():
+                    lexical = self.lexical_index.search_batch(questions, k=fetch_k)
+                    if self.lexical_skip_threshold is not None:
+                        embed = [
+                            i for i, hits in enumerate(lexical)
+                            if not hits or self.lexical_index.idf_coverage(questions[i], hits[0][0])
+                            < self.lexical_skip_threshold
+                        ]
+            
+            # One embedding request, one search for the questions that need them
+            vector = [[] for _ in questions]
+            if embed:
+                with metrics.span("full", "embed_query"):
+                    texts = [questions[i] for i in embed]
+                    if isinstance(self.embeddings, CachedEmbeddings):
+                        vectors = self.embeddings.embed_queries(texts)
+                    else:
+                        vectors = self.embeddings.embed_documents(texts)
+                vectors = np.asarray(vectors, dtype=np.float32)
+            with metrics.span("full", "retrieve_batch"), self.index_lock.read():
+                if embed:
+                    _, indices = self.vector_store.index.search(vectors, fetch_k)
+                    id_map = self.vector_store.index_to_docstore_id
+                    for i, row in zip(embed, indices):
+                        vector[i] = [id_map[label] for label in row if label != -1]
+                rankings = [
+                    [chunk_id for chunk_id, _ in reciprocal_rank_fusion(
+                        [[chunk_id for chunk_id, _ in hits], ranking], k
+                    )] if hybrid else ranking
+                    for hits, ranking in zip(lexical, vector)
+                ]
+                # A chunk deleted since the lexical pass is simply left out
+                docs_per_question = [
+                    [self.chunks[chunk_id] for chunk_id in ranking[:k] if chunk_id in self.chunks]
+                    for ranking in rankings
+                ]
+        except Exception as e:
+            return [{
+                "answer": f"I encountered an error: {str(e)}",
+                "sources": [],
+                "confidence": 0.0
+            } for _ in questions]
+
+        # Same "stuff" prompt RetrievalQA uses, sent as one concurrent batch
+        prompt = self._get_qa_prompt()
+        prompts = [
+            prompt.format_prompt(
+                context="\n\n".join(doc.page_content for doc in docs),
+                question=question
+            )
+            for question, docs in zip(questions, docs_per_question)
+        ]
+        try:
+            responses = self.llm.batch(prompts, config=self._llm_callbacks, return_exceptions=True)
+        except Exception as e:
+            responses = [e] * len(prompts)
+
+        results = []
+        for docs, response in zip(docs_per_question, responses):
+            sources = [
+                doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+                for doc in docs
+            ]
+            if isinstance(response, Exception):
+                # Fallback to retrieval-only answer, as in query()
+                answer = f"Based on the document, here's what I found:\n\n" + "\n\n".join([f"• {source}" for source in sources])
+                confidence = 0.6
+            else:
+                answer = response.content
+                confidence = min(0.9, 0.5 + (len(sources) * 0.15))
+            results.append({
+                "answer": answer,
+                "sources": sources,
+                "confidence": confidence
+            })
+        return results
+
     def get_stats(self) -> Dict:
         """Get statistics about processed documents"""
         return {
             "total_chunks": len(self.chunks),
             "has_vector_store": self.vector_store is not None,
-            "total_documents": len(self.documents)
+            "vector_index": self.vector_index_info,
+            "total_documents": len(self.registry),
+            "embedding_cache": self.embeddings.get_stats() if isinstance(self.embeddings, CachedEmbeddings) else None,
+            "embedding_batcher": self.embedding_batcher.get_stats() if self.embedding_batcher else None
+        }
+    
+    def search_candidates(self, question: str, k: int = 3,
+                          embedding: Optional[List[float]] = None) -> Dict[str, List[Tuple[str, Document, float]]]:
+        """
+        Unfused vector and lexical candidates, for merging results across collections
+        
+        Scores are returned raw: L2 distances are comparable across
+        collections that share the embedder, and rank fusion has to run
+        once over the merged lists, not per collection. The lexical skip
+        threshold does not apply here, both lists are always searched.
+        
+        Args:
+            question: User's question
+            k: Candidates per list (at least HYBRID_FETCH_K in hybrid mode)
+            embedding: Question embedding, if the caller already computed it
+            
+        Returns:
+            {"vector": [(chunk id, chunk, L2 distance)], "lexical": [(chunk id, chunk, BM25 score)]},
+            best first; "lexical" is empty outside hybrid mode
+        """
+        candidates = {"vector": [], "lexical": []}
+        if self.vector_store is None or len(self.chunks) == 0:
+            return candidates
+        hybrid = self.retrieval_mode == "hybrid"
+        fetch_k = max(self.hybrid_fetch_k, k) if hybrid else k
+        with metrics.span("full", "retrieve"):
+            if embedding is None:
+                embedding = self._embed_query(question)
+            hits = {"vector": self._vector_search(embedding, fetch_k)}
+            if hybrid:
+                hits["lexical"] = self._lexical_search(question, fetch_k)[0]
+        for name, ranked in hits.items():
+            for chunk_id, score in ranked:
+                # A chunk deleted since the search is simply left out
+                chunk = self.chunks.get(chunk_id)
+                if chunk is not None:
+                    candidates[name].append((chunk_id, chunk, score))
+        return candidates
+    
+    def answer_from_chunks(self, question: str, docs: List[Document]) -> Dict:
+        """
+        Answer a question from chunks retrieved elsewhere (e.g. merged across collections)
+        
+        Uses the same "stuff" prompt as the RetrievalQA chain; falls back to
+        a retrieval-only answer without an LLM or when the LLM call fails.
+        """
+        if not docs:
+            return {
+                "answer": "I couldn't find anything in the documents matching that question.",
+                "sources": [],
+                "confidence": 0.0
+            }
+        if self.llm is None:
+            return self._retrieval_only_result(docs)
+        
+        prompt = self._get_qa_prompt().format_prompt(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=question
+        )
+        try:
+            response = self.llm.invoke(prompt, config=self._llm_callbacks)
+        except Exception:
+            return self._retrieval_only_result(docs)
+        sources = [
+            doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content
+            for doc in docs
+        ]
+        return {
+            "answer": response.content,
+            "sources": sources,
+            "confidence": min(0.9, 0.5 + (len(sources) * 0.15))
         }
     
-    def get_relevant_chunks(self, question: str, k: int = 3) -> List[Document]:
+    def embed_question(self, question: str) -> Optional[List[float]]:
+        """Query embedding shared by a fan-out search (None when embeddings are unavailable)"""
+        return self._embed_query(question) if self.embeddings is not None else None
+    
+    def get_relevant_chunks(self, question: str, k: int = 3, mmr: bool = False,
+                            fetch_k: int = 20, lambda_mult: float = 0.5) -> List[Document]:
         """
         Get relevant document chunks for a question (used by agentic workflow)
         
         Args:
             question: User's question
             k: Number of chunks to retrieve
+            mmr: Diversify the k chunks with maximal marginal relevance
+            fetch_k: Candidates considered by MMR
+            lambda_mult: MMR trade-off (1.0 relevance only, 0.0 diversity only)
             
         Returns:
             List of relevant document chunks
@@ -239,6 +1075,162 @@ class RAGEngine:
             return []
         
         try:
-            return self.vector_store.similarity_search(question, k=k)
+            return self._similarity_search(question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult)
         except Exception:
             return []
+    
+    async def aget_relevant_chunks(self, question: str, k: int = 3, mmr: bool = False,
+                                   fetch_k: int = 20, lambda_mult: float = 0.5) -> List[Document]:
+        """Async get_relevant_chunks()"""
+        if self.vector_store is None:
+            return []
+        
+        try:
+            return await self._asimilarity_search(
+                question, k=k, mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult
+            )
+        except Exception:
+            return []
+    
+    def _similarity_search(self, question: str, k: int = 3, mmr: bool = False,
+                           fetch_k: int = 20, lambda_mult: float = 0.5) -> List[Document]:
+        """
+        Retrieve k chunks for a question (raises on failure)
+        
+        Vector-only or hybrid depending on retrieval_mode. With mmr=True,
+        fetch_k candidates are retrieved and k of them are picked by maximal
+        marginal relevance over their stored vectors (nothing is re-embedded).
+        The question is embedded before any lock is taken, so only the index
+        lookups themselves compete with ingestion.
+        """
+        with metrics.span("full", "retrieve"):
+            if not mmr:
+                return self._resolve(self._rank(question, k))
+            embedding = self._embed_query(question)
+            hits = self._rank(question, max(fetch_k, k), embedding)
+            return self._resolve(self._select_mmr(embedding, hits, k, lambda_mult))
+    
+    async def _asimilarity_search(self, question: str, k: int = 3, mmr: bool = False,
+                                  fetch_k: int = 20, lambda_mult: float = 0.5) -> List[Document]:
+        """Async _similarity_search(): awaits the embedding, runs index lookups in worker threads"""
+        with metrics.span("full", "retrieve"):
+            if not mmr:
+                return self._resolve(await self._arank(question, k))
+            embedding = await self._aembed_query(question)
+            hits = await self._arank(question, max(fetch_k, k), embedding)
+            return self._resolve(await asyncio.to_thread(self._select_mmr, embedding, hits, k, lambda_mult))
+    
+    def _rank(self, question: str, k: int,
+              embedding: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+        """Top k (docstore id, relevance) pairs from vector or hybrid retrieval"""
+        if self.retrieval_mode != "hybrid":
+            if embedding is None:
+                embedding = self._embed_query(question)
+            return self._vector_relevance(self._vector_search(embedding, k))
+        
+        fetch_k = max(self.hybrid_fetch_k, k)
+        if self.lexical_skip_threshold is not None:
+            # Lexical search first: confident answers never pay for an embedding
+            lexical, coverage = self._lexical_search(question, fetch_k)
+            if coverage >= self.lexical_skip_threshold:
+                # Same (RRF) scale as a fused result, just from one ranking
+                return self._fuse(lexical, [], k)
+            if embedding is None:
+                embedding = self._embed_query(question)
+            vector = self._vector_search(embedding, fetch_k)
+        else:
+            # BM25 runs while the question is being embedded
+            lexical_future = self._lexical_pool.submit(self._lexical_search, question, fetch_k)
+            if embedding is None:
+                embedding = self._embed_query(question)
+            vector = self._vector_search(embedding, fetch_k)
+            lexical, _ = lexical_future.result()
+        return self._fuse(lexical, vector, k)
+    
+    async def _arank(self, question: str, k: int,
+                     embedding: Optional[List[float]] = None) -> List[Tuple[str, float]]:
+        """Async _rank()"""
+        async def vector_search(fetch_k: int) -> List[Tuple[str, float]]:
+            vector_embedding = embedding
+            if vector_embedding is None:
+                vector_embedding = await self._aembed_query(question)
+            return await asyncio.to_thread(self._vector_search, vector_embedding, fetch_k)
+        
+        if self.retrieval_mode != "hybrid":
+            return self._vector_relevance(await vector_search(k))
+        
+        fetch_k = max(self.hybrid_fetch_k, k)
+        if self.lexical_skip_threshold is not None:
+            lexical, coverage = await asyncio.to_thread(self._lexical_search, question, fetch_k)
+            if coverage >= self.lexical_skip_threshold:
+                return self._fuse(lexical, [], k)
+            vector = await vector_search(fetch_k)
+        else:
+            (lexical, _), vector = await asyncio.gather(
+                asyncio.to_thread(self._lexical_search, question, fetch_k), vector_search(fetch_k)
+            )
+        return self._fuse(lexical, vector, k)
+    
+    def _embed_query(self, question: str) -> List[float]:
+        with metrics.span("full", "embed_query"):
+            return self.embeddings.embed_query(question)
+    
+    async def _aembed_query(self, question: str) -> List[float]:
+        with metrics.span("full", "embed_query"):
+            return await self.embeddings.aembed_query(question)
+    
+    def _search_by_vector(self, embedding: List[float], k: int = 3) -> List[Document]:
+        return self._resolve(self._vector_relevance(self._vector_search(embedding, k)))
+    
+    def _vector_search(self, embedding: List[float], k: int) -> List[Tuple[str, float]]:
+        """FAISS search under the read lock: (docstore id, L2 distance) pairs, best first"""
+        query = np.asarray([embedding], dtype=np.float32)
+        with metrics.span("full", "vector_search"), self.index_lock.read():
+            distances, indices = self.vector_store.index.search(query, k)
+            id_map = self.vector_store.index_to_docstore_id
+            return [(id_map[i], float(d)) for i, d in zip(indices[0], distances[0]) if i != -1]
+    
+    @staticmethod
+    def _vector_relevance(hits: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        # FAISS returns L2 distances; callers expect higher-is-better relevance
+        return [(chunk_id, 1.0 / (1.0 + distance)) for chunk_id, distance in hits]
+    
+    def _lexical_search(self, question: str, k: int) -> Tuple[List[Tuple[str, float]], float]:
+        """BM25 candidates for hybrid retrieval, plus the IDF coverage of the best hit"""
+        with metrics.span("full", "lexical_search"), self.index_lock.read():
+            hits = self.lexical_index.search(question, k=k)
+            coverage = self.lexical_index.idf_coverage(question, hits[0][0]) if hits else 0.0
+        return hits, coverage
+    
+    @staticmethod
+    def _fuse(lexical: List[Tuple[str, float]], vector: List[Tuple[str, float]],
+              k: int) -> List[Tuple[str, float]]:
+        """Merge BM25 and FAISS rankings with reciprocal rank fusion"""
+        return reciprocal_rank_fusion(
+            [[chunk_id for chunk_id, _ in lexical], [chunk_id for chunk_id, _ in vector]], k
+        )
+    
+    def _select_mmr(self, embedding: List[float], hits: List[Tuple[str, float]],
+                    k: int, lambda_mult: float) -> List[Tuple[str, float]]:
+        """Re-rank candidate hits with MMR, using vectors reconstructed from the FAISS index"""
+        with self.index_lock.read():
+            labels = self.stable_ids.labels
+            hits = [(chunk_id, score) for chunk_id, score in hits if chunk_id in labels]
+            if not hits:
+                return []
+            vectors = self.vector_store.index.reconstruct_batch(
+                np.asarray([labels[chunk_id] for chunk_id, _ in hits], dtype=np.int64)
+            )
+        order = maximal_marginal_relevance(np.asarray(embedding, dtype=np.float32), vectors, k, lambda_mult)
+        return [hits[i] for i in order]
+    
+    def _resolve(self, hits: List[Tuple[str, float]]) -> List[Document]:
+        """Chunks for (docstore id, relevance) hits, recorded in the retrieval trace"""
+        results = []
+        for chunk_id, score in hits:
+            # A chunk deleted since the search is simply left out
+            chunk = self.chunks.get(chunk_id)
+            if chunk is not None:
+                results.append((chunk, score))
+        record_retrieval(results)
+        return [chunk for chunk, _ in results]
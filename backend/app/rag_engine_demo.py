@@ -1,21 +1,27 @@
 """
 Demo RAG Engine - Works WITHOUT OpenAI API (Free Mode)
 
-This version uses simple text matching instead of embeddings/LLM
+This version uses BM25 keyword retrieval instead of embeddings/LLM
 Perfect for testing the system structure without API costs
 """
 
+import asyncio
 import os
-from typing import List, Dict, Optional
+import threading
+import uuid
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 
 # LangChain imports for text splitting
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 
-# Document processing imports
-import PyPDF2
-from docx import Document as DocxDocument
+from app.bm25_index import BM25Index, tokenize
+from app.document_registry import DocumentRegistry
+from app.extraction import extract_chunks
+from app import metrics
+from app.locks import ReadWriteLock
+from app.retrieval_trace import record_retrieval
 
 load_dotenv()
 
@@ -24,7 +30,7 @@ class RAGEngineDemo:
     """
     Demo RAG Engine that works WITHOUT OpenAI:
     - Processes documents (extracts text, chunks it)
-    - Uses simple keyword matching instead of embeddings
+    - Uses a BM25 inverted index instead of embeddings
     - Returns relevant chunks based on text similarity
     - No API costs!
     """
@@ -38,67 +44,115 @@ class RAGEngineDemo:
             length_function=len,
         )
         
-        # Simple storage (no vector DB needed)
-        self.documents: List[str] = []
-        self.chunks: List[Document] = []
-        self.chunk_texts: List[str] = []
+        # Simple storage (no vector DB needed): chunk id -> chunk
+        self.chunks: Dict[int, Document] = {}
+        self._next_chunk_id = 0
+        # document id -> chunk ids and metadata
+        self.registry = DocumentRegistry()
         
-    def process_document(self, file_path: str, file_type: str) -> int:
+        # Bumped on every ingest/delete; corpus_id tells apart corpora whose
+        # counters happen to match (e.g. a fresh corpus after a restart)
+        self.corpus_id = uuid.uuid4().hex
+        self.corpus_version = 0
+        
+        # Inverted index over the chunks (BM25 doc id = chunk id)
+        self.index = BM25Index()
+        self.index_lock = ReadWriteLock()
+        
+        # Nothing is persisted in demo mode, so the engine is ready immediately
+        self.index_ready = threading.Event()
+        self.index_ready.set()
+        
+    def process_document(self, file_path: str, file_type: str,
+                         progress: Optional[Callable[[str], None]] = None,
+                         content_hash: Optional[str] = None) -> int:
         """
         Process a document: extract text, chunk it (NO embeddings needed)
         
         Args:
             file_path: Path to the document file
             file_type: File extension (pdf, txt, docx)
+            progress: Optional callback receiving the current stage
+                      ("extract", "chunk", "index")
+            content_hash: Optional sha256 of the file, recorded for deduplication
             
         Returns:
             Number of chunks processed
         """
+        progress = progress or (lambda stage: None)
         try:
-            # Extract text based on file type
-            text = self._extract_text(file_path, file_type)
+            # Stream the text straight into the splitter (never held as one string)
+            progress("extract")
+            chunks = []
+            timings: Dict[str, float] = {}
+            for chunk in extract_chunks(file_path, file_type, self.text_splitter, timings=timings):
+                if not chunks:
+                    progress("chunk")
+                chunks.append(chunk)
+            for stage, seconds in timings.items():
+                metrics.observe_stage("demo", stage, seconds)
             
-            if not text or len(text.strip()) < 50:
+            if sum(len(chunk.page_content.strip()) for chunk in chunks) < 50:
                 raise ValueError("Document is too short or empty")
             
-            # Split text into chunks
-            chunks = self.text_splitter.create_documents([text])
-            
-            # Store chunks
-            self.chunks.extend(chunks)
-            self.chunk_texts.extend([chunk.page_content for chunk in chunks])
-            self.documents.append(text)
+            # Store chunks and index them (tokenized once, here)
+            progress("index")
+            document_id = os.path.basename(file_path)
+            with metrics.span("demo", "index"), self.index_lock.write():
+                # Re-uploading a document id replaces its previous version
+                self._remove_chunks(document_id)
+                chunk_ids = []
+                for chunk in chunks:
+                    chunk_id = self._next_chunk_id
+                    self._next_chunk_id += 1
+                    self.index.add(chunk_id, chunk.page_content)
+                    self.chunks[chunk_id] = chunk
+                    chunk_ids.append(chunk_id)
+                self.registry.register(document_id, chunk_ids, content_hash=content_hash)
+                self.corpus_version += 1
             
             return len(chunks)
             
         except Exception as e:
             raise Exception(f"Error processing document: {str(e)}")
     
-    def _extract_text(self, file_path: str, file_type: str) -> str:
-        """Extract text from different file types"""
-        if file_type == "txt":
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
-        
-        elif file_type == "pdf":
-            text = ""
-            with open(file_path, "rb") as f:
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
-        
-        elif file_type == "docx":
-            doc = DocxDocument(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            return text
+    def delete_document(self, document_id: str) -> Optional[Dict]:
+        """
+        Remove a document's chunks and postings
         
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
+        Args:
+            document_id: Document to delete
+            
+        Returns:
+            The removed registry record, or None if the document is unknown
+        """
+        with self.index_lock.write():
+            record = self._remove_chunks(document_id)
+            if record is not None:
+                self.corpus_version += 1
+            return record
+    
+    def _remove_chunks(self, document_id: str) -> Optional[Dict]:
+        """Drop a document from registry, chunks and index (caller holds the write lock)"""
+        record = self.registry.remove(document_id)
+        if record is not None:
+            for chunk_id in record["chunk_ids"]:
+                self.index.remove(chunk_id)
+                del self.chunks[chunk_id]
+        return record
+    
+    def list_documents(self) -> List[Dict]:
+        """Registered documents with their chunk counts"""
+        with self.index_lock.read():
+            return self.registry.list()
+    
+    def find_document(self, content_hash: str) -> Optional[Dict]:
+        """Already-ingested document with this content hash (registry record), if any"""
+        return self.registry.find_by_hash(content_hash)
     
     def query(self, question: str, k: int = 3) -> Dict:
         """
-        Query using simple keyword matching (NO OpenAI needed)
+        Query using BM25 keyword retrieval (NO OpenAI needed)
         
         Args:
             question: User's question
@@ -115,65 +169,140 @@ class RAGEngineDemo:
             }
         
         try:
-            # Simple keyword matching
-            question_lower = question.lower()
-            question_words = set(question_lower.split())
-            
-            # Score chunks based on keyword matches
-            scored_chunks = []
-            for i, chunk_text in enumerate(self.chunk_texts):
-                chunk_lower = chunk_text.lower()
-                chunk_words = set(chunk_lower.split())
-                
-                # Calculate simple similarity (word overlap)
-                common_words = question_words.intersection(chunk_words)
-                score = len(common_words) / max(len(question_words), 1)
-                
-                scored_chunks.append((score, chunk_text, i))
-            
-            # Sort by score and get top k
-            scored_chunks.sort(reverse=True, key=lambda x: x[0])
-            top_chunks = scored_chunks[:k]
-            
-            # Build answer from top chunks
-            sources = []
-            answer_parts = []
-            
-            for score, chunk_text, idx in top_chunks:
-                # Truncate for display
-                source_text = chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
-                sources.append(source_text)
-                
-                # Add to answer
-                answer_parts.append(chunk_text)
-            
-            # Create simple answer
-            answer = f"Based on the document, here's what I found:\n\n"
-            answer += "\n\n".join([f"• {part[:300]}..." if len(part) > 300 else f"• {part}" 
-                                  for part in answer_parts[:3]])
-            
-            # Calculate confidence based on match score
-            confidence = min(0.9, 0.5 + (top_chunks[0][0] * 0.4) if top_chunks else 0.5)
-            
+            with self.index_lock.read():
+                return self._build_answer(question, self._search(question, k))
+        except Exception as e:
             return {
-                "answer": answer,
-                "sources": sources,
-                "confidence": confidence
+                "answer": f"I encountered an error: {str(e)}",
+                "sources": [],
+                "confidence": 0.0
             }
+    
+    async def aquery(self, question: str, k: int = 3) -> Dict:
+        """Async query(): BM25 scoring is CPU-bound, so it runs in a worker thread"""
+        return await asyncio.to_thread(self.query, question, k)
+    
+    def query_batch(self, questions: List[str], k: int = 3) -> List[Dict]:
+        """
+        Answer many questions with one vectorized BM25 scoring pass
+        
+        Args:
+            questions: User questions
+            k: Number of chunks to retrieve per question
             
+        Returns:
+            One answer dictionary per question, in input order
+        """
+        if len(self.chunks) == 0:
+            return [self.query(question, k=k) for question in questions]
+        
+        try:
+            with self.index_lock.read():
+                with metrics.span("demo", "retrieve_batch"):
+                    all_hits = self.index.search_batch(questions, k=k)
+                return [self._build_answer(question, hits) for question, hits in zip(questions, all_hits)]
         except Exception as e:
-            return {
+            return [{
                 "answer": f"I encountered an error: {str(e)}",
                 "sources": [],
                 "confidence": 0.0
+            } for _ in questions]
+    
+    def stream_query(self, question: str, k: int = 3) -> Iterator[Dict]:
+        """
+        Same events as RAGEngine.stream_query (sources, token, done)
+        
+        There is no LLM in demo mode, so the answer arrives as one token.
+        """
+        result = self.query(question, k=k)
+        if result["sources"]:
+            yield {"event": "sources", "data": {"sources": result["sources"]}}
+        yield {"event": "token", "data": {"text": result["answer"]}}
+        yield {"event": "done", "data": result}
+    
+    def _search(self, question: str, k: int) -> List[Tuple[int, float]]:
+        """BM25 search that records its hits in the request's retrieval trace (caller holds the read lock)"""
+        with metrics.span("demo", "retrieve"):
+            hits = self.index.search(question, k=k)
+        record_retrieval([(self.chunks[idx], score) for idx, score in hits])
+        return hits
+    
+    def _build_answer(self, question: str, top_chunks: List[Tuple[int, float]]) -> Dict:
+        """Turn ranked (chunk index, score) hits into an answer dictionary"""
+        if not top_chunks:
+            return {
+                "answer": "I couldn't find anything in the documents matching that question.",
+                "sources": [],
+                "confidence": 0.0
             }
+        
+        # Confidence is based on how many query terms the best chunk covers
+        return self._format_answer(
+            [self.chunks[idx] for idx, _ in top_chunks],
+            self.index.term_coverage(question, top_chunks[0][0])
+        )
+    
+    @staticmethod
+    def _format_answer(chunks: List[Document], coverage: float) -> Dict:
+        """Answer dictionary quoting the ranked chunks"""
+        # Build answer from top chunks
+        sources = []
+        answer_parts = []
+        
+        for chunk in chunks:
+            chunk_text = chunk.page_content
+            # Truncate for display
+            source_text = chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
+            sources.append(source_text)
+            
+            # Add to answer
+            answer_parts.append(chunk_text)
+        
+        # Create simple answer
+        answer = f"Based on the document, here's what I found:\n\n"
+        answer += "\n\n".join([f"• {part[:300]}..." if len(part) > 300 else f"• {part}" 
+                              for part in answer_parts[:3]])
+        
+        return {
+            "answer": answer,
+            "sources": sources,
+            "confidence": min(0.9, 0.5 + coverage * 0.4)
+        }
+    
+    def search_candidates(self, question: str, k: int = 3,
+                          embedding: Optional[List[float]] = None) -> Dict[str, List[Tuple[int, Document, float]]]:
+        """Top k BM25 candidates (no vector list in demo mode), for merging results across collections"""
+        candidates = {"vector": [], "lexical": []}
+        if len(self.chunks) == 0:
+            return candidates
+        with metrics.span("demo", "retrieve"), self.index_lock.read():
+            candidates["lexical"] = [
+                (idx, self.chunks[idx], score) for idx, score in self.index.search(question, k=k)
+            ]
+        return candidates
+    
+    def answer_from_chunks(self, question: str, docs: List[Document]) -> Dict:
+        """Answer from chunks retrieved elsewhere (e.g. merged across collections)"""
+        if not docs:
+            return {
+                "answer": "I couldn't find anything in the documents matching that question.",
+                "sources": [],
+                "confidence": 0.0
+            }
+        terms = set(tokenize(question))
+        coverage = len(terms & set(tokenize(docs[0].page_content))) / len(terms) if terms else 0.0
+        return self._format_answer(docs, coverage)
+    
+    def embed_question(self, question: str) -> Optional[List[float]]:
+        """No embeddings in demo mode"""
+        return None
     
     def get_stats(self) -> Dict:
         """Get statistics about processed documents"""
         return {
             "total_chunks": len(self.chunks),
             "has_vector_store": False,
-            "total_documents": len(self.documents),
+            "total_documents": len(self.registry),
             "mode": "DEMO (No OpenAI required)"
         }
     
@@ -182,18 +311,10 @@ class RAGEngineDemo:
         if len(self.chunks) == 0:
             return []
         
-        # Use same simple matching
-        question_lower = question.lower()
-        question_words = set(question_lower.split())
-        
-        scored_chunks = []
-        for i, chunk in enumerate(self.chunks):
-            chunk_lower = chunk.page_content.lower()
-            chunk_words = set(chunk_lower.split())
-            common_words = question_words.intersection(chunk_words)
-            score = len(common_words) / max(len(question_words), 1)
-            scored_chunks.append((score, chunk, i))
-        
-        scored_chunks.sort(reverse=True, key=lambda x: x[0])
-        return [chunk for _, chunk, _ in scored_chunks[:k]]
-
+        # Same inverted index as query()
+        with self.index_lock.read():
+            return [self.chunks[idx] for idx, _ in self._search(question, k)]
+    
+    async def aget_relevant_chunks(self, question: str, k: int = 3) -> List[Document]:
+        """Async get_relevant_chunks() (runs in a worker thread)"""
+        return await asyncio.to_thread(self.get_relevant_chunks, question, k)
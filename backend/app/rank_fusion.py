@@ -0,0 +1,36 @@
+"""
+Rank Fusion - Merging Ranked Lists from Different Retrievers
+
+This module implements:
+- Reciprocal rank fusion (RRF), which combines rankings whose scores are
+  not comparable (BM25 scores vs. vector distances) using ranks only
+"""
+
+from typing import Dict, Hashable, List, Tuple
+
+# Standard RRF damping constant; larger values flatten the weight of top ranks
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int,
+                           rrf_k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several rankings of the same kind of ids
+
+    Each id scores sum(1 / (rrf_k + rank)) over the rankings it appears in
+    (rank starts at 1), so ids ranked well by several retrievers rise to
+    the top.
+
+    Args:
+        rankings: Ranked id lists, best first
+        k: Number of fused results to return
+        rrf_k: Damping constant
+
+    Returns:
+        List of (id, fused score) pairs, best first
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda entry: entry[1], reverse=True)[:k]
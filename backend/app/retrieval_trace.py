@@ -0,0 +1,73 @@
+"""
+Retrieval Trace - Chunks Retrieved While Answering One Request
+
+This module implements:
+- A per-request trace held in a context variable, so it follows the request
+  through agent tools, async tasks and asyncio.to_thread workers
+- Recording of every retrieved chunk with its relevance score
+- Sources built from the trace, without another retrieval round-trip
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+_current_trace: ContextVar[Optional["RetrievalTrace"]] = ContextVar("retrieval_trace", default=None)
+
+
+class RetrievalTrace:
+    """
+    Chunks retrieved during one request
+
+    Scores are relevances (higher is better). A chunk retrieved several
+    times keeps its best score and a count of how often it was retrieved.
+    """
+
+    def __init__(self):
+        # chunk text -> {"chunk", "score", "retrievals"}
+        self.hits: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.hits)
+
+    def record(self, results: List[Tuple[Document, float]]) -> None:
+        """Add (chunk, relevance) pairs from one retrieval"""
+        with self._lock:
+            for chunk, score in results:
+                hit = self.hits.get(chunk.page_content)
+                if hit is None:
+                    self.hits[chunk.page_content] = {"chunk": chunk, "score": float(score), "retrievals": 1}
+                else:
+                    hit["score"] = max(hit["score"], float(score))
+                    hit["retrievals"] += 1
+
+    def top(self, k: int = 3) -> List[Dict]:
+        """The k best-scoring hits"""
+        with self._lock:
+            return sorted(self.hits.values(), key=lambda hit: hit["score"], reverse=True)[:k]
+
+    def sources(self, k: int = 3) -> List[str]:
+        """Source snippets in the same format the engines return"""
+        return [hit["chunk"].page_content[:200] + "..." for hit in self.top(k)]
+
+
+@contextmanager
+def retrieval_trace() -> Iterator[RetrievalTrace]:
+    """Start a trace for the current request; retrievals inside the block are recorded"""
+    trace = RetrievalTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_retrieval(results: List[Tuple[Document, float]]) -> None:
+    """Record retrieval results in the active trace (no-op outside a trace)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record(results)
@@ -0,0 +1,358 @@
+"""
+Vector Index - Compressed FAISS Index Types for Large Corpora
+
+This module implements:
+- Index types selected by VECTOR_INDEX_TYPE: exact float32 (flat), float16
+  storage, product quantization, and inverted-file (IVF) variants whose
+  searches only scan the lists closest to the query
+- Automatic (re)training: trained types replace the flat index once the
+  corpus reaches a size threshold, and are retrained and rebuilt from the
+  stored vectors each time the corpus has grown by a set factor; a build
+  from an older snapshot is caught up with the live index before the swap
+- Adds and deletes by stable FAISS id for every index type (IDMap2 around
+  flat, f16 and PQ; a hashtable direct map for IVF), with a docstore id ->
+  FAISS id map so a delete never walks the whole id mapping
+
+Trade-offs, per chunk at 1536 dimensions (recall is the overlap of the top
+k with the flat top k; benchmarks/bench_index_types.py measures all three):
+
+    flat     6144 bytes  exact         every search scans every vector
+    f16      3072 bytes  ~exact        full scan over half the bytes
+    pq        192 bytes  approximate   full scan over compact codes
+    ivf     ~6160 bytes  nprobe-bound  scans nprobe of nlist lists
+    ivf_f16 ~3090 bytes  nprobe-bound  as ivf, half the memory
+    ivf_pq   ~210 bytes  lowest        smallest and fastest at scale
+
+Every type also stores an 8-byte id per vector plus an id -> row (or list)
+map, so it deletes and reconstructs by id.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+
+INDEX_TYPES = ("flat", "f16", "pq", "ivf", "ivf_f16", "ivf_pq")
+TRAINED_TYPES = ("pq", "ivf", "ivf_f16", "ivf_pq")
+# Reconstructions from these are approximate, so retraining prefers exact vectors
+LOSSY_TYPES = ("pq", "ivf_pq")
+
+# k-means wants at least ~39 training points per centroid; training uses
+# that many (not FAISS's 256) so rebuilds, and the catch-up after them, stay short
+TRAIN_POINTS_PER_CENTROID = 40
+# PQ codes are 8 bits: 256 centroids per sub-vector
+PQ_CENTROIDS = 256
+
+
+@dataclass
+class VectorIndexConfig:
+    """
+    Which FAISS index to build, and when to (re)train it
+
+    Attributes:
+        index_type: One of INDEX_TYPES
+        train_min: Trained types keep the flat index until the corpus has
+                   this many chunks (also the minimum training set size)
+        retrain_growth: Retrain once the corpus is this many times larger
+                        than the set the index was trained on
+        nlist: IVF lists (0: about 4 * sqrt(chunks), bounded by train data)
+        nprobe: IVF lists scanned per search (recall/latency knob)
+        pq_m: PQ sub-vectors, i.e. bytes per vector (0: dimensions / 8)
+    """
+    index_type: str = "flat"
+    train_min: int = 10000
+    retrain_growth: float = 2.0
+    nlist: int = 0
+    nprobe: int = 16
+    pq_m: int = 0
+
+    def __post_init__(self):
+        self.index_type = self.index_type.lower()
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown vector index type '{self.index_type}', expected one of {INDEX_TYPES}")
+        if self.index_type in ("pq", "ivf_pq"):
+            # Fewer points than PQ centroids cannot be trained at all
+            self.train_min = max(self.train_min, PQ_CENTROIDS)
+        self.train_min = max(self.train_min, 1)
+
+    def factory_string(self, dimensions: int, vectors: int) -> str:
+        """
+        faiss.index_factory description of the configured type for a corpus of this size
+
+        PQ codes skip polysemous training ("np"): it only serves Hamming
+        pre-filtering, which searches here do not use, and dominates training time.
+        """
+        if self.index_type == "flat":
+            return "Flat"
+        if self.index_type == "f16":
+            return "SQfp16"
+        if self.index_type == "pq":
+            return f"PQ{self.pq_subquantizers(dimensions)}x8np"
+
+        nlist = self.nlist or int(4 * math.sqrt(vectors))
+        nlist = max(1, min(nlist, vectors // TRAIN_POINTS_PER_CENTROID))
+        encoding = {
+            "ivf": "Flat",
+            "ivf_f16": "SQfp16",
+            "ivf_pq": f"PQ{self.pq_subquantizers(dimensions)}x8np"
+        }[self.index_type]
+        return f"IVF{nlist},{encoding}"
+
+    def pq_subquantizers(self, dimensions: int) -> int:
+        """Number of PQ sub-vectors: pq_m if set, else the largest divisor of dimensions up to dimensions / 8"""
+        if self.pq_m:
+            if dimensions % self.pq_m:
+                raise ValueError(f"VECTOR_INDEX_PQ_M={self.pq_m} must divide the embedding size {dimensions}")
+            return self.pq_m
+        m = max(1, dimensions // 8)
+        while dimensions % m:
+            m -= 1
+        return m
+
+    def plan(self, info: Dict, vectors: int) -> Optional[str]:
+        """
+        Whether the index should be rebuilt after a write
+
+        Args:
+            info: Description of the current index ({"type", "trained_on", ...})
+            vectors: Chunks in the index
+
+        Returns:
+            "convert", "train", "retrain" or None (keep the current index)
+        """
+        if vectors == 0:
+            return None
+        current = info.get("type", "flat")
+        if self.index_type not in TRAINED_TYPES:
+            return "convert" if current != self.index_type else None
+        if vectors < self.train_min:
+            # Too few vectors to train: stay flat (or keep an index trained earlier)
+            return None
+        if current != self.index_type:
+            return "train"
+        if vectors >= info.get("trained_on", 0) * self.retrain_growth:
+            return "retrain"
+        return None
+
+
+class StableIds:
+    """
+    docstore id -> FAISS id map of a store whose FAISS ids survive deletions
+
+    LangChain's FAISS store only maps FAISS id -> docstore id, and its
+    delete() rebuilds that whole mapping. The engine keeps the reverse map
+    alongside it, so adds take fresh ids and deletes look their ids up.
+    """
+
+    def __init__(self, index_to_docstore_id: Dict[int, str]):
+        self.labels: Dict[str, int] = {chunk_id: label for label, chunk_id in index_to_docstore_id.items()}
+        self.next_label = max(index_to_docstore_id, default=-1) + 1
+
+    def allocate(self, chunk_ids: List[str]) -> np.ndarray:
+        """Fresh FAISS ids for new docstore ids (never reused after a delete)"""
+        labels = np.arange(self.next_label, self.next_label + len(chunk_ids), dtype=np.int64)
+        self.next_label += len(chunk_ids)
+        self.labels.update(zip(chunk_ids, labels.tolist()))
+        return labels
+
+    def pop(self, chunk_ids: List[str]) -> List[int]:
+        """FAISS ids of docstore ids being deleted (unknown ids are skipped)"""
+        return [self.labels.pop(chunk_id) for chunk_id in chunk_ids if chunk_id in self.labels]
+
+
+def flat_index_info() -> Dict:
+    """Description of the flat index new_flat_index creates"""
+    return {"type": "flat", "spec": "IDMap2,Flat", "trained_on": 0}
+
+
+def new_flat_index(dimensions: int):
+    """Empty exact index that keeps its FAISS ids across deletions"""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimensions))
+
+
+def has_stable_ids(index) -> bool:
+    return is_ivf(index) or isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+
+def with_stable_ids(index, index_to_docstore_id: Dict[int, str]):
+    """
+    The index itself if it keeps its ids, else a copy wrapped in IDMap2
+
+    Snapshots saved before every index kept stable ids hold a flat, f16
+    or PQ index whose FAISS ids are its row numbers; the copy has the same
+    type (and training) and keeps those ids.
+    """
+    if has_stable_ids(index):
+        return index
+    labels = np.asarray(sorted(index_to_docstore_id), dtype=np.int64)
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+    empty = faiss.clone_index(index)
+    empty.reset()
+    wrapped = faiss.IndexIDMap2(empty)
+    if vectors is not None:
+        wrapped.add_with_ids(vectors[labels], labels)
+    return wrapped
+
+
+def configure_search(index, nprobe: int) -> None:
+    """Apply search-time parameters (nprobe for IVF indexes; no-op otherwise)"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def is_ivf(index) -> bool:
+    return faiss.try_extract_index_ivf(index) is not None
+
+
+def build_index(config: VectorIndexConfig, index, index_to_docstore_id: Dict[int, str],
+                source_type: str = "flat",
+                exact_vectors: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None,
+                batch_size: int = 16384, seed: int = 0) -> Tuple[object, Dict[int, str], Dict]:
+    """
+    Build the configured index from every vector stored in an existing one
+
+    Vectors are read back from the current index in batches (so the whole
+    corpus is never held in float32 at once), except that when the current
+    index is lossy (PQ) exact_vectors is asked for the originals first.
+
+    Args:
+        config: Index configuration
+        index: Current FAISS index (in RAM, with a direct map if IVF)
+        index_to_docstore_id: FAISS id -> docstore id of the current index
+        source_type: Type of the current index
+        exact_vectors: Optional docstore ids -> exact vectors lookup (e.g. the embedding cache)
+        batch_size: Vectors reconstructed and added per batch
+        seed: Training sample seed
+
+    Returns:
+        (new index, new id mapping with ids 0..n-1, index description);
+        every index returned keeps its FAISS ids across deletions
+    """
+    items = sorted(index_to_docstore_id.items())
+    labels = np.asarray([label for label, _ in items], dtype=np.int64)
+    chunk_ids = [chunk_id for _, chunk_id in items]
+    lookup = exact_vectors if source_type in LOSSY_TYPES else None
+
+    def read(rows: np.ndarray) -> np.ndarray:
+        return _read_vectors(index, labels[rows], [chunk_ids[row] for row in rows], lookup)
+
+    total = len(items)
+    spec = config.factory_string(index.d, total)
+    new_index = faiss.index_factory(index.d, spec, faiss.METRIC_L2)
+
+    if not new_index.is_trained:
+        centroids = PQ_CENTROIDS if config.index_type in ("pq", "ivf_pq") else 1
+        ivf = faiss.try_extract_index_ivf(new_index)
+        if ivf is not None:
+            centroids = max(centroids, ivf.nlist)
+        sample_size = min(total, centroids * TRAIN_POINTS_PER_CENTROID)
+        sample = np.sort(np.random.default_rng(seed).choice(total, size=sample_size, replace=False))
+        new_index.train(np.concatenate([
+            read(sample[start:start + batch_size]) for start in range(0, sample_size, batch_size)
+        ]))
+
+    ivf = faiss.try_extract_index_ivf(new_index)
+    if ivf is not None:
+        # Reconstruction by id (MMR, the next retraining) and removal by id
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        new_index = faiss.IndexIDMap2(new_index)
+    for start in range(0, total, batch_size):
+        rows = np.arange(start, min(start + batch_size, total))
+        new_index.add_with_ids(read(rows), rows.astype(np.int64))
+    configure_search(new_index, config.nprobe)
+
+    info = {
+        "type": config.index_type,
+        "spec": spec if ivf is not None else f"IDMap2,{spec}",
+        "trained_on": total if config.index_type in TRAINED_TYPES else 0
+    }
+    return new_index, dict(enumerate(chunk_ids)), info
+
+
+def catch_up(index, index_to_docstore_id: Dict[int, str], stable_ids: StableIds,
+             source, source_labels: Dict[str, int], source_type: str = "flat",
+             exact_vectors: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None) -> Tuple[int, int]:
+    """
+    Bring an index built from an earlier snapshot up to date with the live one
+
+    Chunks deleted since the snapshot are removed; chunks added since are
+    read back from the live index (exact vectors first if it is lossy) and
+    added under fresh ids. Finding them compares the two docstore id sets.
+
+    Args:
+        index: The rebuilt index (modified in place)
+        index_to_docstore_id: Its FAISS id -> docstore id mapping (updated in place)
+        stable_ids: Its docstore id -> FAISS id map (updated in place)
+        source: Live FAISS index
+        source_labels: Live docstore id -> FAISS id map
+        source_type: Type of the live index
+        exact_vectors: Optional docstore ids -> exact vectors lookup
+
+    Returns:
+        (chunks added, chunks removed)
+    """
+    removed = [chunk_id for chunk_id in stable_ids.labels if chunk_id not in source_labels]
+    added = [chunk_id for chunk_id in source_labels if chunk_id not in stable_ids.labels]
+    if removed:
+        labels = stable_ids.pop(removed)
+        index.remove_ids(np.asarray(labels, dtype=np.int64))
+        for label in labels:
+            del index_to_docstore_id[label]
+    if added:
+        lookup = exact_vectors if source_type in LOSSY_TYPES else None
+        vectors = _read_vectors(source, np.asarray([source_labels[chunk_id] for chunk_id in added], dtype=np.int64),
+                                added, lookup)
+        labels = stable_ids.allocate(added)
+        index.add_with_ids(vectors, labels)
+        index_to_docstore_id.update(zip(labels.tolist(), added))
+    return len(added), len(removed)
+
+
+def _read_vectors(index, labels: np.ndarray, chunk_ids: List[str],
+                  exact_vectors: Optional[Callable[[List[str]], Dict[str, List[float]]]]) -> np.ndarray:
+    """Vectors reconstructed by FAISS id, replaced by exact ones where the lookup has them"""
+    vectors = index.reconstruct_batch(labels)
+    if exact_vectors is not None:
+        found = exact_vectors(chunk_ids)
+        for i, chunk_id in enumerate(chunk_ids):
+            vector = found.get(chunk_id)
+            if vector is not None:
+                vectors[i] = vector
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def add_with_stable_ids(vector_store, stable_ids: StableIds, texts: List[str], vectors: List[List[float]],
+                        metadatas: List[Dict], ids: List[str]) -> None:
+    """
+    Add embeddings to a LangChain FAISS store whose index keeps its ids
+
+    FAISS.add_embeddings numbers new rows from the current row count,
+    which collides with ids kept after deletions; new rows get ids from
+    stable_ids instead.
+    """
+    labels = stable_ids.allocate(ids)
+    vector_store.index.add_with_ids(np.asarray(vectors, dtype=np.float32), labels)
+    vector_store.docstore.add({
+        chunk_id: Document(page_content=text, metadata=metadata or {})
+        for chunk_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    vector_store.index_to_docstore_id.update(zip(labels.tolist(), ids))
+
+
+def delete_with_stable_ids(vector_store, stable_ids: StableIds, chunk_ids: List[str]) -> None:
+    """
+    Remove docstore ids from a LangChain FAISS store whose index keeps its ids
+
+    Ids are looked up in stable_ids rather than by scanning the mapping;
+    the remaining vectors keep their ids.
+    """
+    labels = stable_ids.pop(chunk_ids)
+    vector_store.index.remove_ids(np.asarray(labels, dtype=np.int64))
+    vector_store.docstore.delete(chunk_ids)
+    for label in labels:
+        del vector_store.index_to_docstore_id[label]
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark - Per-query Overhead of Building vs Reusing RetrievalQA
+
+Compares the old query path (RetrievalQA.from_chain_type + a new retriever
+on every call) with RAGEngine's cached chain. A fake embedder and a fake
+chat model are used so the numbers measure only LangChain assembly and
+invocation overhead, not network or generation time.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chain_reuse --queries 500
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from langchain.chains import RetrievalQA
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+
+def build_engine(tmp_dir: str, num_chunks: int):
+    """RAGEngine with a small in-memory corpus and fake models"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["INDEX_DIR"] = os.path.join(tmp_dir, "index_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp_dir, "embedding_cache.sqlite3")
+    from app.rag_engine import LockedRetriever, RAGEngine
+    from app.vector_index import add_with_stable_ids, new_flat_index
+
+    engine = RAGEngine()
+    engine.embeddings = DeterministicFakeEmbedding(size=256)
+    engine.llm = FakeListChatModel(responses=["benchmark answer"])
+    texts = [f"chunk {i} about topic {i % 17} and subject {i % 29}" for i in range(num_chunks)]
+    chunk_ids = [str(i) for i in range(num_chunks)]
+    # Indexed the way RAGEngine ingests, so engine.stable_ids (used by MMR) is filled in
+    engine.vector_store = FAISS(
+        embedding_function=engine.embeddings,
+        index=new_flat_index(256),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+    add_with_stable_ids(engine.vector_store, engine.stable_ids, texts, engine.embeddings.embed_documents(texts),
+                        [{} for _ in texts], chunk_ids)
+    for chunk_id in chunk_ids:
+        chunk = engine.vector_store.docstore.search(chunk_id)
+        engine.chunks[chunk_id] = chunk
+        engine.lexical_index.add(chunk_id, chunk.page_content)
+    return engine, LockedRetriever
+
+
+def time_calls(fn, queries: int) -> list:
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        fn(f"what is topic {i % 17}?")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, LockedRetriever = build_engine(tmp_dir, args.chunks)
+
+        def rebuild_per_query(question: str):
+            # What RAGEngine.query used to do on every request
+            qa_chain = RetrievalQA.from_chain_type(
+                llm=engine.llm,
+                chain_type="stuff",
+                retriever=LockedRetriever(engine=engine, k=args.k),
+                return_source_documents=True
+            )
+            return qa_chain.invoke({"query": question})
+
+        def reuse_cached(question: str):
+            return engine._get_qa_chain(args.k).invoke({"query": question})
+
+        # Warm up both paths (imports, FAISS, first chain build)
+        time_calls(rebuild_per_query, 10)
+        time_calls(reuse_cached, 10)
+
+        results = {
+            "rebuild per query": time_calls(rebuild_per_query, args.queries),
+            "cached chain": time_calls(reuse_cached, args.queries),
+        }
+
+    print(f"{args.queries} queries, {args.chunks} chunks, k={args.k} (fake embedder + fake LLM)")
+    print(f"{'path':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, timings in results.items():
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{name:<20}{statistics.mean(timings):>10.3f}{statistics.median(timings):>10.3f}{p95:>10.3f}")
+
+    saved = statistics.mean(results["rebuild per query"]) - statistics.mean(results["cached chain"])
+    print(f"per-query overhead removed: {saved:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
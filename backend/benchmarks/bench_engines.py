@@ -0,0 +1,294 @@
+"""
+Benchmark Suite - Ingest Throughput, Query Latency and Memory per Engine
+
+Generates synthetic corpora at several scales, ingests them through
+process_document and times queries against both engines:
+- demo: RAGEngineDemo (BM25, no embeddings)
+- full: RAGEngine with a deterministic fake embedder and a fake chat model,
+  so the numbers cover splitting, indexing, FAISS/BM25 search and chain
+  overhead but no network time
+
+Every (engine, scale) case runs in a fresh process so memory figures are
+not polluted by earlier cases. Results are written as JSON; pass a saved
+results file as --baseline to compare runs (exit status 1 on regressions).
+
+Run from the backend directory:
+    python -m benchmarks.bench_engines --scales 1000,10000 --output results.json
+    python -m benchmarks.bench_engines --scales 1000,10000 --baseline results.json
+    python -m benchmarks.bench_engines --scales 100000,1000000 --engines demo
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import CorpusGenerator
+
+ENGINES = ("demo", "full")
+
+# (metric path, True if higher is better)
+COMPARED_METRICS = [
+    ("ingest.chunks_per_second", True),
+    ("query.p50_ms", False),
+    ("query.p95_ms", False),
+    ("query.p99_ms", False),
+    ("retrieval.p50_ms", False),
+    ("retrieval.p99_ms", False),
+    ("memory.peak_rss_mb", False),
+]
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far (None where the resource module is missing, e.g. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def latency_summary(timings: List[float]) -> Dict:
+    """Mean and p50/p95/p99 of timings in milliseconds"""
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "count": len(timings),
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": cuts[49],
+        "p95_ms": cuts[94],
+        "p99_ms": cuts[98],
+    }
+
+
+def time_calls(fn, questions: List[str]) -> List[float]:
+    timings = []
+    for question in questions:
+        start = time.perf_counter()
+        fn(question)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def build_engine(kind: str, tmp_dir: str, dimensions: int):
+    """Engine of the given kind with fake models and state kept under tmp_dir"""
+    if kind == "demo":
+        from app.rag_engine_demo import RAGEngineDemo
+        return RAGEngineDemo()
+
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from langchain_core.language_models import FakeListChatModel
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["INDEX_DIR"] = os.path.join(tmp_dir, "index_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(tmp_dir, "embedding_cache.sqlite3")
+    from app.rag_engine import RAGEngine
+
+    engine = RAGEngine()
+    engine.embeddings = DeterministicFakeEmbedding(size=dimensions)
+    engine.llm = FakeListChatModel(responses=["benchmark answer"])
+    engine.index_ready.set()
+    return engine
+
+
+def run_case(kind: str, scale: int, options: Dict) -> Dict:
+    """Ingest one synthetic corpus and time queries; runs in its own process"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generator = CorpusGenerator(seed=options["seed"])
+        corpus_dir = os.path.join(tmp_dir, "corpus")
+        paths = generator.write_corpus(corpus_dir, scale, options["documents"])
+        corpus_mb = directory_mb(corpus_dir)
+        questions = generator.queries(options["queries"] + options["warmup"])
+        warmup, questions = questions[:options["warmup"]], questions[options["warmup"]:]
+
+        engine = build_engine(kind, tmp_dir, options["dimensions"])
+        rss_before = current_rss_mb()
+
+        chunks = 0
+        start = time.perf_counter()
+        for path in paths:
+            chunks += engine.process_document(path, "txt")
+        ingest_seconds = time.perf_counter() - start
+        rss_after = current_rss_mb()
+
+        k = options["k"]
+        time_calls(lambda q: engine.query(q, k=k), warmup)
+        query = time_calls(lambda q: engine.query(q, k=k), questions)
+        retrieval = time_calls(lambda q: engine.get_relevant_chunks(q, k=k), questions)
+
+        result = {
+            "engine": kind,
+            "target_chunks": scale,
+            "chunks": chunks,
+            "documents": len(paths),
+            "ingest": {
+                "seconds": ingest_seconds,
+                "chunks_per_second": chunks / ingest_seconds,
+                "mb_per_second": corpus_mb / ingest_seconds,
+                "corpus_mb": corpus_mb,
+            },
+            "query": latency_summary(query),
+            "retrieval": latency_summary(retrieval),
+            "memory": {
+                "rss_before_ingest_mb": rss_before,
+                "rss_after_ingest_mb": rss_after,
+                "ingest_growth_mb": rss_after - rss_before if rss_before is not None else None,
+                "peak_rss_mb": peak_rss_mb(),
+            },
+        }
+        if kind == "full":
+            result["memory"]["index_on_disk_mb"] = directory_mb(os.path.join(tmp_dir, "index_store"))
+            result["retrieval_mode"] = engine.retrieval_mode
+        return result
+
+
+def metric(result: Dict, path: str) -> Optional[float]:
+    value = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Print each metric against the baseline run
+
+    Args:
+        results: Results of this run
+        baseline: A results file written by an earlier run
+        tolerance: Relative change in the bad direction tolerated before
+                   a metric counts as a regression (0.1 = 10%)
+
+    Returns:
+        Descriptions of the regressions found
+    """
+    previous = {(r["engine"], r["target_chunks"]): r for r in baseline.get("results", [])}
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('meta', {}).get('timestamp', '?')}")
+    print(f"{'case':<16}{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    for result in results:
+        case = f"{result['engine']}/{result['target_chunks']}"
+        old = previous.get((result["engine"], result["target_chunks"]))
+        if old is None:
+            print(f"{case:<16}(no baseline)")
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            before, after = metric(old, path), metric(result, path)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            print(f"{case:<16}{path:<28}{before:>12.3f}{after:>12.3f}{change:>+10.1%}{flag}")
+            if flag:
+                regressions.append(f"{case} {path}: {before:.3f} -> {after:.3f} ({change:+.1%})")
+    return regressions
+
+
+def print_results(results: List[Dict]) -> None:
+    print(f"{'case':<16}{'chunks':>9}{'chunks/s':>11}{'q p50':>9}{'q p95':>9}{'q p99':>9}"
+          f"{'r p50':>9}{'peak MB':>10}")
+    for r in results:
+        case = f"{r['engine']}/{r['target_chunks']}"
+        peak = r['memory']['peak_rss_mb']
+        peak = "-" if peak is None else f"{peak:.0f}"
+        print(f"{case:<16}{r['chunks']:>9}{r['ingest']['chunks_per_second']:>11.0f}"
+              f"{r['query']['p50_ms']:>9.2f}{r['query']['p95_ms']:>9.2f}{r['query']['p99_ms']:>9.2f}"
+              f"{r['retrieval']['p50_ms']:>9.2f}{peak:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000",
+                        help="Comma-separated corpus sizes in chunks (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=10, help="Files each corpus is split into")
+    parser.add_argument("--dimensions", type=int, default=256, help="Fake embedding size (full engine)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with a JSON file from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Relative slowdown tolerated before a metric is a regression")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    options = {
+        "queries": args.queries, "warmup": args.warmup, "k": args.k, "documents": args.documents,
+        "dimensions": args.dimensions, "seed": args.seed,
+    }
+
+    results = []
+    for scale in scales:
+        for kind in engines:
+            print(f"running {kind} engine at {scale} chunks...", flush=True)
+            # A fresh process per case keeps peak RSS meaningful
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results.append(pool.submit(run_case, kind, scale, options).result())
+
+    print()
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": options,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Benchmark - Compressed Vector Index Types against the Flat Index
+
+Builds every VECTOR_INDEX_TYPE from the same flat index (the way RAGEngine
+converts and retrains) and reports, per type and nprobe setting:
+- build time (training plus adding every vector)
+- index size (serialized bytes, total and per vector)
+- single-query search latency (p50/p95/p99)
+- recall@k: overlap of the top k with the exact (flat) top k
+
+Vectors come from one of:
+- clustered: Gaussian topic clusters, a stand-in for the neighbourhood
+  structure of neural embeddings (default)
+- text: synthetic paragraphs through the local hashing embedder; random
+  Zipf text has almost no neighbourhood structure, so this is a worst case
+  for every approximate type
+- --index-dir: the vectors of a saved RAGEngine index (queries are sampled
+  from them), the most faithful numbers for a real corpus
+
+Only the FAISS search is timed; embedding, docstore lookups and answer
+generation are identical for every type.
+
+Run from the backend directory:
+    python -m benchmarks.bench_index_types --chunks 100000
+    python -m benchmarks.bench_index_types --chunks 1000000 --types flat,ivf_pq --nprobe 8,32,128
+    python -m benchmarks.bench_index_types --index-dir index_store --queries 1000
+"""
+
+import argparse
+import json
+import time
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+
+from app.index_store import IndexStore
+from app.local_embeddings import HashingEmbeddings
+from app.vector_index import INDEX_TYPES, VectorIndexConfig, build_index, configure_search, is_ivf
+from benchmarks.bench_engines import latency_summary
+from benchmarks.corpus import CorpusGenerator
+
+
+def clustered_vectors(chunks: int, queries: int, dimensions: int, topics: int,
+                      seed: int, batch_size: int = 100000) -> Tuple[np.ndarray, np.ndarray]:
+    """Unit vectors scattered around random topic centres; queries come from the same topics"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, dimensions), dtype=np.float32)
+
+    def sample(n: int) -> np.ndarray:
+        vectors = np.empty((n, dimensions), dtype=np.float32)
+        for start in range(0, n, batch_size):
+            size = min(batch_size, n - start)
+            batch = centres[rng.integers(topics, size=size)]
+            batch += 0.5 * rng.standard_normal((size, dimensions), dtype=np.float32)
+            vectors[start:start + size] = batch / np.linalg.norm(batch, axis=1, keepdims=True)
+        return vectors
+
+    return sample(chunks), sample(queries)
+
+
+def text_vectors(chunks: int, queries: int, dimensions: int, seed: int,
+                 batch_size: int = 10000) -> Tuple[np.ndarray, np.ndarray]:
+    """One synthetic paragraph per chunk and keyword questions, through the hashing embedder"""
+    generator = CorpusGenerator(seed=seed)
+    embeddings = HashingEmbeddings(dimensions=dimensions)
+    vectors = np.empty((chunks, dimensions), dtype=np.float32)
+    for start in range(0, chunks, batch_size):
+        texts = [generator.paragraph() for _ in range(min(batch_size, chunks - start))]
+        vectors[start:start + len(texts)] = embeddings.embed_documents(texts)
+    questions = np.asarray(embeddings.embed_documents(generator.queries(queries)), dtype=np.float32)
+    return vectors, questions
+
+
+def stored_vectors(index_dir: str, queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Every vector of a saved index, with queries sampled from them"""
+    snapshot = IndexStore(index_dir).load(mmap=False)
+    if snapshot is None:
+        raise SystemExit(f"no saved index in {index_dir}")
+    index, state = snapshot[0], snapshot[1]
+    labels = np.asarray(sorted(state["index_to_docstore_id"]), dtype=np.int64)
+    vectors = np.ascontiguousarray(index.reconstruct_batch(labels), dtype=np.float32)
+    rows = np.random.default_rng(seed).choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    return vectors, vectors[rows].copy()
+
+
+def search_latencies(index, queries: np.ndarray, k: int, warmup: int) -> List[float]:
+    for i in range(min(warmup, len(queries))):
+        index.search(queries[i:i + 1], k)
+    timings = []
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        index.search(queries[i:i + 1], k)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def recall_at_k(found: np.ndarray, exact: np.ndarray, k: int) -> float:
+    return float(np.mean([len(set(row) & set(truth)) / k for row, truth in zip(found, exact)]))
+
+
+def run_type(index_type: str, flat, mapping: Dict[int, str], queries: np.ndarray, exact: np.ndarray,
+             nprobes: List[int], args) -> List[Dict]:
+    config = VectorIndexConfig(index_type=index_type, train_min=1, nlist=args.nlist, pq_m=args.pq_m)
+    start = time.perf_counter()
+    index, _, info = build_index(config, flat, mapping)
+    build_seconds = time.perf_counter() - start
+    size = faiss.serialize_index(index).nbytes
+
+    results = []
+    for nprobe in (nprobes if is_ivf(index) else [None]):
+        if nprobe is not None:
+            configure_search(index, nprobe)
+        timings = search_latencies(index, queries, args.k, args.warmup)
+        _, found = index.search(queries, args.k)
+        results.append({
+            "type": index_type,
+            "spec": info["spec"],
+            "nprobe": nprobe,
+            "build_seconds": build_seconds,
+            "index_mb": size / (1024 * 1024),
+            "bytes_per_vector": size / flat.ntotal,
+            "search": latency_summary(timings),
+            "recall_at_k": recall_at_k(found, exact, args.k),
+        })
+    return results
+
+
+def print_results(results: List[Dict], k: int) -> None:
+    print(f"{'type':<10}{'spec':<16}{'nprobe':>7}{'build s':>9}{'MB':>9}{'B/vec':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{f'recall@{k}':>11}")
+    for r in results:
+        nprobe = "-" if r["nprobe"] is None else str(r["nprobe"])
+        print(f"{r['type']:<10}{r['spec']:<16}{nprobe:>7}{r['build_seconds']:>9.2f}{r['index_mb']:>9.1f}"
+              f"{r['bytes_per_vector']:>8.0f}{r['search']['p50_ms']:>9.3f}{r['search']['p95_ms']:>9.3f}"
+              f"{r['search']['p99_ms']:>9.3f}{r['recall_at_k']:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--data", choices=["clustered", "text"], default="clustered")
+    parser.add_argument("--topics", type=int, default=1000, help="Clusters in the clustered data")
+    parser.add_argument("--index-dir", help="Benchmark the vectors of a saved index instead")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--nprobe", default="4,16,64", help="Comma-separated nprobe values for IVF types")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0: automatic)")
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-vectors (0: automatic)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = set(types) - set(INDEX_TYPES)
+    if unknown:
+        parser.error(f"unknown index types: {', '.join(sorted(unknown))}")
+    nprobes = [int(n) for n in args.nprobe.split(",") if n.strip()]
+
+    if args.index_dir:
+        source = args.index_dir
+        vectors, queries = stored_vectors(args.index_dir, args.queries, args.seed)
+    else:
+        source = f"{args.data} data"
+        print(f"generating {args.chunks} {args.data} vectors ({args.dimensions} dimensions)...", flush=True)
+        if args.data == "clustered":
+            vectors, queries = clustered_vectors(args.chunks, args.queries, args.dimensions, args.topics, args.seed)
+        else:
+            vectors, queries = text_vectors(args.chunks, args.queries, args.dimensions, args.seed)
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    del vectors
+    mapping = {i: str(i) for i in range(flat.ntotal)}
+    _, exact = flat.search(queries, args.k)
+
+    results = []
+    for index_type in types:
+        print(f"building {index_type}...", flush=True)
+        results.extend(run_type(index_type, flat, mapping, queries, exact, nprobes, args))
+
+    print()
+    print(f"{flat.ntotal} chunks, {flat.d} dimensions ({source}), {len(queries)} queries, k={args.k}")
+    print_results(results, args.k)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark - Latency Added by MMR Diversification
+
+Times RAGEngine retrieval for the same questions with plain top-k and with
+MMR re-ranking (fetch_k candidates, vectors reconstructed from the FAISS
+index, NumPy selection). A fake embedder is used so the numbers measure
+only search and re-ranking, not network time.
+
+Run from the backend directory:
+    python -m benchmarks.bench_mmr --chunks 20000 --fetch-k 20
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_chain_reuse import build_engine
+
+
+def time_calls(fn, queries: int) -> list:
+    timings = []
+    for i in range(queries):
+        start = time.perf_counter()
+        fn(f"what is topic {i % 17} and subject {i % 29}?")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--mode", choices=["vector", "hybrid"], default="vector")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, _ = build_engine(tmp_dir, args.chunks)
+        engine.retrieval_mode = args.mode
+
+        def top_k(question: str):
+            return engine._similarity_search(question, k=args.k)
+
+        def with_mmr(question: str):
+            return engine._similarity_search(
+                question, k=args.k, mmr=True, fetch_k=args.fetch_k, lambda_mult=args.lambda_mult
+            )
+
+        # Warm up both paths (FAISS, docstore position map)
+        time_calls(top_k, 10)
+        time_calls(with_mmr, 10)
+
+        results = {
+            "top-k": time_calls(top_k, args.queries),
+            "top-k + MMR": time_calls(with_mmr, args.queries),
+        }
+
+    print(f"{args.queries} queries, {args.chunks} chunks, k={args.k}, fetch_k={args.fetch_k}, "
+          f"{args.mode} retrieval (fake embedder)")
+    print(f"{'path':<20}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, timings in results.items():
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{name:<20}{statistics.mean(timings):>10.3f}{statistics.median(timings):>10.3f}{p95:>10.3f}")
+
+    added = statistics.mean(results["top-k + MMR"]) - statistics.mean(results["top-k"])
+    print(f"latency added by MMR: {added:.3f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
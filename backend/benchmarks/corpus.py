@@ -0,0 +1,82 @@
+"""
+Synthetic Corpora - Deterministic Text for Benchmarks
+
+This module implements:
+- A seeded vocabulary of made-up words with a Zipf-like frequency curve
+- Paragraph text written straight to files, sized to yield roughly a
+  target number of chunks with RAGEngine's splitter settings
+- Query sets drawn from the same vocabulary
+"""
+
+import itertools
+import os
+import random
+from typing import List
+
+# RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200) advances
+# about this many characters per chunk on paragraph text
+CHARS_PER_CHUNK = 800
+
+SYLLABLES = ["ka", "lo", "mi", "nu", "pe", "ra", "si", "to", "va", "xe", "zu", "bri", "dra", "fle", "gno", "qua"]
+
+
+def make_vocabulary(size: int = 20000, seed: int = 7) -> List[str]:
+    """Distinct pronounceable words, most frequent first"""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: (len(word), word))
+
+
+class CorpusGenerator:
+    """Seeded paragraph generator over a shared vocabulary"""
+
+    def __init__(self, vocabulary_size: int = 20000, seed: int = 7):
+        self.vocabulary = make_vocabulary(vocabulary_size, seed)
+        self.rng = random.Random(seed + 1)
+        # Zipf-like weights: word i is drawn with probability ~ 1 / (i + 10)
+        # (cumulative, so choices() does not re-sum them on every call)
+        self.cum_weights = list(itertools.accumulate(1.0 / (i + 10) for i in range(len(self.vocabulary))))
+
+    def words(self, n: int) -> List[str]:
+        return self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=n)
+
+    def paragraph(self) -> str:
+        sentences = []
+        for _ in range(self.rng.randint(3, 6)):
+            words = self.words(self.rng.randint(8, 16))
+            sentences.append(" ".join(words).capitalize() + ".")
+        return " ".join(sentences)
+
+    def write_document(self, path: str, target_chunks: int) -> int:
+        """
+        Write a text file expected to split into about target_chunks chunks
+
+        Returns:
+            Number of characters written
+        """
+        target_chars = target_chunks * CHARS_PER_CHUNK
+        written = 0
+        with open(path, "w", encoding="utf-8") as f:
+            while written < target_chars:
+                block = self.paragraph() + "\n\n"
+                f.write(block)
+                written += len(block)
+        return written
+
+    def write_corpus(self, directory: str, total_chunks: int, documents: int) -> List[str]:
+        """Split a corpus of about total_chunks chunks over several .txt files"""
+        os.makedirs(directory, exist_ok=True)
+        documents = max(1, min(documents, total_chunks))
+        paths = []
+        for i in range(documents):
+            chunks = total_chunks // documents + (1 if i < total_chunks % documents else 0)
+            path = os.path.join(directory, f"doc_{i:05d}.txt")
+            self.write_document(path, chunks)
+            paths.append(path)
+        return paths
+
+    def queries(self, n: int) -> List[str]:
+        """Short keyword questions over the corpus vocabulary"""
+        return [" ".join(self.words(self.rng.randint(2, 5))) + "?" for _ in range(n)]
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import uuid
+
+import pytest
+
+# Tests import the app and benchmarks packages the way the server does, from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def wait_for(condition, timeout=30.0):
+    """Poll condition() until it is true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def wait_for_job(client, job_id, timeout=60.0):
+    """Poll /jobs/{job_id} until the job finishes; returns its final record"""
+    jobs = []
+    wait_for(lambda: jobs.append(client.get(f"/jobs/{job_id}").json()) or
+             jobs[-1]["status"] in ("completed", "failed"), timeout)
+    return jobs[-1]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """RAGEngine over 200 indexed chunks with a fake embedder and LLM, persisted under tmp_path"""
+    from benchmarks.bench_chain_reuse import build_engine
+
+    # build_engine writes these; monkeypatch restores them afterwards
+    for name in ("OPENAI_API_KEY", "INDEX_DIR", "EMBEDDING_CACHE_PATH"):
+        monkeypatch.setenv(name, "sk-test")
+    engine, _ = build_engine(str(tmp_path), 200)
+    return engine
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    """
+    Factory for RAGEngines on the offline hashing embedder (no API key, so no LLM)
+
+    Engines share tmp_path's index directory and embedding cache unless
+    given another index_dir, so a second engine sees what the first saved.
+    """
+    from app.rag_engine import RAGEngine
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    settings = {"EMBEDDING_PROVIDER": "local", "LOCAL_EMBEDDING_DIM": "64",
+                "EMBEDDING_CACHE_PATH": str(tmp_path / "embedding_cache.sqlite3")}
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+
+    def make_engine(index_dir=None):
+        engine = RAGEngine(index_dir=str(index_dir or tmp_path / "index_store"))
+        engine.load_index()
+        return engine
+    return make_engine
+
+
+@pytest.fixture
+def ingest(tmp_path):
+    """Write a text document under tmp_path and ingest it into an engine; returns its chunk count"""
+    def ingest(engine, filename, text):
+        path = tmp_path / filename
+        path.write_text(text, encoding="utf-8")
+        return engine.process_document(str(path), "txt")
+    return ingest
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """
+    TestClient for the FastAPI app, started in a scratch directory
+
+    Full mode with the offline hashing embedder and no API key, so answers
+    are retrieval-only and nothing leaves the machine.
+    """
+    from fastapi.testclient import TestClient
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("api"))
+        patch.delenv("OPENAI_API_KEY", raising=False)
+        settings = {"USE_DEMO_MODE": "false", "EMBEDDING_PROVIDER": "local", "LOCAL_EMBEDDING_DIM": "64",
+                    "INDEX_POLL_SECONDS": "0", "EXTRACTION_WORKERS": "1", "MAX_UPLOAD_MB": "1"}
+        for name, value in settings.items():
+            patch.setenv(name, value)
+        from app import main
+        with TestClient(main.app) as client:
+            wait_for(main.rag_engine.index_ready.is_set)
+            yield client
+
+
+@pytest.fixture
+def collection(api):
+    """A fresh collection name, so API tests never see each other's documents"""
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def upload(api, collection):
+    """Upload a text document (to the test collection by default) and wait for its ingestion job"""
+    def upload(filename, text, target=None):
+        response = api.post("/upload", params={"collection": target or collection},
+                            files={"file": (filename, text.encode("utf-8"), "text/plain")})
+        assert response.status_code == 200, response.text
+        result = response.json()
+        if result["status"] in ("queued", "running"):
+            result["job"] = wait_for_job(api, result["job_id"])
+            assert result["job"]["status"] == "completed", result["job"]["error"]
+        return result
+    return upload
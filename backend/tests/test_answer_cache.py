@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import answer_cache
+from app.answer_cache import AnswerCache
+
+OTTERS = "Sea otters hold hands while they sleep so that they do not drift apart on the water."
+SEALS = "Harbour seals sleep in the water too, floating upright with their heads above the surface."
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable time for the cache module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(answer_cache, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def result(answer):
+    return {"answer": answer, "sources": [], "confidence": 0.6}
+
+
+def test_equivalent_questions_share_an_entry():
+    cache = AnswerCache()
+    cache.put(AnswerCache.make_key("What do otters eat?", 3, "rag", "v1"), result("fish"))
+    assert cache.get(AnswerCache.make_key("  what do   otters EAT ", 3, "rag", "v1")) == result("fish")
+    # Anything else that shapes the answer is part of the key
+    for key in (AnswerCache.make_key("What do otters eat?", 5, "rag", "v1"),
+                AnswerCache.make_key("What do otters eat?", 3, "agent", "v1"),
+                AnswerCache.make_key("What do otters eat?", 3, "rag", "v2")):
+        assert cache.get(key) is None
+    assert cache.get_stats() == {"entries": 1, "hits": 1, "misses": 3, "hit_rate": 0.25, "evictions": 0}
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("key", result("fish"))
+    clock.value += 59
+    assert cache.get("key") == result("fish")
+    clock.value += 2
+    assert cache.get("key") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put("a", result("a"))
+    cache.put("b", result("b"))
+    cache.get("a")
+    cache.put("c", result("c"))
+    assert [cache.get(key) is not None for key in ("a", "b", "c")] == [True, False, True]
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_saves_from_several_workers_are_merged(tmp_path, clock):
+    path = str(tmp_path / "answers.json")
+    first = AnswerCache(ttl_seconds=60, persist_path=path)
+    second = AnswerCache(ttl_seconds=60, persist_path=path)
+    first.put("a", result("first a"))
+    first.put("shared", result("older"))
+    clock.value += 10
+    second.put("shared", result("newer"))
+    second.put("b", result("b"))
+    second.save()
+    first.save()
+
+    restarted = AnswerCache(ttl_seconds=60, persist_path=path)
+    assert restarted.get("a") == result("first a")
+    assert restarted.get("b") == result("b")
+    # The entry that expires last wins, whichever worker saved last
+    assert restarted.get("shared") == result("newer")
+
+    # Expired entries are neither loaded nor saved again
+    clock.value += 55
+    restarted = AnswerCache(ttl_seconds=60, persist_path=path)
+    assert restarted.get("a") is None and restarted.get("b") == result("b")
+    restarted.save()
+    clock.value -= 55
+    assert AnswerCache(persist_path=path).get("a") is None
+
+
+def test_saved_file_keeps_the_latest_expiring_max_entries(tmp_path, clock):
+    path = str(tmp_path / "answers.json")
+    cache = AnswerCache(max_entries=2, persist_path=path)
+    for key in ("a", "b"):
+        cache.put(key, result(key))
+        clock.value += 1
+    cache.save()
+    other = AnswerCache(max_entries=2, persist_path=path)
+    other.put("c", result("c"))
+    other.save()
+    assert [AnswerCache(persist_path=path).get(key) is not None for key in ("a", "b", "c")] == [False, True, True]
+
+
+def test_ingest_and_delete_invalidate_cached_answers(api, upload, collection):
+    from app import main
+    body = {"question": "How do sea animals sleep?", "collections": [collection]}
+
+    def ask():
+        hits = main.answer_cache.get_stats()["hits"]
+        response = api.post("/query", json=body)
+        assert response.status_code == 200, response.text
+        return response.json(), main.answer_cache.get_stats()["hits"] > hits
+
+    upload("otters.txt", OTTERS)
+    first, cached = ask()
+    assert not cached
+    assert ask() == (first, True)
+
+    upload("seals.txt", SEALS)
+    answer, cached = ask()
+    assert not cached
+    assert any("seals" in source for source in answer["sources"])
+    assert ask() == (answer, True)
+
+    assert api.delete("/documents/seals.txt", params={"collection": collection}).status_code == 200
+    answer, cached = ask()
+    assert not cached
+    assert answer == first
@@ -0,0 +1,168 @@
+import math
+import pickle
+import random
+import threading
+from collections import Counter
+
+import pytest
+
+from app.bm25_index import BM25Index, tokenize
+
+DOCS = {
+    1: "The quick brown fox jumps over the lazy dog",
+    2: "A quick brown dog outpaces a quick red fox",
+    3: "Error code E1234 means the disk is full",
+    4: "Lazy afternoons and slow dogs",
+    5: "The disk controller reports error E9999",
+}
+
+
+def make_index(docs=DOCS):
+    index = BM25Index()
+    for doc_id, text in docs.items():
+        index.add(doc_id, text)
+    return index
+
+
+def scan(docs, query, k, k1=1.5, b=0.75):
+    """Brute-force BM25 over every document, the reference for the inverted index"""
+    tokens = {doc_id: tokenize(text) for doc_id, text in docs.items()}
+    avgdl = sum(map(len, tokens.values())) / len(tokens)
+    scores = {}
+    for doc_id, words in tokens.items():
+        counts = Counter(words)
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(1 for other in tokens.values() if term in other)
+            if counts[term]:
+                idf = math.log(1.0 + (len(tokens) - df + 0.5) / (df + 0.5))
+                norm = k1 * (1.0 - b + b * len(words) / avgdl)
+                score += idf * counts[term] * (k1 + 1.0) / (counts[term] + norm)
+        if score > 0:
+            scores[doc_id] = score
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def assert_top_k(found, ranking, k):
+    """found is the top k of the full ranking; documents with tied scores may come in any order"""
+    assert [score for _, score in found] == pytest.approx([score for _, score in ranking[:k]], rel=1e-5)
+    scores = dict(ranking)
+    for doc_id, score in found:
+        assert scores.get(doc_id) == pytest.approx(score, rel=1e-5)
+
+
+def random_corpus(n, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(200)]
+    return {i: " ".join(rng.choices(vocabulary, k=rng.randint(5, 40))) for i in range(n)}
+
+
+def test_tokenize_lowercases_and_drops_punctuation():
+    assert tokenize("Error E1234: disk-full!") == ["error", "e1234", "disk", "full"]
+
+
+@pytest.mark.parametrize("query", ["quick fox", "error E1234", "lazy dog", "the", "unknown words"])
+def test_search_matches_a_full_scan(query):
+    assert_top_k(make_index().search(query, k=3), scan(DOCS, query, len(DOCS)), 3)
+
+
+def test_search_only_returns_documents_with_a_query_term():
+    assert make_index().search("nothing matches", k=3) == []
+    assert BM25Index().search("fox", k=3) == []
+    assert make_index().search("fox", k=0) == []
+
+
+def test_remove_and_re_add_match_a_full_scan():
+    corpus = random_corpus(300)
+    queries = [" ".join(random.Random(i).choices([f"w{j}" for j in range(200)], k=3)) for i in range(20)]
+    index = make_index(corpus)
+    for doc_id in range(0, 300, 3):
+        index.remove(doc_id)
+    index.remove("missing")
+    kept = {doc_id: text for doc_id, text in corpus.items() if doc_id % 3}
+    assert len(index) == len(kept)
+    assert index.avg_doc_length == pytest.approx(make_index(kept).avg_doc_length)
+    for query in queries:
+        assert_top_k(index.search(query, k=10), scan(kept, query, len(kept)), 10)
+
+    for doc_id in range(0, 300, 3):
+        index.add(doc_id, corpus[doc_id])
+    for query in queries:
+        assert_top_k(index.search(query, k=10), scan(corpus, query, len(corpus)), 10)
+
+
+def test_removing_the_last_posting_drops_the_term():
+    index = make_index()
+    index.remove(3)
+    assert "e1234" not in index.postings
+    assert index.search("E1234", k=3) == []
+
+
+def test_search_batch_matches_search():
+    corpus = random_corpus(300, seed=1)
+    index = make_index(corpus)
+    queries = ["w1 w2 w3", "w150", "", "nothing here", "w7 w7 w8"]
+    for found, query in zip(index.search_batch(queries, k=10), queries):
+        assert_top_k(found, index.search(query, k=len(index)), 10)
+
+    # The cached matrix is rebuilt after the postings change
+    index.remove(0)
+    index.add(1000, "w1 w2 w3")
+    for found, query in zip(index.search_batch(queries, k=10), queries):
+        assert_top_k(found, index.search(query, k=len(index)), 10)
+
+
+def test_idf_coverage_weights_distinctive_terms():
+    index = make_index()
+    query = "the error E1234"
+    # Both documents match two of three terms, but only 3 has the rare code
+    assert index.term_coverage(query, 3) == 1.0
+    assert index.term_coverage(query, 5) == pytest.approx(2 / 3)
+    assert index.idf_coverage(query, 3) == pytest.approx(1.0)
+    assert index.idf_coverage(query, 5) < index.term_coverage(query, 5)
+    assert index.idf_coverage("", 3) == 0.0
+
+
+def test_pickling_drops_the_batch_matrix():
+    index = make_index()
+    expected = index.search_batch(["quick fox"], k=3)
+    restored = pickle.loads(pickle.dumps(index))
+    assert restored._batch_matrix is None
+    assert restored.search_batch(["quick fox"], k=3) == expected
+
+
+def test_unpickling_snapshots_with_the_old_matrix_fields():
+    index = make_index()
+    expected = index.search_batch(["quick fox"], k=3)
+    state = index.__getstate__()
+    del state["_batch_matrix"]
+    state.update(_matrix=None, _matrix_terms={}, _matrix_doc_ids=None)
+    restored = BM25Index.__new__(BM25Index)
+    restored.__setstate__(state)
+    assert not hasattr(restored, "_matrix")
+    assert restored.search_batch(["quick fox"], k=3) == expected
+
+
+def test_concurrent_batches_share_one_consistent_matrix():
+    corpus = random_corpus(2000, seed=2)
+    index = make_index(corpus)
+    queries = [f"w{i} w{i + 1}" for i in range(50)]
+    failures = []
+
+    def run():
+        try:
+            for found, query in zip(index.search_batch(queries, k=5), queries):
+                assert_top_k(found, index.search(query, k=len(index)), 5)
+        except Exception as e:  # surfaced in the main thread
+            failures.append(e)
+
+    for round_ in range(5):
+        # Every round starts with no matrix and a new term, so all threads
+        # race to build a matrix of a new shape
+        index.add(f"extra-{round_}", f"w1 new{round_}")
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert failures == []
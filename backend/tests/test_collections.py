@@ -0,0 +1,95 @@
+import os
+
+import faiss
+import pytest
+
+from app.collection_manager import DEFAULT_COLLECTION, CollectionManager
+from app.index_store import IndexStore
+
+OTTERS = "Sea otters hold hands while they sleep so that they do not drift apart on the water."
+STARS = "Neutron stars can spin hundreds of times per second and are only a few kilometres wide."
+
+
+class StubEngine:
+    def __init__(self, documents=0, chunks=0):
+        self.stats = {"total_documents": documents, "total_chunks": chunks}
+
+    def get_stats(self):
+        return self.stats
+
+
+def never_opened(directory):
+    raise AssertionError(f"listing opened the collection in {directory}")
+
+
+def test_index_store_summary_round_trip(tmp_path):
+    store = IndexStore(str(tmp_path))
+    assert store.summary() is None
+    store.save(faiss.IndexFlatL2(4), {}, summary={"documents": 2, "chunks": 9})
+    assert store.summary() == {"documents": 2, "chunks": 9}
+    # Snapshots saved without one (as before summaries existed) have none
+    store.save(faiss.IndexFlatL2(4), {})
+    assert store.summary() is None
+
+
+def test_list_reads_unopened_collections_from_their_snapshot(api, upload, collection):
+    from app import main
+    upload("otters.txt", OTTERS)
+    upload("stars.txt", STARS)
+    listed = {info["name"]: info for info in api.get("/collections").json()["collections"]}
+    assert listed[collection] == {"name": collection, "documents": 2, "chunks": 2}
+
+    # Another worker process sharing the directory has not opened the collection
+    other = CollectionManager(StubEngine(), never_opened, root_dir=main.collections.root_dir)
+    assert {info["name"]: info for info in other.list()}[collection] == listed[collection]
+    assert list(other._engines) == [DEFAULT_COLLECTION]
+
+
+def test_list_without_a_snapshot_reports_an_empty_collection(tmp_path):
+    os.makedirs(tmp_path / "fresh")
+    manager = CollectionManager(StubEngine(1, 3), never_opened, root_dir=str(tmp_path))
+    assert manager.list() == [
+        {"name": DEFAULT_COLLECTION, "documents": 1, "chunks": 3},
+        {"name": "fresh", "documents": 0, "chunks": 0},
+    ]
+
+
+def test_list_opens_snapshots_saved_before_summaries(tmp_path):
+    IndexStore(str(tmp_path / "legacy")).save(faiss.IndexFlatL2(4), {})
+    opened = []
+
+    def factory(directory):
+        opened.append(directory)
+        return StubEngine(4, 40)
+
+    manager = CollectionManager(StubEngine(), factory, root_dir=str(tmp_path))
+    assert manager.list()[1] == {"name": "legacy", "documents": 4, "chunks": 40}
+    assert opened == [str(tmp_path / "legacy")]
+
+
+def test_unknown_and_invalid_collections(api):
+    response = api.post("/query", json={"question": "anything?", "collections": ["no-such-collection"]})
+    assert response.status_code == 404
+    response = api.post("/query", json={"question": "anything?", "collections": ["../escape"]})
+    assert response.status_code == 400
+    assert api.post("/upload", params={"collection": "bad name"},
+                    files={"file": ("a.txt", OTTERS.encode(), "text/plain")}).status_code == 400
+
+
+@pytest.fixture
+def second_collection(collection):
+    return f"{collection}-b"
+
+
+def test_query_fans_out_over_collections(api, upload, collection, second_collection):
+    upload("otters.txt", OTTERS)
+    upload("stars.txt", STARS, target=second_collection)
+    both = [collection, second_collection]
+
+    sources = api.post("/query", json={"question": "sea otters", "collections": both}).json()["sources"]
+    assert "otters" in sources[0]
+    sources = api.post("/query", json={"question": "neutron stars", "collections": both}).json()["sources"]
+    assert "Neutron" in sources[0]
+    # Each collection alone only sees its own documents
+    sources = api.post("/query", json={"question": "neutron stars", "collections": [collection]}).json()["sources"]
+    assert all("Neutron" not in source for source in sources)
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app.embedding_batcher import BatchedEmbeddings, EmbeddingBatcher, estimate_tokens
+
+
+class Backend:
+    """embed_fn that records each request and can fail its first calls"""
+
+    def __init__(self, failures=0, short=False):
+        self.requests = []
+        self.failures = failures
+        self.short = short
+
+    def __call__(self, texts):
+        self.requests.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("rate limited")
+        vectors = [vector(text) for text in texts]
+        return vectors[:-1] if self.short else vectors
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)))]
+
+
+def texts(prefix, count, length=8):
+    return [f"{prefix}{n}".ljust(length, ".") for n in range(count)]
+
+
+def test_concurrent_callers_share_one_request():
+    backend = Backend()
+    # The batch is sent as soon as it is full, well before the wait window ends
+    batcher = EmbeddingBatcher(backend, max_batch_size=6, max_wait_seconds=5.0)
+    results = {}
+
+    def embed(prefix):
+        results[prefix] = batcher.embed(texts(prefix, 3))
+
+    threads = [threading.Thread(target=embed, args=(prefix,)) for prefix in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(backend.requests) == 1 and sorted(backend.requests[0]) == sorted(texts("a", 3) + texts("b", 3))
+    for prefix in ("a", "b"):
+        assert results[prefix] == [vector(text) for text in texts(prefix, 3)]
+    stats = batcher.get_stats()
+    assert (stats["batches"], stats["texts"], stats["avg_batch_size"]) == (1, 6, 6.0)
+
+
+def test_batches_are_bounded_by_size_and_tokens():
+    backend = Backend()
+    batcher = EmbeddingBatcher(backend, max_batch_size=2, max_wait_seconds=0.05)
+    assert batcher.embed(texts("t", 5)) == [vector(text) for text in texts("t", 5)]
+    assert sorted(map(len, backend.requests)) == [1, 2, 2]
+
+    backend = Backend()
+    long_texts = texts("t", 5, length=40)
+    # Room for two 40-character texts per request, however many more are waiting
+    batcher = EmbeddingBatcher(backend, max_batch_size=100, max_batch_tokens=2 * estimate_tokens(long_texts[0]),
+                               max_wait_seconds=0.05)
+    assert batcher.embed(long_texts) == [vector(text) for text in long_texts]
+    assert sorted(map(len, backend.requests)) == [1, 2, 2]
+
+
+def test_failed_requests_are_retried():
+    backend = Backend(failures=2)
+    batcher = EmbeddingBatcher(backend, max_retries=2, backoff_seconds=0.0, max_wait_seconds=0.0)
+    assert batcher.embed(["otters"]) == [vector("otters")]
+    assert backend.requests == [["otters"]] * 3
+    assert (batcher.get_stats()["retries"], batcher.get_stats()["failures"]) == (2, 0)
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    batcher = EmbeddingBatcher(Backend(failures=10), max_retries=1, backoff_seconds=0.0, max_wait_seconds=0.0)
+    with pytest.raises(ConnectionError):
+        batcher.embed(["otters"])
+    assert batcher.get_stats()["failures"] == 1
+
+    batcher = EmbeddingBatcher(Backend(short=True), max_batch_size=2, max_wait_seconds=1.0)
+    with pytest.raises(ValueError, match="returned 1 vectors for 2 texts"):
+        batcher.embed(["otters", "stars"])
+    # The batcher keeps serving after a failed batch
+    batcher.embed_fn = Backend()
+    assert batcher.embed(["otters", "stars"]) == [vector("otters"), vector("stars")]
+
+
+def test_batched_embeddings_send_only_documents_through_the_batcher():
+    class Underlying(Embeddings):
+        def embed_documents(self, texts):
+            raise AssertionError("documents must go through the batcher")
+
+        def embed_query(self, text):
+            return vector(text)
+
+    backend = Backend()
+    embeddings = BatchedEmbeddings(Underlying(), EmbeddingBatcher(backend, max_wait_seconds=0.0))
+    assert embeddings.embed_query("question") == vector("question")
+    assert embeddings.embed_documents(["otters"]) == [vector("otters")]
+    assert backend.requests == [["otters"]]
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from app import embedding_cache
+from app.embedding_cache import CachedEmbeddings, EmbeddingCache, QueryEmbeddingCache, embedding_key
+
+# float32 vectors of 4 dimensions take 16 bytes each
+VECTOR_BYTES = 16
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic 4-dimensional embeddings that record every text sent to them"""
+
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    @staticmethod
+    def vector(text):
+        return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return self.vector(text)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing last_access times, so LRU order never depends on timer resolution"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_keys_are_content_addressed_per_model():
+    assert embedding_key("model-a", "text") == embedding_key("model-a", "text")
+    assert embedding_key("model-a", "text") != embedding_key("model-b", "text")
+    assert embedding_key("model-a", "text") != embedding_key("model-a", "text ")
+
+
+def test_embed_documents_only_sends_misses(tmp_path):
+    underlying = CountingEmbeddings()
+    embeddings = CachedEmbeddings(underlying, EmbeddingCache(str(tmp_path / "cache.sqlite3")), "model")
+    texts = ["alpha", "beta", "alpha"]
+    assert embeddings.embed_documents(texts) == [CountingEmbeddings.vector(text) for text in texts]
+    # A repeat inside one call is embedded once
+    assert underlying.documents == [["alpha", "beta"]]
+
+    assert embeddings.embed_documents(["beta", "gamma"])[0] == CountingEmbeddings.vector("beta")
+    assert underlying.documents[-1] == ["gamma"]
+    stats = embeddings.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 3, 3)
+    assert stats["bytes_saved"] == len("alpha") + len("beta")
+    assert stats["stored_bytes"] == 3 * VECTOR_BYTES
+
+
+def test_cache_persists_and_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = EmbeddingCache(path)
+    first.put_many({"a": [1.0, 2.0, 3.0, 4.0], "b": [0.0] * 4})
+
+    # Another worker (or a restart) opening the same file
+    second = EmbeddingCache(path)
+    assert second.get_many(["a", "missing"]) == {"a": [1.0, 2.0, 3.0, 4.0]}
+    second.put_many({"c": [1.0] * 4, "a": [5.0] * 4})
+    # Replacing a key does not count it twice, and both see the same totals
+    assert len(first) == len(second) == 3
+    assert first.total_bytes == second.total_bytes == 3 * VECTOR_BYTES
+    assert first.get_many(["a"]) == {"a": [5.0] * 4}
+
+
+def test_least_recently_used_entries_are_evicted_above_max_bytes(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=3 * VECTOR_BYTES)
+    for key in ("a", "b", "c"):
+        cache.put_many({key: [1.0] * 4})
+    cache.get_many(["a"])
+
+    cache.put_many({"d": [1.0] * 4})
+    assert set(cache.get_many(["a", "b", "c", "d"])) == {"a", "c", "d"}
+    assert (len(cache), cache.total_bytes) == (3, 3 * VECTOR_BYTES)
+
+    # One oversized write evicts as many old entries as it needs
+    cache.put_many({"e": [1.0] * 4, "f": [1.0] * 4})
+    assert set(cache.get_many(["a", "c", "d", "e", "f"])) == {"d", "e", "f"}
+    assert (len(cache), cache.total_bytes) == (3, 3 * VECTOR_BYTES)
+
+
+def test_stats_row_is_backfilled_for_older_cache_files(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many({"a": [1.0] * 4, "b": [1.0] * 4})
+    cache = EmbeddingCache(path)
+    # As if written before the stats row existed
+    cache._conn.execute("DROP TABLE cache_stats")
+    cache._conn.commit()
+    assert (len(EmbeddingCache(path)), EmbeddingCache(path).total_bytes) == (2, 2 * VECTOR_BYTES)
+
+
+def test_query_cache_evicts_the_least_recently_used_question():
+    cache = QueryEmbeddingCache(max_entries=2)
+    keys = [cache.make_key("model", text) for text in ("one", "two", "three")]
+    cache.put(keys[0], [1.0])
+    cache.put(keys[1], [2.0])
+    assert cache.get(keys[0]) == [1.0]
+    cache.put(keys[2], [3.0])
+    assert cache.get(keys[1]) is None
+    assert (cache.get(keys[0]), cache.get(keys[2])) == ([1.0], [3.0])
+    assert cache.get_stats() == {"entries": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
+
+    disabled = QueryEmbeddingCache(max_entries=0)
+    disabled.put(keys[0], [1.0])
+    assert disabled.get(keys[0]) is None
+
+
+def test_repeated_questions_are_embedded_once(tmp_path):
+    underlying = CountingEmbeddings()
+    query_cache = QueryEmbeddingCache()
+    embeddings = CachedEmbeddings(underlying, EmbeddingCache(str(tmp_path / "cache.sqlite3")), "model",
+                                  query_cache=query_cache)
+    vector = embeddings.embed_query("what do otters eat?")
+    # Whitespace differences map to the same entry
+    assert embeddings.embed_query("  what do   otters\neat? ") == vector
+    assert asyncio.run(embeddings.aembed_query("what do otters eat?")) == vector
+    assert underlying.queries == ["what do otters eat?"]
+
+    # Batches only send questions no path has embedded yet, in one call
+    assert embeddings.embed_queries(["what do otters eat?", "why?", "why?"])[0] == vector
+    assert underlying.documents == [["why?"]]
+    # Questions never land in the persistent chunk cache
+    assert len(embeddings.cache) == 0
+    assert query_cache.get_stats()["entries"] == 2
@@ -0,0 +1,154 @@
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app import history_store
+from app.history_store import MemoryHistoryStore, SQLiteHistoryStore, iter_messages
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable time for the history module"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(history_store, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def make_store(request, tmp_path):
+    def make_store(**options):
+        if request.param == "sqlite":
+            return SQLiteHistoryStore(str(tmp_path / "history.sqlite3"), **options)
+        return MemoryHistoryStore(**options)
+    return make_store
+
+
+def contents(messages):
+    return [message["content"] for message in messages]
+
+
+def fill(store, session_id, count, start=0):
+    for n in range(start, start + count):
+        store.append(session_id, "user" if n % 2 == 0 else "assistant", f"message {n}")
+
+
+def test_messages_are_paged_oldest_first(make_store):
+    store = make_store()
+    fill(store, "s", 5)
+    fill(store, "other", 2)
+    assert contents(store.get_messages("s", offset=0, limit=2)) == ["message 0", "message 1"]
+    assert contents(store.get_messages("s", offset=3, limit=10)) == ["message 3", "message 4"]
+    assert store.get_messages("s", offset=5) == []
+    assert store.get_messages("missing") == []
+    assert [message["role"] for message in store.get_messages("s", limit=2)] == ["user", "assistant"]
+    assert (store.count("s"), store.count("other"), store.count("missing")) == (5, 2, 0)
+    assert store.get_stats()["sessions"] == 2 and store.get_stats()["messages"] == 7
+
+
+def test_sessions_keep_only_their_latest_messages(make_store):
+    store = make_store(max_messages_per_session=3)
+    fill(store, "s", 5)
+    assert contents(store.get_messages("s")) == ["message 2", "message 3", "message 4"]
+    assert store.count("s") == 3
+    assert store.get_stats()["messages"] == 3
+
+
+def test_idle_sessions_are_evicted(make_store, clock):
+    store = make_store(session_ttl_seconds=60)
+    fill(store, "idle", 2)
+    clock.value += 30
+    fill(store, "active", 1)
+    clock.value += 40
+    assert store.evict_idle() == 1
+    assert (store.count("idle"), store.count("active")) == (0, 1)
+    assert store.get_messages("idle") == []
+
+    # Appends sweep on their own, at most once per EVICTION_INTERVAL_SECONDS
+    clock.value += history_store.EVICTION_INTERVAL_SECONDS + 1
+    fill(store, "new", 1)
+    assert store.count("active") == 0
+    assert store.get_stats()["sessions"] == 1
+
+
+def test_sqlite_history_is_shared_and_survives_restarts(tmp_path):
+    path = str(tmp_path / "history.sqlite3")
+    first = SQLiteHistoryStore(path, max_messages_per_session=4)
+    second = SQLiteHistoryStore(path, max_messages_per_session=4)
+    fill(first, "s", 3)
+    fill(second, "s", 3, start=3)
+    # Both workers count against the same cap
+    assert contents(SQLiteHistoryStore(path).get_messages("s")) == [f"message {n}" for n in range(2, 6)]
+
+
+def test_memory_store_drops_the_least_recently_active_session():
+    store = MemoryHistoryStore(max_sessions=2)
+    fill(store, "a", 1)
+    fill(store, "b", 1)
+    fill(store, "a", 1, start=1)
+    fill(store, "c", 1)
+    assert (store.count("a"), store.count("b"), store.count("c")) == (2, 0, 1)
+
+
+def test_conversation_endpoint_pages_and_validates_bounds(api):
+    from app import main
+    session_id = uuid.uuid4().hex
+    fill(main.history_store, session_id, 5)
+
+    page = api.get(f"/conversation/{session_id}", params={"offset": 1, "limit": 2}).json()
+    assert contents(page["messages"]) == ["message 1", "message 2"]
+    assert (page["total"], page["offset"], page["limit"]) == (5, 1, 2)
+    assert api.get(f"/conversation/{uuid.uuid4().hex}").json()["messages"] == []
+    for params in ({"offset": -1}, {"limit": 0}, {"limit": 1001}):
+        assert api.get(f"/conversation/{session_id}", params=params).status_code == 400
+
+
+def test_keyset_pages_follow_message_ids(make_store):
+    store = make_store(max_messages_per_session=4)
+    fill(store, "s", 6)
+    page = store.get_messages_after("s", after=0, limit=3)
+    assert contents(message for _, message in page) == ["message 2", "message 3", "message 4"]
+    ids = [message_id for message_id, _ in page]
+    assert ids == sorted(ids)
+    assert contents(message for _, message in store.get_messages_after("s", after=ids[-1])) == ["message 5"]
+    assert store.get_messages_after("missing") == []
+
+
+def test_export_pages_neither_skip_nor_repeat_while_the_session_changes(make_store):
+    store = make_store(max_messages_per_session=10)
+    fill(store, "s", 10)
+    exported = []
+    for message in iter_messages(store, "s", page_size=3):
+        exported.append(message["content"])
+        if len(exported) == 3:
+            # Trimming shifts offsets by two; keyset pages are unaffected
+            fill(store, "s", 2, start=10)
+    assert exported == [f"message {n}" for n in range(12)]
+    assert list(iter_messages(store, "missing")) == []
+
+
+@pytest.mark.parametrize("export_format, media_type", [
+    ("txt", "text/plain"), ("jsonl", "application/x-ndjson"), ("markdown", "text/markdown")
+])
+def test_export_streams_every_message(api, export_format, media_type):
+    from app import main
+    session_id = uuid.uuid4().hex
+    # Exactly one full page of iter_messages (and the session cap), so a second read follows
+    fill(main.history_store, session_id, 200)
+    response = api.get(f"/export/{session_id}", params={"format": export_format})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+    assert session_id in response.headers["content-disposition"]
+    if export_format == "jsonl":
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert contents(lines) == [f"message {n}" for n in range(200)]
+        assert lines[0]["role"] == "user"
+    else:
+        assert response.text.count("message ") == 200
+        assert response.text.index("message 9\n") < response.text.index("message 199\n")
+
+
+def test_export_rejects_unknown_formats_and_sessions(api):
+    assert api.get(f"/export/{uuid.uuid4().hex}").status_code == 404
+    assert api.get("/export/default", params={"format": "pdf"}).status_code == 400
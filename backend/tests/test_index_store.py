@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.index_store import MMAP_CODES, IndexStore
+from app.vector_index import new_flat_index
+
+OTTERS = "Sea otters hold hands while they sleep so that they do not drift apart on the water."
+STARS = "Neutron stars can spin hundreds of times per second and are only a few kilometres wide."
+
+
+def make_index(n=100, dimensions=16):
+    vectors = np.random.default_rng(0).random((n, dimensions), dtype=np.float32)
+    index = new_flat_index(dimensions)
+    index.add_with_ids(vectors, np.arange(n, dtype=np.int64) * 3)
+    return index, vectors
+
+
+def generations(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("gen-"))
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    store = IndexStore(str(tmp_path))
+    assert store.load() is None
+    index, vectors = make_index()
+    generation = store.save(index, {"answer": 42})
+
+    loaded, state, mmapped, loaded_generation = store.load(mmap=mmap)
+    assert (state, loaded_generation) == ({"answer": 42}, generation)
+    assert mmapped == (mmap and MMAP_CODES)
+    assert loaded.ntotal == index.ntotal
+    np.testing.assert_array_equal(loaded.search(vectors[:5], 3)[1], index.search(vectors[:5], 3)[1])
+
+
+def test_large_indexes_are_mapped_by_default(tmp_path):
+    index, _ = make_index()
+    IndexStore(str(tmp_path)).save(index, {})
+    assert IndexStore(str(tmp_path), mmap_min_bytes=1).load()[2] == MMAP_CODES
+    assert not IndexStore(str(tmp_path)).load()[2]
+
+
+def test_saves_keep_the_current_and_previous_generations(tmp_path):
+    store = IndexStore(str(tmp_path))
+    index, _ = make_index()
+    saved = [store.save(index, {"n": n}) for n in range(4)]
+    assert saved == ["gen-000001", "gen-000002", "gen-000003", "gen-000004"]
+    assert store.current_generation() == "gen-000004"
+    assert generations(tmp_path) == saved[-2:]
+    assert store.load()[1] == {"n": 3}
+    # Another process opening the directory continues the numbering
+    assert IndexStore(str(tmp_path)).save(index, {}) == "gen-000005"
+
+
+def test_a_mapped_generation_stays_readable_after_it_is_removed(tmp_path):
+    store = IndexStore(str(tmp_path))
+    index, vectors = make_index()
+    first = store.save(index, {})
+    mapped = store.load_index(first, mmap=True)
+    store.save(index, {})
+    store.save(index, {})
+    assert first not in generations(tmp_path)
+    np.testing.assert_array_equal(mapped.search(vectors[:5], 3)[1], index.search(vectors[:5], 3)[1])
+
+
+def test_engine_restarts_from_its_snapshot(make_engine, ingest):
+    engine = make_engine()
+    ingest(engine, "otters.txt", OTTERS)
+    ingest(engine, "stars.txt", STARS)
+
+    restarted = make_engine()
+    assert restarted.index_ready.is_set()
+    assert restarted.index_generation == engine.index_generation
+    assert set(restarted.chunks) == set(engine.chunks)
+    assert restarted.list_documents() == engine.list_documents()
+    assert (restarted.corpus_id, restarted.corpus_version) == (engine.corpus_id, engine.corpus_version)
+    for question in ("sea otters", "neutron stars"):
+        assert restarted.query(question, k=1)["sources"] == engine.query(question, k=1)["sources"]
+
+
+def test_deletes_persist_across_restarts(make_engine, ingest):
+    engine = make_engine()
+    ingest(engine, "otters.txt", OTTERS)
+    ingest(engine, "stars.txt", STARS)
+    engine.delete_document("stars.txt")
+
+    restarted = make_engine()
+    assert [record["document_id"] for record in restarted.list_documents()] == ["otters.txt"]
+    assert len(restarted.chunks) == restarted.vector_store.index.ntotal == 1
+    assert "Neutron" not in restarted.query("neutron stars", k=3)["sources"][0]
+
+    # Stable ids survive the restart: deleting now removes exactly that document
+    assert restarted.delete_document("otters.txt")["document_id"] == "otters.txt"
+    assert restarted.vector_store.index.ntotal == 0
+    assert make_engine().list_documents() == []
+
+
+def test_engine_starts_empty_without_a_snapshot(make_engine):
+    engine = make_engine()
+    assert engine.index_ready.is_set()
+    assert engine.vector_store is None and engine.index_generation is None
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from app import jobs
+from app.jobs import JobManager
+from conftest import wait_for
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(max_workers=1, status_dir=str(tmp_path / "jobs"))
+    yield manager
+    manager.shutdown()
+
+
+def wait_until_finished(manager, job_id):
+    wait_for(lambda: manager.get(job_id)["status"] in ("completed", "failed"))
+    return manager.get(job_id)
+
+
+def test_job_moves_through_its_stages(manager):
+    submitted, release = threading.Event(), threading.Event()
+    seen = []
+
+    def task(progress):
+        submitted.wait(10)
+        for stage in ("extract", "chunk", "embed", "index"):
+            progress(stage)
+            seen.append(manager.get(job_id)["stage"])
+        release.wait(10)
+        return 7
+
+    job_id = manager.submit(task, "report.txt")
+    submitted.set()
+    wait_for(lambda: len(seen) == 4)
+    job = manager.get(job_id)
+    assert (job["status"], job["stage"], job["document_id"]) == ("running", "index", "report.txt")
+    release.set()
+
+    job = wait_until_finished(manager, job_id)
+    assert seen == ["extract", "chunk", "embed", "index"]
+    assert (job["status"], job["stage"], job["chunks_processed"], job["error"]) == ("completed", "done", 7, None)
+
+
+def test_queued_jobs_wait_for_a_worker(manager):
+    release = threading.Event()
+    first = manager.submit(lambda progress: release.wait(10) and 1, "first.txt")
+    second = manager.submit(lambda progress: 2, "second.txt")
+    wait_for(lambda: manager.get(first)["status"] == "running")
+    assert (manager.get(second)["status"], manager.get(second)["stage"]) == ("queued", "queued")
+    release.set()
+    assert wait_until_finished(manager, second)["chunks_processed"] == 2
+
+
+def test_failed_job_records_the_error(manager):
+    def task(progress):
+        progress("extract")
+        raise ValueError("Document is too short or empty")
+
+    job = wait_until_finished(manager, manager.submit(task, "empty.txt"))
+    assert (job["status"], job["stage"], job["error"]) == ("failed", "extract", "Document is too short or empty")
+
+
+def test_other_processes_read_jobs_from_status_files(manager):
+    job_id = manager.submit(lambda progress: 3, "shared.txt")
+    job = wait_until_finished(manager, job_id)
+
+    # A second worker process sharing the status directory never ran the job
+    other = JobManager(max_workers=1, status_dir=manager.status_dir)
+    try:
+        assert other.jobs == {}
+        assert other.get(job_id) == job
+        assert other.get("0" * 32) is None
+        assert other.get("../escape") is None
+    finally:
+        other.shutdown()
+    assert JobManager(max_workers=1).get(job_id) is None
+
+
+def test_only_the_latest_finished_jobs_are_kept(manager, monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_FINISHED_JOBS", 2)
+    finished = [manager.submit(lambda progress: 1, f"{n}.txt") for n in range(3)]
+    for job_id in finished:
+        wait_until_finished(manager, job_id)
+    release = threading.Event()
+    running = manager.submit(lambda progress: release.wait(10) and 1, "running.txt")
+
+    # Pruning happens on submit and never touches unfinished jobs
+    assert list(manager.jobs) == finished[1:] + [running]
+    assert manager.get(finished[0]) is None
+    release.set()
+    wait_until_finished(manager, running)
+
+
+def test_unknown_job_is_a_404(api):
+    assert api.get(f"/jobs/{'0' * 32}").status_code == 404
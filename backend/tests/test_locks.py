@@ -0,0 +1,72 @@
+import threading
+
+from app.locks import ReadWriteLock
+from conftest import wait_for
+
+
+def hold(context, entered, release):
+    """Thread body: enter the lock side, signal, and hold it until released"""
+    with context:
+        entered.set()
+        release.wait(10)
+
+
+def start(lock_side, release):
+    entered = threading.Event()
+    thread = threading.Thread(target=hold, args=(lock_side(), entered, release), daemon=True)
+    thread.start()
+    return thread, entered
+
+
+def test_readers_share_the_lock():
+    lock = ReadWriteLock()
+    release = threading.Event()
+    readers = [start(lock.read, release) for _ in range(3)]
+    for _, entered in readers:
+        assert entered.wait(5)
+    release.set()
+    for thread, _ in readers:
+        thread.join(5)
+
+
+def test_writer_excludes_readers_and_writers():
+    lock = ReadWriteLock()
+    release_writer, release_others = threading.Event(), threading.Event()
+    writer, writer_entered = start(lock.write, release_writer)
+    assert writer_entered.wait(5)
+
+    reader, reader_entered = start(lock.read, release_others)
+    other_writer, other_entered = start(lock.write, release_others)
+    assert not reader_entered.wait(0.2)
+    assert not other_entered.is_set()
+
+    release_writer.set()
+    wait_for(lambda: reader_entered.is_set() or other_entered.is_set(), 5)
+    # Only one of them can be in at a time
+    assert not (reader_entered.is_set() and other_entered.is_set())
+    release_others.set()
+    for thread in (writer, reader, other_writer):
+        thread.join(5)
+    assert reader_entered.is_set() and other_entered.is_set()
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    release_reader, release_writer, release_late = threading.Event(), threading.Event(), threading.Event()
+    reader, reader_entered = start(lock.read, release_reader)
+    assert reader_entered.wait(5)
+
+    writer, writer_entered = start(lock.write, release_writer)
+    wait_for(lambda: lock._writers_waiting == 1, 5)
+    # A reader arriving now queues behind the writer instead of joining the first reader
+    late_reader, late_entered = start(lock.read, release_late)
+    assert not late_entered.wait(0.2)
+
+    release_reader.set()
+    assert writer_entered.wait(5)
+    assert not late_entered.is_set()
+    release_writer.set()
+    assert late_entered.wait(5)
+    release_late.set()
+    for thread in (reader, writer, late_reader):
+        thread.join(5)
@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.mmr import maximal_marginal_relevance
+
+
+def reference_mmr(query, candidates, k, lambda_mult):
+    """Textbook MMR with a Python loop over pairs, starting from the most relevant candidate"""
+    def cosine(a, b):
+        norms = np.linalg.norm(a) * np.linalg.norm(b)
+        return float(a @ b / norms) if norms else 0.0
+
+    selected = [max(range(len(candidates)), key=lambda i: cosine(query, candidates[i]))]
+    while len(selected) < min(k, len(candidates)):
+        best, best_score = None, -np.inf
+        for i, candidate in enumerate(candidates):
+            if i in selected:
+                continue
+            redundancy = max((cosine(candidate, candidates[j]) for j in selected), default=0.0)
+            score = lambda_mult * cosine(query, candidate) - (1.0 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+def test_lambda_one_ranks_by_relevance():
+    rng = np.random.default_rng(0)
+    query, candidates = rng.standard_normal(16), rng.standard_normal((20, 16))
+    similarity = candidates @ query / np.linalg.norm(candidates, axis=1)
+    assert maximal_marginal_relevance(query, candidates, k=5, lambda_mult=1.0) == \
+        list(np.argsort(-similarity)[:5])
+
+
+def test_near_duplicates_are_skipped():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = np.array([
+        [1.0, 0.1, 0.0],
+        [1.0, 0.11, 0.0],  # near duplicate of the best match
+        [0.7, 0.0, 0.7],
+    ])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_matches_the_reference_implementation():
+    rng = np.random.default_rng(1)
+    for lambda_mult in (0.0, 0.3, 0.5, 0.9):
+        query, candidates = rng.standard_normal(8), rng.standard_normal((30, 8))
+        assert maximal_marginal_relevance(query, candidates, k=6, lambda_mult=lambda_mult) == \
+            reference_mmr(query, candidates, 6, lambda_mult)
+
+
+def test_returns_at_most_the_candidates():
+    rng = np.random.default_rng(2)
+    picks = maximal_marginal_relevance(rng.standard_normal(4), rng.standard_normal((3, 4)), k=10)
+    assert sorted(picks) == [0, 1, 2]
+
+
+def test_empty_inputs():
+    assert maximal_marginal_relevance(np.ones(4), np.empty((0, 4)), k=3) == []
+    assert maximal_marginal_relevance(np.ones(4), np.ones((2, 4)), k=0) == []
+
+
+def test_zero_vectors_do_not_produce_nan():
+    candidates = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+    picks = maximal_marginal_relevance(np.array([1.0, 0.0]), candidates, k=3)
+    assert picks[0] == 1 and sorted(picks) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_engine_mmr_returns_k_chunks(engine, mode):
+    engine.retrieval_mode = mode
+    question = "what is topic 3 and subject 5?"
+    plain = engine._similarity_search(question, k=3)
+    diverse = engine._similarity_search(question, k=3, mmr=True, fetch_k=20)
+    assert len(plain) == len(diverse) == 3
+    assert len({chunk.page_content for chunk in diverse}) == 3
+
+    diverse_async = asyncio.run(engine._asimilarity_search(question, k=3, mmr=True, fetch_k=20))
+    assert [chunk.page_content for chunk in diverse_async] == [chunk.page_content for chunk in diverse]
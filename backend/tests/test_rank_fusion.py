@@ -0,0 +1,31 @@
+import pytest
+
+from app.rank_fusion import RRF_K, reciprocal_rank_fusion
+
+
+def test_ids_ranked_by_both_retrievers_rise_to_the_top():
+    lexical = ["a", "b", "c"]
+    semantic = ["c", "d", "a"]
+    fused = reciprocal_rank_fusion([lexical, semantic], k=4)
+    assert [item for item, _ in fused] == ["a", "c", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 3))
+
+
+def test_scores_follow_the_rrf_formula():
+    fused = dict(reciprocal_rank_fusion([["x", "y"], ["y"]], k=2, rrf_k=10))
+    assert fused == pytest.approx({"x": 1 / 11, "y": 1 / 12 + 1 / 11})
+
+
+def test_results_are_truncated_to_k():
+    rankings = [[str(i) for i in range(10)], [str(i) for i in range(9, -1, -1)]]
+    assert len(reciprocal_rank_fusion(rankings, k=3)) == 3
+    assert reciprocal_rank_fusion(rankings, k=0) == []
+
+
+def test_a_single_ranking_keeps_its_order():
+    assert [item for item, _ in reciprocal_rank_fusion([[3, 1, 2]], k=3)] == [3, 1, 2]
+
+
+def test_empty_rankings():
+    assert reciprocal_rank_fusion([], k=3) == []
+    assert reciprocal_rank_fusion([[], []], k=3) == []
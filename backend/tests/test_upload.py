@@ -0,0 +1,113 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from conftest import wait_for_job
+
+
+@pytest.fixture
+def main(api):
+    from app import main
+    return main
+
+
+def leftover_parts(main):
+    return [name for name in os.listdir(main.UPLOAD_DIR) if name.endswith(".part")]
+
+
+def multipart(filename, content, boundary="testboundary"):
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n").encode()
+    return head + content + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def test_upload_is_stored_and_ingested(api, upload, main, collection):
+    result = upload("notes.txt", "Capybaras are the largest living rodents and spend much of the day in water.")
+    assert result["job"]["chunks_processed"] == 1
+    with open(os.path.join(main.collection_upload_dir(collection), "notes.txt"), encoding="utf-8") as f:
+        assert f.read() == "Capybaras are the largest living rodents and spend much of the day in water."
+    assert leftover_parts(main) == []
+
+
+def test_identical_content_is_not_ingested_twice(api, upload):
+    first = upload("a.txt", "Identical content, uploaded twice under two names, is only ingested once.")
+    second = upload("b.txt", "Identical content, uploaded twice under two names, is only ingested once.")
+    assert second["status"] == "duplicate"
+    assert second["document_id"] == first["document_id"] == "a.txt"
+
+
+def test_oversized_upload_is_refused_from_its_content_length(api, main, collection):
+    body, content_type = multipart("big.txt", b"x" * (2 * main.MAX_UPLOAD_BYTES))
+    response = api.post("/upload", params={"collection": collection}, content=body,
+                        headers={"Content-Type": content_type})
+    assert response.status_code == 413
+    assert leftover_parts(main) == []
+
+
+def test_oversized_chunked_upload_is_cut_off(api, main, collection):
+    body, content_type = multipart("big.txt", b"x" * (2 * main.MAX_UPLOAD_BYTES))
+
+    def chunks():
+        # No Content-Length: the body is sent chunked
+        for start in range(0, len(body), 64 * 1024):
+            yield body[start:start + 64 * 1024]
+
+    response = api.post("/upload", params={"collection": collection}, content=chunks(),
+                        headers={"Content-Type": content_type})
+    assert response.status_code == 413, response.text
+    assert leftover_parts(main) == []
+
+
+def test_file_over_the_limit_inside_the_form_allowance_is_refused(api, main, collection):
+    response = api.post("/upload", params={"collection": collection},
+                        files={"file": ("big.txt", b"x" * (main.MAX_UPLOAD_BYTES + 1), "text/plain")})
+    assert response.status_code == 413
+    assert leftover_parts(main) == []
+
+
+def test_same_name_with_new_content_waits_for_the_pending_job(api, main, collection, monkeypatch):
+    engine = main.collections.get(collection, create=True)
+    release = threading.Event()
+    process_document = engine.process_document
+
+    def blocked(*args, **kwargs):
+        release.wait(30)
+        return process_document(*args, **kwargs)
+
+    monkeypatch.setattr(engine, "process_document", blocked)
+    post = lambda text: api.post("/upload", params={"collection": collection},
+                                 files={"file": ("report.txt", text.encode(), "text/plain")})
+    first = post("First version of the report, with enough text to be indexed.").json()
+    assert first["status"] == "queued"
+
+    response = post("Second version of the report, with enough text to be indexed.")
+    assert response.status_code == 409
+    # The queued job still reads the file it was given
+    with open(os.path.join(main.collection_upload_dir(collection), "report.txt"), encoding="utf-8") as f:
+        assert f.read() == "First version of the report, with enough text to be indexed."
+    # Re-sending the identical content points at the pending job
+    assert post("First version of the report, with enough text to be indexed.").json()["job_id"] == first["job_id"]
+
+    release.set()
+    assert wait_for_job(api, first["job_id"])["status"] == "completed"
+    second = post("Second version of the report, with enough text to be indexed.").json()
+    assert wait_for_job(api, second["job_id"])["status"] == "completed"
+    assert [record["chunks"] for record in engine.list_documents()] == [1]
+    assert leftover_parts(main) == []
+
+
+def test_failed_temp_file_creation_keeps_the_original_error(main, monkeypatch):
+    def denied(*args, **kwargs):
+        raise PermissionError("upload directory is read-only")
+
+    class Upload:
+        size = None
+
+        async def read(self, size):
+            return b""
+
+    monkeypatch.setattr(main, "open", denied, raising=False)
+    with pytest.raises(PermissionError):
+        asyncio.run(main.save_upload(Upload()))
@@ -0,0 +1,243 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import FakeEmbeddings
+
+from app.vector_index import (
+    INDEX_TYPES, StableIds, VectorIndexConfig, add_with_stable_ids, build_index, catch_up,
+    delete_with_stable_ids, flat_index_info, has_stable_ids, is_ivf, new_flat_index, with_stable_ids
+)
+
+DIMENSIONS = 32
+# Two dimensions per PQ sub-vector, fine enough for stable recall on small tests
+PQ_M = 16
+RECALL = {"flat": 1.0, "f16": 0.95, "ivf": 1.0, "ivf_f16": 0.95, "pq": 0.6, "ivf_pq": 0.6}
+
+
+def clustered(n, seed=0, topics=20):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((topics, DIMENSIONS)).astype(np.float32)
+    vectors = centres[rng.integers(topics, size=n)] + 0.3 * rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def make_store(index=None):
+    return FAISS(
+        embedding_function=FakeEmbeddings(size=DIMENSIONS),
+        index=index if index is not None else new_flat_index(DIMENSIONS),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={}
+    )
+
+
+def add(store, stable_ids, vectors, prefix):
+    ids = [f"{prefix}-{i}" for i in range(len(vectors))]
+    add_with_stable_ids(store, stable_ids, [f"text {chunk_id}" for chunk_id in ids], vectors.tolist(),
+                        [{} for _ in ids], ids)
+    return ids
+
+
+def exact_top_k(store, vectors_by_id, queries, k):
+    """Brute-force top k docstore ids over the live vectors"""
+    ids = list(vectors_by_id)
+    matrix = np.asarray([vectors_by_id[chunk_id] for chunk_id in ids], dtype=np.float32)
+    distances = ((queries[:, None, :] - matrix[None, :, :]) ** 2).sum(axis=-1)
+    return [[ids[i] for i in row] for row in np.argsort(distances, axis=1)[:, :k]]
+
+
+def top_k(store, queries, k):
+    _, labels = store.index.search(queries, k)
+    return [[store.index_to_docstore_id[label] for label in row if label != -1] for row in labels]
+
+
+def assert_consistent(store, stable_ids):
+    mapping = store.index_to_docstore_id
+    assert store.index.ntotal == len(mapping) == len(stable_ids.labels)
+    assert all(stable_ids.labels[chunk_id] == label for label, chunk_id in mapping.items())
+    assert set(mapping.values()) == set(store.docstore._dict)
+
+
+# --- VectorIndexConfig ---
+
+def test_unknown_type_is_rejected():
+    with pytest.raises(ValueError):
+        VectorIndexConfig(index_type="hnsw")
+
+
+def test_pq_types_need_enough_points_for_their_codebooks():
+    assert VectorIndexConfig(index_type="pq", train_min=10).train_min == 256
+    assert VectorIndexConfig(index_type="ivf", train_min=10).train_min == 10
+
+
+def test_plan_for_untrained_types_converts_once():
+    config = VectorIndexConfig(index_type="f16")
+    assert config.plan(flat_index_info(), 5) == "convert"
+    assert config.plan({"type": "f16"}, 5) is None
+    assert VectorIndexConfig().plan(flat_index_info(), 5) is None
+    assert config.plan(flat_index_info(), 0) is None
+
+
+def test_plan_trains_at_threshold_and_retrains_on_growth():
+    config = VectorIndexConfig(index_type="ivf", train_min=1000, retrain_growth=2.0)
+    assert config.plan(flat_index_info(), 999) is None
+    assert config.plan(flat_index_info(), 1000) == "train"
+    trained = {"type": "ivf", "trained_on": 1000}
+    assert config.plan(trained, 1999) is None
+    assert config.plan(trained, 2000) == "retrain"
+    # Shrinking below the threshold keeps the trained index
+    assert config.plan(trained, 10) is None
+
+
+def test_factory_string_bounds_nlist_by_training_data():
+    config = VectorIndexConfig(index_type="ivf_pq")
+    assert config.factory_string(DIMENSIONS, 400) == "IVF10,PQ4x8np"
+    assert VectorIndexConfig(index_type="ivf", nlist=4096).factory_string(DIMENSIONS, 800) == "IVF20,Flat"
+    assert VectorIndexConfig(index_type="f16").factory_string(DIMENSIONS, 10) == "SQfp16"
+
+
+def test_pq_subquantizers_divide_the_dimensions():
+    assert VectorIndexConfig(index_type="pq").pq_subquantizers(1536) == 192
+    assert 100 % VectorIndexConfig(index_type="pq").pq_subquantizers(100) == 0
+    with pytest.raises(ValueError):
+        VectorIndexConfig(index_type="pq", pq_m=7).pq_subquantizers(DIMENSIONS)
+
+
+# --- build_index ---
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_build_index_from_flat_matches_flat(index_type):
+    vectors = clustered(2000)
+    queries = clustered(50, seed=1)
+    store, stable_ids = make_store(), StableIds({})
+    add(store, stable_ids, vectors, "a")
+    # Gaps in the FAISS ids, as after deletions
+    delete_with_stable_ids(store, stable_ids, [f"a-{i}" for i in range(0, 2000, 7)])
+    expected = top_k(store, queries, 5)
+
+    config = VectorIndexConfig(index_type=index_type, train_min=1, nlist=16, nprobe=16, pq_m=PQ_M)
+    index, mapping, info = build_index(config, store.index, store.index_to_docstore_id)
+
+    assert info["type"] == index_type
+    assert index.ntotal == len(mapping) == len(store.index_to_docstore_id)
+    assert sorted(mapping) == list(range(len(mapping)))
+    assert set(mapping.values()) == set(store.index_to_docstore_id.values())
+    assert has_stable_ids(index)
+    assert info["trained_on"] == (len(mapping) if index_type in ("pq", "ivf", "ivf_f16", "ivf_pq") else 0)
+
+    rebuilt = make_store(index)
+    rebuilt.index_to_docstore_id.update(mapping)
+    found = top_k(rebuilt, queries, 5)
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(found, expected)])
+    # nprobe == nlist scans every list, so only the encoding loses accuracy
+    assert recall >= RECALL[index_type]
+
+
+def test_build_index_prefers_exact_vectors_for_lossy_sources():
+    vectors = clustered(600)
+    store, stable_ids = make_store(), StableIds({})
+    ids = add(store, stable_ids, vectors, "a")
+    pq_config = VectorIndexConfig(index_type="pq", train_min=1)
+    pq_index, pq_mapping, _ = build_index(pq_config, store.index, store.index_to_docstore_id)
+
+    exact = dict(zip(ids, vectors.tolist()))
+    flat_index, flat_mapping, _ = build_index(
+        VectorIndexConfig(), pq_index, pq_mapping, source_type="pq",
+        exact_vectors=lambda chunk_ids: {chunk_id: exact[chunk_id] for chunk_id in chunk_ids}
+    )
+    labels = np.asarray(sorted(flat_mapping), dtype=np.int64)
+    restored = flat_index.reconstruct_batch(labels)
+    originals = np.asarray([exact[flat_mapping[label]] for label in labels], dtype=np.float32)
+    np.testing.assert_allclose(restored, originals)
+
+
+# --- stable ids ---
+
+@pytest.mark.parametrize("index_type", ["flat", "f16", "ivf", "ivf_pq"])
+def test_delete_and_re_add_keep_ids_stable(index_type):
+    # One distribution, so the index trained on the first batch suits the later ones
+    vectors = dict(zip("abc", np.split(clustered(1200, seed=2), 3)))
+    queries = clustered(30, seed=5)
+    store, stable_ids = make_store(), StableIds({})
+    add(store, stable_ids, vectors["a"], "a")
+    if index_type != "flat":
+        config = VectorIndexConfig(index_type=index_type, train_min=1, nlist=8, nprobe=8, pq_m=PQ_M)
+        index, mapping, _ = build_index(config, store.index, store.index_to_docstore_id)
+        store = FAISS(embedding_function=store.embedding_function, index=index,
+                      docstore=store.docstore, index_to_docstore_id=mapping)
+        stable_ids = StableIds(mapping)
+    add(store, stable_ids, vectors["b"], "b")
+    add(store, stable_ids, vectors["c"], "c")
+    labels_of_c = {chunk_id: label for chunk_id, label in stable_ids.labels.items() if chunk_id.startswith("c-")}
+
+    delete_with_stable_ids(store, stable_ids, [f"b-{i}" for i in range(400)])
+    assert_consistent(store, stable_ids)
+    # Deleting never renumbers the vectors left behind
+    assert all(stable_ids.labels[chunk_id] == label for chunk_id, label in labels_of_c.items())
+
+    used = set(store.index_to_docstore_id)
+    add(store, stable_ids, vectors["b"], "b")
+    assert_consistent(store, stable_ids)
+    # Re-added chunks get fresh ids, never ones that were deleted
+    assert min(stable_ids.labels[f"b-{i}"] for i in range(400)) > max(used)
+
+    live = {f"{prefix}-{i}": vectors[prefix][i] for prefix in "abc" for i in range(400)}
+    expected = exact_top_k(store, live, queries, 5)
+    recall = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top_k(store, queries, 5), expected)])
+    assert recall >= RECALL[index_type]
+
+
+def test_delete_skips_unknown_ids():
+    store, stable_ids = make_store(), StableIds({})
+    add(store, stable_ids, clustered(10), "a")
+    assert stable_ids.pop(["a-1", "missing"]) == [1]
+    assert "a-1" not in stable_ids.labels
+
+
+def test_stable_ids_continue_after_the_highest_id():
+    stable_ids = StableIds({0: "x", 7: "y"})
+    assert stable_ids.labels == {"x": 0, "y": 7}
+    assert stable_ids.allocate(["z"]).tolist() == [8]
+    assert StableIds({}).allocate(["a", "b"]).tolist() == [0, 1]
+
+
+def test_with_stable_ids_wraps_legacy_indexes_keeping_their_ids():
+    vectors = clustered(100)
+    queries = clustered(10, seed=1)
+    legacy = faiss.IndexFlatL2(DIMENSIONS)
+    legacy.add(vectors)
+    mapping = {i: f"a-{i}" for i in range(100)}
+
+    wrapped = with_stable_ids(legacy, mapping)
+    assert has_stable_ids(wrapped) and not has_stable_ids(legacy)
+    np.testing.assert_array_equal(wrapped.search(queries, 5)[1], legacy.search(queries, 5)[1])
+    wrapped.remove_ids(np.asarray([3], dtype=np.int64))
+    np.testing.assert_allclose(wrapped.reconstruct(4), vectors[4])
+
+    assert with_stable_ids(wrapped, mapping) is wrapped
+
+
+def test_catch_up_applies_writes_made_during_a_build():
+    vectors = {prefix: clustered(300, seed=seed) for seed, prefix in enumerate("abcd")}
+    queries = clustered(30, seed=9)
+    store, stable_ids = make_store(), StableIds({})
+    add(store, stable_ids, vectors["a"], "a")
+    add(store, stable_ids, vectors["b"], "b")
+
+    config = VectorIndexConfig(index_type="ivf", train_min=1, nlist=8, nprobe=8)
+    index, mapping, _ = build_index(config, store.index, dict(store.index_to_docstore_id))
+    # Writes landing on the live store while the new index trains
+    delete_with_stable_ids(store, stable_ids, [f"a-{i}" for i in range(300)])
+    add(store, stable_ids, vectors["c"], "c")
+    add(store, stable_ids, vectors["d"], "d")
+
+    rebuilt_ids = StableIds(mapping)
+    added, removed = catch_up(index, mapping, rebuilt_ids, store.index, stable_ids.labels)
+    assert (added, removed) == (600, 300)
+    assert is_ivf(index)
+    rebuilt = FAISS(embedding_function=store.embedding_function, index=index,
+                    docstore=store.docstore, index_to_docstore_id=mapping)
+    assert_consistent(rebuilt, rebuilt_ids)
+    assert set(mapping.values()) == set(store.index_to_docstore_id.values())
+    assert top_k(rebuilt, queries, 5) == top_k(store, queries, 5)
@@ -51,7 +51,19 @@ function DocumentUpload({ onUploadSuccess }) {
         },
       });
 
-      setMessage(`✅ ${response.data.message} (${response.data.chunks_processed} chunks processed)`);
+      // Processing runs in the background on the server; poll until the job finishes
+      // (identical content comes back as "duplicate" and needs no polling)
+      let job = { status: response.data.status, stage: 'queued', chunks_processed: response.data.chunks_processed };
+      while (job.status === 'queued' || job.status === 'running') {
+        setMessage(`⏳ Processing ${file.name} (${job.stage})...`);
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = (await axios.get(`${API_URL}/jobs/${response.data.job_id}`)).data;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error);
+      }
+
+      setMessage(`✅ Document '${file.name}' processed (${job.chunks_processed} chunks processed)`);
       onUploadSuccess(file.name);
       setFile(null);
       